@@ -2,7 +2,12 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
 import ee
-from .gee_utils import initialize_gee, generate_time_series, get_crop_specific_thresholds, get_weather_data
+from .gee_executor import run_parallel, run_call, tile_url, get_info, gee_priority, INTERACTIVE
+from .layers import layer_descriptor
+from .local_compute import use_local_engine, fetch_pixels, class_areas, masked_area, masked_mean
+from .gee_utils import (initialize_gee, generate_time_series, get_crop_specific_thresholds, get_weather_data, get_class_areas,
+                        get_mask_areas, clear_composite, reduction_params)
+from .roi import prepare_roi
 
 def determine_crop_season(start_date, end_date, season_type='auto'):
     """Determine Rabi/Kharif season and predict appropriate crops"""
@@ -37,11 +42,7 @@ def crop_type_identification(geometry, start_date, end_date, season_type='auto')
     try:
         season, expected_crops = determine_crop_season(start_date, end_date, season_type)
         
-        collection = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
-                     .filterBounds(geometry)
-                     .filterDate(start_date, end_date)
-                     .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20))
-                     .median())
+        collection = clear_composite(geometry, start_date, end_date, max_cloud=20)
         
         ndvi = collection.normalizedDifference(['B8', 'B4']).rename('NDVI')
         evi = collection.expression('2.5 * ((NIR - RED) / (NIR + 6 * RED - 7.5 * BLUE + 1))',
@@ -72,18 +73,22 @@ def crop_type_identification(geometry, start_date, end_date, season_type='auto')
         classification = classification.where(sugarcane_final, 1)
         classification = classification.where(rice_final, 0)
         
-        def get_crop_area(class_value):
-            mask = classification.eq(class_value)
-            area = mask.multiply(ee.Image.pixelArea()).reduceRegion(
-                reducer=ee.Reducer.sum(), geometry=geometry, scale=30, maxPixels=1e9)
-            area_info = area.getInfo()
-            area_m2 = list(area_info.values())[0] if area_info and area_info.values() else 0
-            return float(area_m2 / 1e6) if area_m2 else 0.0
+        classified_vis = classification.visualize(min=0, max=3, palette=crop_colors).clip(geometry)
+        
+        # Class areas (one grouped pass, or one pixel download for small ROIs), the classified layer,
+        # time series and weather are independent
+        if use_local_engine(geometry):
+            areas_call = lambda: class_areas(fetch_pixels({'class': classification}, geometry, window_end=end_date), 'class', [0, 1, 2, 3])
+        else:
+            areas_call = lambda: get_class_areas(classification, geometry, [0, 1, 2, 3])
+        outputs = run_parallel({
+            'areas': areas_call,
+            'classified_url': tile_url(classified_vis),
+            'time_series': lambda: generate_time_series(geometry, start_date, end_date, 'NDVI'),
+            'weather': lambda: get_weather_data(geometry, start_date, end_date)
+        })
         
-        crop1_area = float(get_crop_area(0))
-        crop2_area = float(get_crop_area(1))
-        crop3_area = float(get_crop_area(2))
-        other_area = float(get_crop_area(3))
+        crop1_area, crop2_area, crop3_area, other_area = [float(area_m2 / 1e6) for area_m2 in outputs['areas']]
         
         if season == 'Kharif':
             crops = {'Rice': crop1_area, 'Sugarcane': crop2_area, 'Cotton/Maize': crop3_area, 'Other': other_area}
@@ -92,10 +97,8 @@ def crop_type_identification(geometry, start_date, end_date, season_type='auto')
         
         dominant_crop = max(crops, key=crops.get) if max(crops.values()) > 0 else 'Unknown'
         
-        classified_vis = classification.visualize(min=0, max=3, palette=crop_colors).clip(geometry)
-        classified_url = classified_vis.getMapId()['tile_fetcher'].url_format
-        
-        time_series_data = generate_time_series(geometry, start_date, end_date, 'NDVI')
+        classified_url = outputs['classified_url']
+        time_series_data = outputs['time_series']
         
         # Filter out crops with 0 area from legend
         filtered_legend = {}
@@ -131,7 +134,7 @@ def crop_type_identification(geometry, start_date, end_date, season_type='auto')
             }
             crop_names = ['Wheat', 'Barley', 'Mustard', 'Other Rabi']
         
-        # Generate individual crop layers and filter legend - only for crops with area > 0
+        # Describe individual crop layers and filter legend - only for crops with area > 0
         for i, crop_name in enumerate(crop_names):
             area = crop_mapping[crop_name]
             if area > 0:  # Only create layer and legend entry if crop has actual area
@@ -141,14 +144,13 @@ def crop_type_identification(geometry, start_date, end_date, season_type='auto')
                 crop_layer = masked_class.visualize(
                     min=i, max=i, palette=[crop_colors[i], crop_colors[i]]
                 ).clip(geometry)
-                layer_url = crop_layer.getMapId()['tile_fetcher'].url_format
-                individual_layers[crop_name] = layer_url
+                individual_layers[crop_name] = layer_descriptor(crop_layer)
         
         # Get crop-specific thresholds
         crop_thresholds = get_crop_specific_thresholds(dominant_crop)
         
         # Get weather data
-        weather_data = get_weather_data(geometry, start_date, end_date)
+        weather_data = outputs['weather']
         
         response_data = {
             'dominant_crop': dominant_crop,
@@ -164,7 +166,8 @@ def crop_type_identification(geometry, start_date, end_date, season_type='auto')
             'time_series': time_series_data,
             'health_score': float((sum([crop1_area, crop2_area, crop3_area]) / sum(crops.values()) * 100) if sum(crops.values()) > 0 else 0),
             'crop_thresholds': crop_thresholds,
-            'weather': weather_data
+            'weather': weather_data,
+            'reduction_scale': reduction_params(geometry)['scale']
         }
         
         response_data.update(crop_areas)
@@ -179,42 +182,36 @@ def crop_type_identification(geometry, start_date, end_date, season_type='auto')
 
 def growth_stage_detection(geometry, start_date, end_date):
     try:
-        collection = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
-                     .filterBounds(geometry)
-                     .filterDate(start_date, end_date)
-                     .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 30))
-                     .median())
+        collection = clear_composite(geometry, start_date, end_date, max_cloud=30)
         
         ndvi = collection.normalizedDifference(['B8', 'B4']).rename('NDVI')
         evi = collection.expression('2.5 * ((NIR - RED) / (NIR + 6 * RED - 7.5 * BLUE + 1))',
             {'NIR': collection.select('B8'), 'RED': collection.select('B4'), 'BLUE': collection.select('B2')}).rename('EVI')
         ndre = collection.normalizedDifference(['B8', 'B5']).rename('NDRE')
         
-        # Get NDVI stats to understand the data range
-        ndvi_stats = ndvi.reduceRegion(
-            reducer=ee.Reducer.minMax().combine(ee.Reducer.mean(), '', True),
-            geometry=geometry, scale=30, maxPixels=1e9
-        ).getInfo()
-        print(f"NDVI stats: {ndvi_stats}")
-        
         # Use more inclusive thresholds based on actual NDVI distribution
         planting_mask = ndvi.gt(0.05).And(ndvi.lt(0.25))
         vegetative_mask = ndvi.gt(0.25).And(ndvi.lt(0.5))
         flowering_mask = ndvi.gt(0.5).And(ndvi.lt(0.75))
         harvest_mask = ndvi.gt(0.75)
         
-        def get_stage_area(mask, stage_name):
-            area = mask.multiply(ee.Image.pixelArea()).reduceRegion(
-                reducer=ee.Reducer.sum(), geometry=geometry, scale=30, maxPixels=1e9)
-            area_info = area.getInfo()
-            print(f"{stage_name} area info: {area_info}")
-            area_value = list(area_info.values())[0] if area_info and area_info.values() else 0
-            return float((area_value or 0) / 1e6)
+        # Stage areas (one grouped pass) and time series are independent;
+        # small ROIs get the areas from a single pixel download instead
+        stage_masks = [planting_mask, vegetative_mask, flowering_mask, harvest_mask]
+        if use_local_engine(geometry):
+            def local_areas():
+                pixels = fetch_pixels({f'stage_{i}': mask for i, mask in enumerate(stage_masks)}, geometry, window_end=end_date)
+                return [masked_area(pixels, f'stage_{i}') for i in range(len(stage_masks))]
+            
+            areas_call = local_areas
+        else:
+            areas_call = lambda: get_mask_areas(stage_masks, geometry)
+        outputs = run_parallel({
+            'areas': areas_call,
+            'time_series': lambda: generate_time_series(geometry, start_date, end_date, 'NDVI')
+        })
         
-        planting_area = float(get_stage_area(planting_mask, "Planting"))
-        vegetative_area = float(get_stage_area(vegetative_mask, "Vegetative"))
-        flowering_area = float(get_stage_area(flowering_mask, "Flowering"))
-        harvest_area = float(get_stage_area(harvest_mask, "Harvest"))
+        planting_area, vegetative_area, flowering_area, harvest_area = [float(area_m2 / 1e6) for area_m2 in outputs['areas']]
         
         stages = {'Planting': planting_area, 'Vegetative': vegetative_area, 
                  'Flowering': flowering_area, 'Harvest': harvest_area}
@@ -222,7 +219,6 @@ def growth_stage_detection(geometry, start_date, end_date):
         
         # Create classification image only for stages with area > 0
         classified = ee.Image(4)  # Default background value
-        stage_masks = [planting_mask, vegetative_mask, flowering_mask, harvest_mask]
         stage_areas = [planting_area, vegetative_area, flowering_area, harvest_area]
         
         for i, (mask, area) in enumerate(zip(stage_masks, stage_areas)):
@@ -231,9 +227,8 @@ def growth_stage_detection(geometry, start_date, end_date):
         
         stage_colors = ['8B4513', '90EE90', 'FFD700', 'FF4500']
         classified_vis = classified.visualize(min=0, max=3, palette=stage_colors).clip(geometry)
-        classified_url = classified_vis.getMapId()['tile_fetcher'].url_format
         
-        # Generate individual stage layers and filter legend - only for stages with area > 0
+        # Describe individual stage layers and filter legend - only for stages with area > 0
         individual_layers = {}
         stage_names = ['Planting', 'Vegetative', 'Flowering', 'Harvest']
         stage_legend_colors = ['#8B4513', '#90EE90', '#FFD700', '#FF4500']
@@ -248,10 +243,12 @@ def growth_stage_detection(geometry, start_date, end_date):
                 stage_layer = masked_class.visualize(
                     min=i, max=i, palette=[stage_colors[i], stage_colors[i]]
                 ).clip(geometry)
-                layer_url = stage_layer.getMapId()['tile_fetcher'].url_format
-                individual_layers[stage_name] = layer_url
+                individual_layers[stage_name] = layer_descriptor(stage_layer)
         
-        time_series_data = generate_time_series(geometry, start_date, end_date, 'NDVI')
+        # The classification is shown right away; stage layers are minted when enabled
+        classified_url = run_call(tile_url(classified_vis))
+        
+        time_series_data = outputs['time_series']
         
         response_data = {
             'planting_area': planting_area,
@@ -267,7 +264,8 @@ def growth_stage_detection(geometry, start_date, end_date):
                 'individual_stages': individual_layers
             },
             'legend': filtered_legend,
-            'time_series': time_series_data
+            'time_series': time_series_data,
+            'reduction_scale': reduction_params(geometry)['scale']
         }
         
         return JsonResponse({
@@ -279,11 +277,7 @@ def growth_stage_detection(geometry, start_date, end_date):
 
 def yield_prediction_analysis(geometry, start_date, end_date):
     try:
-        collection = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
-                     .filterBounds(geometry)
-                     .filterDate(start_date, end_date)
-                     .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 30))
-                     .median())
+        collection = clear_composite(geometry, start_date, end_date, max_cloud=30)
         
         ndvi = collection.normalizedDifference(['B8', 'B4']).rename('NDVI')
         evi = collection.expression('2.5 * ((NIR - RED) / (NIR + 6 * RED - 7.5 * BLUE + 1))',
@@ -296,24 +290,42 @@ def yield_prediction_analysis(geometry, start_date, end_date):
         average_mask = evi.gt(0.3).And(evi.lte(0.4)).And(ndre.gt(0.1))
         poor_mask = evi.lte(0.3).Or(ndmi.lte(-0.1))
         
-        def get_yield_area(mask):
-            area = mask.multiply(ee.Image.pixelArea()).reduceRegion(
-                reducer=ee.Reducer.sum(), geometry=geometry, scale=30, maxPixels=1e9)
-            area_info = area.getInfo()
-            print(f"Area info for mask: {area_info}")
-            area_value = list(area_info.values())[0] if area_info and area_info.values() else 0
-            return float((area_value or 0) / 1e6)
-        
-        excellent_area = float(get_yield_area(excellent_mask))
-        good_area = float(get_yield_area(good_mask))
-        average_area = float(get_yield_area(average_mask))
-        poor_area = float(get_yield_area(poor_mask))
-        
         classified = ee.Image(3).where(excellent_mask, 0).where(good_mask, 1).where(average_mask, 2).where(poor_mask, 3)
         
         stats = ee.Image([ndvi, evi, ndmi, ndre]).reduceRegion(
-            reducer=ee.Reducer.mean(), geometry=geometry, scale=30, maxPixels=1e9)
-        stats_info = stats.getInfo()
+            reducer=ee.Reducer.mean(), geometry=geometry, **reduction_params(geometry))
+        
+        yield_colors = ['00FF00', '90EE90', 'FFD700', 'FF4500']
+        classified_vis = classified.visualize(min=0, max=3, palette=yield_colors).clip(geometry)
+        
+        # Yield classes overlap, so each mask is bit-encoded and summed in one grouped pass;
+        # index means, the classified layer and time series are fetched alongside it.
+        # Small ROIs get the areas and means from a single pixel download instead
+        yield_masks = [excellent_mask, good_mask, average_mask, poor_mask]
+        if use_local_engine(geometry):
+            def local_stats():
+                images = {f'yield_{i}': mask for i, mask in enumerate(yield_masks)}
+                images.update({'NDVI': ndvi, 'EVI': evi, 'NDMI': ndmi, 'NDRE': ndre})
+                pixels = fetch_pixels(images, geometry, window_end=end_date)
+                areas = [masked_area(pixels, f'yield_{i}') for i in range(len(yield_masks))]
+                return areas, {band: masked_mean(pixels, band) for band in ['NDVI', 'EVI', 'NDMI', 'NDRE']}
+            
+            outputs = run_parallel({
+                'local': local_stats,
+                'classified_url': tile_url(classified_vis),
+                'time_series': lambda: generate_time_series(geometry, start_date, end_date, 'NDVI')
+            })
+            outputs['areas'], outputs['stats'] = outputs['local']
+        else:
+            outputs = run_parallel({
+                'areas': lambda: get_mask_areas(yield_masks, geometry),
+                'stats': get_info(stats),
+                'classified_url': tile_url(classified_vis),
+                'time_series': lambda: generate_time_series(geometry, start_date, end_date, 'NDVI')
+            })
+        
+        excellent_area, good_area, average_area, poor_area = [float(area_m2 / 1e6) for area_m2 in outputs['areas']]
+        stats_info = outputs['stats']
         
         evi_val = float(stats_info.get('EVI', 0) or 0)
         ndre_val = float(stats_info.get('NDRE', 0) or 0)
@@ -326,15 +338,12 @@ def yield_prediction_analysis(geometry, start_date, end_date):
         base_yield = float(5.0)
         expected_yield = float(base_yield * biomass_factor * chlorophyll_factor * water_factor)
         
-        yield_colors = ['00FF00', '90EE90', 'FFD700', 'FF4500']
-        classified_vis = classified.visualize(min=0, max=3, palette=yield_colors).clip(geometry)
-        classified_url = classified_vis.getMapId()['tile_fetcher'].url_format
+        classified_url = outputs['classified_url']
         
-        # Generate individual yield layers and filter legend - only for yields with area > 0
+        # Describe individual yield layers and filter legend - only for yields with area > 0
         individual_layers = {}
         yield_names = ['Excellent Yield', 'Good Yield', 'Average Yield', 'Poor Yield']
         yield_legend_colors = ['#00FF00', '#90EE90', '#FFD700', '#FF4500']
-        yield_masks = [excellent_mask, good_mask, average_mask, poor_mask]
         yield_areas = [excellent_area, good_area, average_area, poor_area]
         filtered_legend = {}
         
@@ -348,13 +357,11 @@ def yield_prediction_analysis(geometry, start_date, end_date):
                 yield_layer = masked_class.visualize(
                     min=i, max=i, palette=[yield_colors[i], yield_colors[i]]
                 ).clip(geometry)
-                layer_url = yield_layer.getMapId()['tile_fetcher'].url_format
-                individual_layers[yield_name] = layer_url
-                print(f"Created layer for {yield_name}: {layer_url[:50]}...")
+                individual_layers[yield_name] = layer_descriptor(yield_layer)
             else:
                 print(f"Skipping {yield_name} - no area detected")
         
-        time_series_data = generate_time_series(geometry, start_date, end_date, 'NDVI')
+        time_series_data = outputs['time_series']
         
         print(f"Final yield areas: Excellent={excellent_area}, Good={good_area}, Average={average_area}, Poor={poor_area}")
         print(f"Individual layers created: {list(individual_layers.keys())}")
@@ -377,13 +384,15 @@ def yield_prediction_analysis(geometry, start_date, end_date):
                     'individual_yields': individual_layers
                 },
                 'legend': filtered_legend,
-                'time_series': time_series_data
+                'time_series': time_series_data,
+                'reduction_scale': reduction_params(geometry)['scale']
             }
         })
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
 @csrf_exempt
+@gee_priority(INTERACTIVE)
 def crop_specific_analysis(request):
     """Crop-Specific Analysis for Farm Intelligence"""
     if request.method == 'POST':
@@ -399,7 +408,7 @@ def crop_specific_analysis(request):
             return JsonResponse({'success': False, 'error': 'GEE initialization failed'})
         
         try:
-            geometry = ee.Geometry(roi['geometry'])
+            geometry = prepare_roi(roi)['geometry']
             
             if analysis_type == 'crop_type':
                 return crop_type_identification(geometry, start_date, end_date, season_type)
@@ -407,7 +416,7 @@ def crop_specific_analysis(request):
                 return growth_stage_detection(geometry, start_date, end_date)
             elif analysis_type == 'yield_prediction':
                 return yield_prediction_analysis(geometry, start_date, end_date)
-            
+        
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
     
@@ -1,10 +1,12 @@
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
-import ee
-from .gee_utils import initialize_gee
+from .gee_utils import initialize_gee, clear_composite
+from .gee_executor import run_parallel, run_call, get_info, gee_priority, BATCH
+from .roi import prepare_roi
 
 @csrf_exempt
+@gee_priority(BATCH)
 def get_download_urls(request):
     """Generate GeoTIFF download URL at 10m resolution with all analysis layers"""
     if request.method == 'POST':
@@ -28,18 +30,11 @@ def get_download_urls(request):
                     'error': 'Google Earth Engine initialization failed'
                 })
             
-            # Handle both Feature and direct geometry
-            if 'geometry' in roi:
-                geometry = ee.Geometry(roi['geometry'])
-            else:
-                geometry = ee.Geometry(roi)
+            # Features and bare geometries alike, canonicalized for the 10 m export grid
+            geometry = prepare_roi(roi, scale=10)['geometry']
             
-            # Get Sentinel-2 collection
-            collection = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
-                         .filterBounds(geometry)
-                         .filterDate(start_date, end_date)
-                         .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 50))
-                         .median())
+            # Composite of the clearest Sentinel-2 scenes over the ROI
+            collection = clear_composite(geometry, start_date, end_date, max_cloud=50)
             
             # Resample to 10m resolution for all analysis types
             collection_resampled = collection.resample('bilinear').reproject(
@@ -90,8 +85,14 @@ def get_download_urls(request):
             
             scale = 10
             
+            # ROI area (export strategy) and bounding box (export region) are fetched together
+            roi_info = run_parallel({
+                'area': get_info(geometry.area()),
+                'bounds': get_info(geometry.bounds())
+            })
+            
             # Calculate ROI area to determine export strategy
-            roi_area = geometry.area().getInfo()  # in square meters
+            roi_area = roi_info['area']  # in square meters
             roi_area_km2 = roi_area / 1e6
             
             # Adjust scale based on area size
@@ -123,35 +124,35 @@ def get_download_urls(request):
             export_image = export_image.clip(geometry)
             
             # Get the bounding box for export
-            bounds = geometry.bounds().getInfo()['coordinates']
+            bounds = roi_info['bounds']['coordinates']
             
             # Generate download URL
             try:
-                tiff_url = export_image.getDownloadURL({
+                tiff_url = run_call(lambda: export_image.getDownloadURL({
                     'name': f'{analysis_type}_analysis_{scale}m',
                     'region': bounds,
                     'scale': scale,
                     'crs': 'EPSG:4326',
                     'fileFormat': 'GeoTIFF'
-                })
+                }))
             except Exception as download_error:
                 # If still too large, use lower resolution
                 scale = 100
                 export_image = rgb.clip(geometry)
                 
-                tiff_url = export_image.getDownloadURL({
+                tiff_url = run_call(lambda: export_image.getDownloadURL({
                     'name': f'{analysis_type}_analysis_{scale}m',
                     'region': bounds,
                     'scale': scale,
                     'crs': 'EPSG:4326',
                     'fileFormat': 'GeoTIFF'
-                })
+                }))
             
             return JsonResponse({
                 'success': True,
                 'tiff_url': tiff_url,
                 'resolution': f'{scale}m',
-                'bands': export_image.bandNames().getInfo()
+                'bands': run_call(get_info(export_image.bandNames()))
             })
             
         except Exception as e:
@@ -1,9 +1,19 @@
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
-import ee
+import numpy as np
 import logging
-from .gee_utils import initialize_gee, generate_time_series, get_weather_data, calculate_soil_moisture_index
+from .gee_executor import run_parallel, run_call, get_info, tile_url, gee_priority, PREVIEW, INTERACTIVE
+from .layers import layer_descriptor, local_layer_descriptor
+from .local_compute import use_local_engine, fetch_pixels, masked_area, masked_mean, roi_area, vegetation_index
+from .sampling import approximate_statistics, sampling_summary
+from .sharding import shard_plan, sharded_grouped_sums, reduction_scale
+from .roi import prepare_roi
+from .gee_utils import (initialize_gee, generate_time_series, get_weather_data, evaluate_batch,
+                        grouped_statistics, decode_grouped_statistics, soil_moisture_masks, summarize_soil_moisture,
+                        clear_composite, reduction_params, progressive_scales,
+                        selected_scene_ids, scene_composite,
+                        encode_masks, statistics_values, split_statistics)
 
 logger = logging.getLogger(__name__)
 
@@ -37,7 +47,47 @@ def get_index_legend(index_type):
     }
     return legends.get(index_type, legends['ndvi'])
 
+def server_farm_statistics(geometry, masks, means, params=None):
+    """Mask areas (m²), means and ROI area (m²) from one grouped server-side reduction
+    
+    Large ROIs without an explicit scale are reduced as parallel full-resolution
+    sub-tiles whose grouped sums are merged.
+    """
+    if params is None and shard_plan(geometry) is not None:
+        sums = sharded_grouped_sums(encode_masks(masks), geometry, statistics_values(means))
+        areas_m2, mean_values = split_statistics(sums, len(masks), len(means))
+        return areas_m2, mean_values, run_call(get_info(geometry.area())), None, None
+    
+    stats = evaluate_batch({
+        'groups': grouped_statistics(geometry, masks, means, params),
+        'total_area': geometry.area()
+    })
+    areas_m2, mean_values = decode_grouped_statistics(stats['groups'], len(masks), len(means))
+    return areas_m2, mean_values, stats['total_area'], None, None
+
+def local_farm_statistics(geometry, masks, means, window_end=None):
+    """Mask areas (m²), means and ROI area (m²) reduced locally from one download, with the pixels"""
+    images = {f'mask_{i}': mask for i, mask in enumerate(masks)}
+    images.update({f'mean_{i}': image for i, image in enumerate(means)})
+    pixels = fetch_pixels(images, geometry, window_end=window_end)
+    areas_m2 = [masked_area(pixels, f'mask_{i}') for i in range(len(masks))]
+    mean_values = [masked_mean(pixels, f'mean_{i}') for i in range(len(means))]
+    return areas_m2, mean_values, roi_area(pixels), pixels, None
+
+def approximate_farm_statistics(geometry, masks, means, sample_size=None):
+    """Mask areas (m²), means and ROI area (m²) estimated from a stratified sample, with their 95% intervals"""
+    stats = approximate_statistics(geometry, means, masks, sample_size)
+    areas_m2 = [area or 0 for area, _ in stats['areas']]
+    mean_values = [mean for mean, _ in stats['means']]
+    intervals = {
+        'areas_m2': [interval for _, interval in stats['areas']],
+        'means': [interval for _, interval in stats['means']],
+        'sampling': sampling_summary(stats)
+    }
+    return areas_m2, mean_values, stats['total_area'], None, intervals
+
 @csrf_exempt
+@gee_priority(INTERACTIVE)
 def analyze_farm_roi(request):
     """Basic farm analysis for vegetation indices"""
     if request.method == 'POST':
@@ -50,6 +100,9 @@ def analyze_farm_roi(request):
             compare_start = data.get('compareStartDate')
             compare_end = data.get('compareEndDate')
             index_type = data.get('indexType', 'ndvi')
+            approximate = bool(data.get('approximate', False))
+            sample_size = int(data.get('sampleSize') or 0) or None
+            coarse_pass = data.get('progressivePass')
             
             # Store original dates for time series
             original_start = data.get('originalStartDate', start_date)
@@ -58,26 +111,26 @@ def analyze_farm_roi(request):
             if not initialize_gee():
                 return JsonResponse({'success': False, 'error': 'GEE initialization failed'})
             
-            geometry = ee.Geometry(roi['geometry'])
+            geometry = prepare_roi(roi)['geometry']
             
-            # Get Sentinel-2 collections with fallback
-            def get_collection(start, end):
-                coll = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
-                    .filterBounds(geometry) \
-                    .filterDate(start, end) \
-                    .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 30))
-                if coll.size().getInfo() == 0:
-                    coll = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
-                        .filterBounds(geometry) \
-                        .filterDate(start, end)
-                    if coll.size().getInfo() == 0:
-                        coll = ee.ImageCollection('LANDSAT/LC08/C02/T1_L2') \
-                            .filterBounds(geometry) \
-                            .filterDate(start, end)
-                return coll.median()
+            # A progressive analysis asks for quick coarse passes (0 = coarsest) before the
+            # final one; passes this ROI does not need are answered as skipped
+            coarse_scale = None
+            if coarse_pass is not None:
+                coarse_pass = int(coarse_pass)
+                coarse_scales = progressive_scales(geometry)
+                if coarse_pass >= len(coarse_scales):
+                    return JsonResponse({'success': True, 'data': {'progressive': {'pass': coarse_pass, 'final': False, 'skipped': True}}})
+                coarse_scale = coarse_scales[coarse_pass]
             
-            collection1 = get_collection(start_date, end_date)
-            collection2 = get_collection(compare_start, compare_end)
+            # Harmonized S2/Landsat composites of scene selections resolved once and shared by
+            # the coarse passes and the final analysis, so no pass scores the scenes again
+            selections = run_parallel({
+                'first': lambda: selected_scene_ids(geometry, start_date, end_date, cloud_threshold=30),
+                'second': lambda: selected_scene_ids(geometry, compare_start, compare_end, cloud_threshold=30)
+            })
+            collection1 = scene_composite(selections['first'])
+            collection2 = scene_composite(selections['second'])
             
             # Calculate vegetation indices
             if index_type == 'ndvi':
@@ -101,18 +154,6 @@ def analyze_farm_roi(request):
                 index2 = ndvi2.multiply(100)
                 vis_params = {'min': 0, 'max': 100, 'palette': ['FF4500', 'FFFF00', '32CD32', '006400']}
             
-            # Calculate mean values
-            mean1 = index1.reduceRegion(reducer=ee.Reducer.mean(), geometry=geometry, scale=30, maxPixels=1e13, bestEffort=True).getInfo()
-            mean2 = index2.reduceRegion(reducer=ee.Reducer.mean(), geometry=geometry, scale=30, maxPixels=1e13, bestEffort=True).getInfo()
-            
-            area1 = float(list(mean1.values())[0] if mean1.values() else 0)
-            area2 = float(list(mean2.values())[0] if mean2.values() else 0)
-            change = float(area2 - area1)
-            percentage = float((change / area1) * 100) if area1 > 0 else 0.0
-            
-            # Calculate actual vegetation areas based on index values
-            total_area = float(ee.Geometry(roi['geometry']).area().getInfo() / 4047)  # Convert to acres
-            
             # Calculate healthy vs stressed vegetation based on index values
             if index_type == 'ndvi':
                 healthy_mask = index1.gt(0.4)  # Good + Excellent categories
@@ -127,20 +168,47 @@ def analyze_farm_roi(request):
                 healthy_mask = index1.gt(50)  # Good + Excellent categories
                 stressed_mask = index1.gt(0).And(index1.lte(50))  # Poor + Fair categories
             
-            # Calculate areas in acres
-            healthy_area_m2 = healthy_mask.multiply(ee.Image.pixelArea()).reduceRegion(
-                reducer=ee.Reducer.sum(), geometry=geometry, scale=30, maxPixels=1e13, bestEffort=True).getInfo()
-            stressed_area_m2 = stressed_mask.multiply(ee.Image.pixelArea()).reduceRegion(
-                reducer=ee.Reducer.sum(), geometry=geometry, scale=30, maxPixels=1e13, bestEffort=True).getInfo()
+            # Soil moisture index (NDMI) for the first period
+            ndmi = collection1.normalizedDifference(['B8', 'B11']).rename('NDMI')
+            moisture_masks = soil_moisture_masks(ndmi)
             
-            healthy_area = float((list(healthy_area_m2.values())[0] if healthy_area_m2.values() else 0) / 4047)
-            stressed_area = float((list(stressed_area_m2.values())[0] if stressed_area_m2.values() else 0) / 4047)
-            health_score = float((healthy_area / (healthy_area + stressed_area) * 100) if (healthy_area + stressed_area) > 0 else 0)
+            # Index means, vegetation and moisture areas come from one combined reduction, from one
+            # pixel download for small ROIs, or from a stratified sample when approximate results
+            # were asked for; weather and time series are fetched alongside
+            area_masks = [healthy_mask, stressed_mask] + moisture_masks
+            mean_images = [index1, index2, ndmi]
+            params = reduction_params(geometry, scale=coarse_scale)
+            if coarse_scale is not None:
+                # Coarse passes only report the numbers, on the analysis pool like the final one
+                outputs = run_parallel({
+                    'stats': lambda: server_farm_statistics(geometry, area_masks, mean_images, params)
+                })
+            else:
+                if approximate:
+                    stats_call = lambda: approximate_farm_statistics(geometry, area_masks, mean_images, sample_size)
+                elif use_local_engine(geometry):
+                    stats_call = lambda: local_farm_statistics(geometry, area_masks, mean_images, max(end_date or '', compare_end or ''))
+                else:
+                    stats_call = lambda: server_farm_statistics(geometry, area_masks, mean_images)
+                outputs = run_parallel({
+                    'stats': stats_call,
+                    'weather': lambda: get_weather_data(geometry, start_date, end_date),
+                    'time_series': lambda: generate_time_series(geometry, original_start, original_end, index_type.upper())
+                })
+            areas_m2, means, total_area_m2, pixels, intervals = outputs['stats']
             
-            # Generate visualization with proper masking
-            vegetation_mask = index1.gt(-1)  # Basic vegetation mask
-            index1_vis = index1.updateMask(vegetation_mask).visualize(**vis_params).clip(geometry)
-            index1_url = index1_vis.getMapId()['tile_fetcher'].url_format
+            # Generate visualization with proper masking; small ROIs render their
+            # layers locally from the downloaded index instead of minting map IDs
+            if pixels is not None:
+                index_values = pixels['mean_0']
+                grid = pixels['grid']
+                main_layer = local_layer_descriptor(
+                    np.ma.masked_where(np.ma.filled(index_values <= -1, True), index_values), grid, vis_params,
+                    index1.updateMask(index1.gt(-1)).clip(geometry))
+            else:
+                vegetation_mask = index1.gt(-1)  # Basic vegetation mask
+                index1_vis = index1.updateMask(vegetation_mask).visualize(**vis_params).clip(geometry)
+                main_layer = layer_descriptor(index1_vis)
             
             # Create individual layers for each vegetation health category
             individual_layers = {}
@@ -166,54 +234,94 @@ def analyze_farm_roi(request):
                 else:
                     category_mask = index1.gte(min_val).And(index1.lt(max_val))
                 
-                # Mask the index values and visualize with solid color
                 masked_index = index1.updateMask(category_mask)
+                if pixels is not None:
+                    if i == len(thresholds) - 1:
+                        in_category = index_values >= min_val
+                    else:
+                        in_category = (index_values >= min_val) & (index_values < max_val)
+                    category_values = np.ma.masked_where(~np.ma.filled(in_category, False), index_values)
+                    individual_layers[category_name] = local_layer_descriptor(
+                        category_values, grid, {'min': min_val, 'max': max_val, 'palette': [colors[i], colors[i]]},
+                        masked_index.clip(geometry))
+                    continue
+                
+                # Mask the index values and visualize with solid color
                 category_layer = masked_index.visualize(
                     min=min_val, max=max_val, palette=[colors[i], colors[i]]
                 ).clip(geometry)
-                layer_url = category_layer.getMapId()['tile_fetcher'].url_format
-                individual_layers[category_name] = layer_url
-                print(f"Created layer for {category_name}: {layer_url[:50]}...")
+                individual_layers[category_name] = layer_descriptor(category_layer)
+            
+            area1 = float(means[0] or 0)
+            area2 = float(means[1] or 0)
+            change = float(area2 - area1)
+            percentage = float((change / area1) * 100) if area1 > 0 else 0.0
+            
+            # Calculate actual vegetation areas based on index values
+            total_area = float(total_area_m2 / 4047)  # Convert to acres
+            
+            # Calculate areas in acres
+            healthy_area = float(areas_m2[0] / 4047)
+            stressed_area = float(areas_m2[1] / 4047)
+            health_score = float((healthy_area / (healthy_area + stressed_area) * 100) if (healthy_area + stressed_area) > 0 else 0)
             
             print(f"Final individual_layers: {list(individual_layers.keys())}")
             
             # Get weather data
-            weather_data = get_weather_data(geometry, start_date, end_date)
+            weather_data = outputs.get('weather')
             
             # Get soil moisture index
-            soil_moisture = calculate_soil_moisture_index(collection1, geometry)
+            soil_moisture = summarize_soil_moisture(float(means[2] or 0), areas_m2[2:])
+            
+            scale = params['scale'] if coarse_scale is not None else reduction_scale(geometry)
+            result = {
+                'area1': area1,
+                'area2': area2,
+                'change': change,
+                'percentage': percentage,
+                'breakdown': {
+                    'healthy_veg': healthy_area,
+                    'stressed_veg': stressed_area
+                },
+                'total_crop_area': total_area,
+                'health_score': health_score,
+                'layers': {
+                    'main_index': main_layer,
+                    'individual_categories': individual_layers
+                },
+                'legend': legend,
+                'time_series': outputs.get('time_series'),
+                'preloaded_time_series': coarse_scale is None,
+                'weather': weather_data,
+                'soil_moisture': soil_moisture,
+                'reduction_scale': scale,
+                'progressive': {'pass': coarse_pass, 'scale': scale, 'final': coarse_scale is None}
+            }
+            
+            # With approximate=true every estimate is reported with its 95% half-width
+            if intervals is not None:
+                area_intervals = [float((interval or 0) / 4047) for interval in intervals['areas_m2']]
+                result['confidence_intervals'] = {
+                    'area1': intervals['means'][0],
+                    'area2': intervals['means'][1],
+                    'healthy_veg': area_intervals[0],
+                    'stressed_veg': area_intervals[1],
+                    'ndmi_value': intervals['means'][2]
+                }
+                result['sampling'] = intervals['sampling']
             
             return JsonResponse({
                 'success': True,
-                'data': {
-                    'area1': area1,
-                    'area2': area2,
-                    'change': change,
-                    'percentage': percentage,
-                    'breakdown': {
-                        'healthy_veg': healthy_area,
-                        'stressed_veg': stressed_area
-                    },
-                    'total_crop_area': total_area,
-                    'health_score': health_score,
-                    'layers': {
-                        'main_index': index1_url,
-                        'individual_categories': individual_layers
-                    },
-                    'legend': legend,
-                    'time_series': generate_time_series(geometry, original_start, original_end, index_type.upper()),
-                    'preloaded_time_series': True,
-                    'weather': weather_data,
-                    'soil_moisture': soil_moisture
-                }
+                'data': result
             })
-            
+        
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
     
     return JsonResponse({'success': False, 'error': 'Invalid method'})
 
 @csrf_exempt
+@gee_priority(PREVIEW)
 def preview_index(request):
     """Preview vegetation index visualization"""
     if request.method == 'POST':
@@ -228,13 +336,9 @@ def preview_index(request):
             if not initialize_gee():
                 return JsonResponse({'success': False, 'error': 'GEE initialization failed'})
             
-            geometry = ee.Geometry(roi['geometry'])
+            geometry = prepare_roi(roi)['geometry']
             
-            collection = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
-                         .filterBounds(geometry)
-                         .filterDate(start_date, end_date)
-                         .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 30))
-                         .median())
+            collection = clear_composite(geometry, start_date, end_date, max_cloud=30)
             
             if index_type == 'ndvi':
                 index = collection.normalizedDifference(['B8', 'B4'])
@@ -251,8 +355,12 @@ def preview_index(request):
                 index = ndvi.multiply(100)
                 vis_params = {'min': 0, 'max': 100, 'palette': ['FF4500', 'FFFF00', '32CD32', '006400']}
             
-            map_id = index.visualize(**vis_params).getMapId()
-            preview_url = map_id['tile_fetcher'].url_format
+            if use_local_engine(geometry):
+                # Bands are shared by every index type, so switching index reuses the stored patch
+                pixels = fetch_pixels({band: collection.select(band) for band in ['B2', 'B4', 'B8', 'B11']}, geometry, window_end=end_date)
+                preview_url = local_layer_descriptor(vegetation_index(pixels, index_type), pixels['grid'], vis_params, index)['url']
+            else:
+                preview_url = run_call(tile_url(index.visualize(**vis_params)))
             
             return JsonResponse({
                 'success': True,
@@ -261,7 +369,7 @@ def preview_index(request):
                     'legend': get_index_legend(index_type)
                 }
             })
-            
+        
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
     
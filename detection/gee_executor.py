@@ -0,0 +1,203 @@
+import hashlib
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from .gee_session import record_call
+
+# Priority classes, each with its own share of GEE_MAX_CONCURRENCY
+PREVIEW = 'preview'
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+
+# Sub-tile reductions of sharded ROIs; they never fan out further, so they get a
+# pool of their own that scheduler threads may wait on
+SHARD = 'shard'
+PRIORITIES = (PREVIEW, INTERACTIVE, BATCH, SHARD)
+
+_local = threading.local()
+_executors = {}
+_executor_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {
+    priority: {
+        'submitted': 0,
+        'completed': 0,
+        'failed': 0,
+        'queued': 0,
+        'active': 0,
+        'wait_total_ms': 0.0,
+        'wait_max_ms': 0.0,
+        'recent_waits_ms': deque(maxlen=200)
+    }
+    for priority in PRIORITIES
+}
+
+_tile_cache_stats = {'hits': 0, 'misses': 0}
+
+def priority_workers(priority):
+    """Number of concurrent GEE calls reserved for a priority class"""
+    share = settings.GEE_PRIORITY_SHARES.get(priority, 0)
+    return max(1, round(settings.GEE_MAX_CONCURRENCY * share))
+
+def get_executor(priority=INTERACTIVE):
+    """Process-wide thread pool for one priority class"""
+    with _executor_lock:
+        if priority not in _executors:
+            _executors[priority] = ThreadPoolExecutor(
+                max_workers=priority_workers(priority),
+                thread_name_prefix=f'gee-{priority}'
+            )
+    return _executors[priority]
+
+def current_priority():
+    """Priority class of the request running on this thread"""
+    return getattr(_local, 'priority', INTERACTIVE)
+
+def gee_priority(priority):
+    """View decorator that schedules every GEE call of the request in a priority class"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            previous = current_priority()
+            _local.priority = priority
+            try:
+                return view(*args, **kwargs)
+            finally:
+                _local.priority = previous
+        return wrapper
+    return decorator
+
+def _scheduled(priority, call, queued_at):
+    """Run a call on its priority pool, recording queue time and outcome"""
+    wait_ms = (time.monotonic() - queued_at) * 1000
+    with _stats_lock:
+        stats = _stats[priority]
+        stats['queued'] -= 1
+        stats['active'] += 1
+        stats['wait_total_ms'] += wait_ms
+        stats['wait_max_ms'] = max(stats['wait_max_ms'], wait_ms)
+        stats['recent_waits_ms'].append(wait_ms)
+    
+    failed = False
+    try:
+        result = call()
+        record_call()
+        return result
+    except Exception as e:
+        failed = True
+        record_call(e)
+        raise
+    finally:
+        with _stats_lock:
+            stats['active'] -= 1
+            stats['failed' if failed else 'completed'] += 1
+
+def run_parallel(calls, priority=None):
+    """Run independent blocking GEE calls concurrently and gather results by key
+    
+    calls maps a key to a zero-argument callable (e.g. a getInfo or getMapId).
+    Calls are queued on the pool of the given (or current request's) priority
+    class. The first failure is re-raised once every call has been submitted.
+    Calls made from a pool thread run inline so nested fan-outs cannot deadlock;
+    only shard calls, which never wait on other calls, are queued from one.
+    """
+    priority = priority or current_priority()
+    thread = threading.current_thread().name
+    if thread.startswith('gee') and (priority != SHARD or thread.startswith(f'gee-{SHARD}')):
+        return {key: call() for key, call in calls.items()}
+    
+    executor = get_executor(priority)
+    
+    futures = {}
+    for key, call in calls.items():
+        with _stats_lock:
+            _stats[priority]['submitted'] += 1
+            _stats[priority]['queued'] += 1
+        futures[key] = executor.submit(_scheduled, priority, call, time.monotonic())
+    return {key: future.result() for key, future in futures.items()}
+
+def run_call(call, priority=None):
+    """Run a single blocking GEE call on the scheduler and return its result"""
+    return run_parallel({'result': call}, priority)['result']
+
+def expression_fingerprint(image, vis_params=None, expression=None):
+    """Stable key of an image expression and its visualization, computed client-side"""
+    payload = (expression or image.serialize()) + json.dumps(vis_params or {}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def cached_tile_url(key):
+    """Earth Engine tile URL minted earlier for an expression fingerprint, if still cached"""
+    return cache.get(f'gee-tile-url:{key}')
+
+def register_layer(fingerprint, expression, vis_params=None):
+    """Keep a layer's expression so its tiles can be minted again after the map ID expires"""
+    cache.set(f'gee-layer:{fingerprint}', {'expression': expression, 'vis_params': vis_params}, settings.GEE_LAYER_TTL)
+
+def public_tile_url(fingerprint, url):
+    """Tile URL handed to the browser: the local tile proxy, or Earth Engine directly"""
+    if settings.GEE_TILE_PROXY:
+        return f'/tiles/{fingerprint}/{{z}}/{{x}}/{{y}}.png'
+    return url
+
+def mint_tile_url(image, vis_params, fingerprint):
+    """Earth Engine tile URL of a fingerprinted layer, calling getMapId only on a cache miss
+    
+    URLs are cached for GEE_TILE_URL_TTL seconds, inside the map ID lifetime,
+    so repeat views of a layer skip getMapId.
+    """
+    url = cached_tile_url(fingerprint)
+    with _stats_lock:
+        _tile_cache_stats['hits' if url else 'misses'] += 1
+    if url is None:
+        url = image.getMapId(vis_params)['tile_fetcher'].url_format
+        cache.set(f'gee-tile-url:{fingerprint}', url, settings.GEE_TILE_URL_TTL)
+    return url
+
+def tile_url(image, vis_params=None, key=None):
+    """Deferred getMapId returning the tile URL format of an image for the browser"""
+    def mint():
+        fingerprint = key
+        if fingerprint is None:
+            expression = image.serialize()
+            fingerprint = expression_fingerprint(image, vis_params, expression)
+            register_layer(fingerprint, expression, vis_params)
+        return public_tile_url(fingerprint, mint_tile_url(image, vis_params, fingerprint))
+    return mint
+
+def get_info(value):
+    """Deferred getInfo of a server-side value"""
+    return lambda: value.getInfo()
+
+def scheduler_stats():
+    """Per-priority concurrency share, queue depth and queue-time metrics"""
+    with _stats_lock:
+        snapshot = {priority: dict(stats, recent_waits_ms=sorted(stats['recent_waits_ms']))
+                    for priority, stats in _stats.items()}
+    
+    report = {}
+    for priority, stats in snapshot.items():
+        waits = stats.pop('recent_waits_ms')
+        started = stats['submitted'] - stats['queued']
+        report[priority] = dict(
+            stats,
+            workers=priority_workers(priority),
+            wait_avg_ms=round(stats['wait_total_ms'] / started, 1) if started else 0.0,
+            wait_p50_ms=round(waits[len(waits) // 2], 1) if waits else 0.0,
+            wait_p95_ms=round(waits[int(len(waits) * 0.95)], 1) if waits else 0.0,
+            wait_total_ms=round(stats['wait_total_ms'], 1),
+            wait_max_ms=round(stats['wait_max_ms'], 1)
+        )
+    return report
+
+def tile_cache_stats():
+    """Hit/miss counters of the tile URL cache"""
+    with _stats_lock:
+        stats = dict(_tile_cache_stats)
+    lookups = stats['hits'] + stats['misses']
+    return dict(stats, hit_rate=round(stats['hits'] / lookups, 3) if lookups else None)
@@ -0,0 +1,115 @@
+import threading
+import time
+from collections import deque
+import ee
+from django.conf import settings
+from .gee_transport import get_transport
+
+# Messages of errors that mean the EE session (credentials or connection) is broken
+_SESSION_ERROR_MARKERS = (
+    'not initialized',
+    'unauthenticated',
+    'invalid_grant',
+    'invalid credentials',
+    'could not refresh',
+    'connection aborted',
+    'connection reset',
+    'remote end closed',
+)
+
+_lock = threading.Lock()
+_state = {
+    'initialized': False,
+    'needs_reinit': False,
+    'initialized_at': None,
+    'initializations': 0,
+    'last_success': None,
+    'last_error': None,
+    'last_error_at': None,
+    'recent': deque(maxlen=50)
+}
+
+def is_session_error(exc):
+    """Whether an exception points at auth/transport failure rather than a bad request"""
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    try:
+        from google.auth.exceptions import GoogleAuthError
+        if isinstance(exc, GoogleAuthError):
+            return True
+    except ImportError:
+        pass
+    message = str(exc).lower()
+    return any(marker in message for marker in _SESSION_ERROR_MARKERS)
+
+def _initialize():
+    """Initialize Earth Engine; the caller holds _lock"""
+    try:
+        ee.Initialize(http_transport=get_transport())
+    except Exception as e:
+        _state['initialized'] = False
+        _state['last_error'] = str(e)
+        _state['last_error_at'] = time.time()
+        print(f"GEE initialization error: {e}")
+        print("Please run: earthengine authenticate")
+        return False
+    
+    _state['initialized'] = True
+    _state['needs_reinit'] = False
+    _state['initialized_at'] = time.time()
+    _state['initializations'] += 1
+    _state['recent'].clear()
+    print("GEE initialized successfully")
+    return True
+
+def initialize_session(force=False):
+    """Initialize the process-wide EE session (e.g. right after a worker forks)"""
+    with _lock:
+        if force:
+            _state['initialized'] = False
+        if _state['initialized'] and not _state['needs_reinit']:
+            return True
+        return _initialize()
+
+def ensure_session():
+    """Return whether the session is usable, re-initializing only after a session error
+    
+    No liveness probe is made: health comes from the outcomes of real calls.
+    """
+    if _state['initialized'] and not _state['needs_reinit']:
+        return True
+    return initialize_session()
+
+def record_call(exc=None):
+    """Record the outcome of an EE call; session errors schedule a re-initialization"""
+    now = time.time()
+    with _lock:
+        _state['recent'].append(exc is None)
+        if exc is None:
+            _state['last_success'] = now
+        elif is_session_error(exc):
+            _state['needs_reinit'] = True
+            _state['last_error'] = str(exc)
+            _state['last_error_at'] = now
+
+def session_health():
+    """Session state, age and recent call outcomes for this worker process"""
+    now = time.time()
+    with _lock:
+        recent = list(_state['recent'])
+        state = dict(_state)
+    
+    last_success = state['last_success']
+    verified = last_success is not None and now - last_success <= settings.GEE_SESSION_TTL
+    return {
+        'initialized': state['initialized'],
+        'healthy': state['initialized'] and not state['needs_reinit'],
+        'verified_within_ttl': verified,
+        'needs_reinit': state['needs_reinit'],
+        'initializations': state['initializations'],
+        'age_s': round(now - state['initialized_at'], 1) if state['initialized_at'] else None,
+        'last_success_age_s': round(now - last_success, 1) if last_success else None,
+        'recent_calls': len(recent),
+        'recent_success_rate': round(sum(recent) / len(recent), 3) if recent else None,
+        'last_error': state['last_error']
+    }
@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+import httplib2
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+# Quota and transient server errors worth retrying
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_transport = None
+_transport_pid = None
+_transport_lock = threading.Lock()
+
+class PooledTransport:
+    """httplib2.Http-like transport for the ee client over a pooled keep-alive session
+    
+    Connections to the Earth Engine API are kept alive and shared by every
+    scheduler thread, and 429/5xx responses are retried with exponential backoff.
+    """
+    
+    def __init__(self, pool_size, max_retries=3, backoff=0.5, timeout=None):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.pool_size = pool_size
+        
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        
+        self._lock = threading.Lock()
+        self._counters = {
+            'requests': 0,
+            'retries': 0,
+            'retries_exhausted': 0,
+            'connection_errors': 0,
+            'retry_statuses': {}
+        }
+    
+    def _count(self, key, status=None):
+        with self._lock:
+            self._counters[key] += 1
+            if status is not None:
+                statuses = self._counters['retry_statuses']
+                statuses[status] = statuses.get(status, 0) + 1
+    
+    def _retry_delay(self, response, attempt):
+        """Honour Retry-After when the server sends one, otherwise back off exponentially"""
+        retry_after = response.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), 30.0)
+        return self.backoff * (2 ** attempt)
+    
+    def request(self, uri, method='GET', body=None, headers=None, redirections=None, connection_type=None, **kwargs):
+        """Make an HTTP request with httplib2 semantics"""
+        attempt = 0
+        while True:
+            self._count('requests')
+            try:
+                response = self.session.request(method, uri, data=body, headers=headers, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+                # Builtin exceptions are the ones the API client treats as transient
+                self._count('connection_errors')
+                raise ConnectionError(e) from e
+            except requests.exceptions.Timeout as e:
+                self._count('connection_errors')
+                raise TimeoutError(e) from e
+            
+            if response.status_code not in RETRY_STATUSES:
+                break
+            if attempt >= self.max_retries:
+                self._count('retries_exhausted')
+                break
+            
+            self._count('retries', response.status_code)
+            time.sleep(self._retry_delay(response, attempt))
+            attempt += 1
+        
+        response_headers = dict(response.headers)
+        response_headers['status'] = response.status_code
+        return httplib2.Response(response_headers), response.content
+    
+    def connection_stats(self):
+        """New vs reused connections across the adapter's connection pools"""
+        pools = self.adapter.poolmanager.pools
+        opened = served = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                opened += pool.num_connections
+                served += pool.num_requests
+        return {'connections_opened': opened, 'requests_sent': served, 'connections_reused': max(0, served - opened)}
+    
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters, retry_statuses=dict(self._counters['retry_statuses']))
+        connections = self.connection_stats()
+        sent = connections['requests_sent']
+        return dict(
+            counters,
+            **connections,
+            pool_size=self.pool_size,
+            reuse_rate=round(connections['connections_reused'] / sent, 3) if sent else None
+        )
+
+def get_transport():
+    """Process-wide transport, rebuilt in a forked worker so sockets are never shared"""
+    global _transport, _transport_pid
+    with _transport_lock:
+        if _transport is None or _transport_pid != os.getpid():
+            _transport = PooledTransport(
+                pool_size=settings.GEE_HTTP_POOL_SIZE,
+                max_retries=settings.GEE_HTTP_RETRIES,
+                backoff=settings.GEE_HTTP_BACKOFF,
+                timeout=settings.GEE_HTTP_TIMEOUT
+            )
+            _transport_pid = os.getpid()
+    return _transport
+
+def transport_stats():
+    """Request, retry and connection-reuse counters of this process's transport"""
+    if _transport is None or _transport_pid != os.getpid():
+        return None
+    return _transport.stats()
@@ -1,90 +1,319 @@
 import ee
+import hashlib
+import json
+import math
+import threading
 from datetime import datetime, timedelta
 import calendar
+from django.conf import settings
+from django.core.cache import cache
+from .gee_executor import run_call
+from .gee_session import ensure_session
+from .local_compute import METERS_PER_DEGREE
+from .scene_catalog import has_imagery, has_any_imagery, geometry_bounds
 
 def initialize_gee():
-    """Initialize Google Earth Engine with user authentication"""
+    """Make sure the process-wide Earth Engine session is initialized
+    
+    The session is set up once per worker and only re-initialized after an
+    auth/transport error, so requests no longer pay for a probe round trip.
+    """
+    return ensure_session()
+
+def evaluate_batch(values):
+    """Evaluate a dict of server-side values with a single getInfo round trip"""
+    return ee.Dictionary(values).getInfo()
+
+# Reduction scales (m) the policy steps through as ROIs grow
+SCALE_STEPS = [10, 20, 30, 60, 100, 250, 500, 1000, 2500, 5000]
+
+# Finest scale (m) and the setting holding the pixel budget, per kind of reduction
+SCALE_POLICIES = {
+    'analysis': (30, 'GEE_ANALYSIS_PIXEL_BUDGET'),
+    'time_series': (100, 'GEE_SERIES_PIXEL_BUDGET')
+}
+
+def roi_area_estimate(geometry):
+    """Client-side area (m²) of a ROI's lon/lat bounding box, or None when it cannot be computed"""
+    bounds = geometry_bounds(geometry)
+    if bounds is None:
+        return None
+    west, south, east, north = bounds
+    height = (north - south) * METERS_PER_DEGREE
+    width = (east - west) * METERS_PER_DEGREE * math.cos(math.radians((south + north) / 2))
+    return max(width * height, 0.0)
+
+def reduction_params(geometry, kind='analysis', scale=None):
+    """reduceRegion scale, tileScale and maxPixels for a ROI, sized to a pixel budget
+    
+    The scale is the finest step that keeps the ROI's bounding box within the
+    pixel budget of this kind of reduction, so a 1-acre farm is reduced at the
+    native 30 m while a district is coarsened just enough to stay predictable.
+    A requested scale (a progressive pass) replaces it when it is coarser.
+    tileScale rises with the pixel count to keep aggregations within tile memory.
+    The result is passed to reduceRegion as keyword arguments.
+    """
+    min_scale, budget_setting = SCALE_POLICIES[kind]
+    area = roi_area_estimate(geometry)
+    if area is None:
+        return {'scale': max(min_scale, scale or 0), 'tileScale': 4, 'maxPixels': 1e13, 'bestEffort': True}
+    
+    budget = getattr(settings, budget_setting)
+    scale = max(scale or 0, next((step for step in SCALE_STEPS if step >= min_scale and area / step ** 2 <= budget), SCALE_STEPS[-1]))
+    pixels = area / scale ** 2
+    tile_scale = 1 if pixels <= 1e6 else 2 if pixels <= 4e6 else 4
+    return {'scale': scale, 'tileScale': tile_scale, 'maxPixels': 1e13}
+
+# Coarse scales (m) a progressive analysis can answer at before its final reduction
+PROGRESSIVE_SCALES = [2500, 1000, 250, 100]
+
+# Coarse passes a progressive analysis runs, and the fewest ROI pixels one needs to be worth showing
+PROGRESSIVE_PASSES = 2
+PROGRESSIVE_MIN_PIXELS = 100
+
+def progressive_scales(geometry):
+    """Scales of a ROI's coarse progressive passes, coarsest first
+    
+    The passes are the finest steps at least twice as coarse as the ROI's
+    final reduction scale that still cover it with enough pixels, e.g. 250 m
+    and 100 m ahead of a 30 m farm analysis. Small ROIs get none.
+    """
+    area = roi_area_estimate(geometry)
+    if area is None:
+        return []
+    final_scale = reduction_params(geometry)['scale']
+    scales = [scale for scale in PROGRESSIVE_SCALES if scale >= 2 * final_scale and area / scale ** 2 >= PROGRESSIVE_MIN_PIXELS]
+    return scales[-PROGRESSIVE_PASSES:]
+
+# Sentinel-2 band names are the common scheme; Landsat 8/9 equivalents in the same order
+HARMONIZED_BANDS = ['B2', 'B3', 'B4', 'B8', 'B11', 'B12']
+LANDSAT_BANDS = ['SR_B2', 'SR_B3', 'SR_B4', 'SR_B5', 'SR_B6', 'SR_B7']
+
+def _harmonize_landsat(image):
+    """Rename Landsat C2 L2 bands to Sentinel-2 names and scale to S2 reflectance units (x10000)"""
+    reflectance = image.select(LANDSAT_BANDS, HARMONIZED_BANDS).multiply(0.0000275).add(-0.2).multiply(10000)
+    return ee.Image(reflectance.copyProperties(image, ['system:time_start'])).set('SOURCE_ID', image.get('system:id'))
+
+# Scene classification (SCL) classes counted as cloudy: shadow, medium/high probability, cirrus
+CLOUD_SCL_CLASSES = [3, 8, 9, 10]
+
+def roi_cloud_scores(geometry, start_date, end_date, candidates=None):
+    """Sentinel-2 scenes over the ROI with ROI_CLOUD set to the % of the ROI that is unusable
+    
+    Cloud, shadow and cirrus pixels (SCL) and pixels outside the scene footprint
+    count as unusable, so a clear scene over a cloudy tile still scores well.
+    Only the candidates (GEE_SCORE_CANDIDATES by default) with the lowest
+    tile-wide CLOUDY_PIXEL_PERCENTAGE are scored: that sort is metadata only,
+    so long or multi-tile windows no longer cost a reduction per scene.
+    """
+    params = reduction_params(geometry, 'time_series')
+    
+    def score(image):
+        cloudy = image.select('SCL').remap(CLOUD_SCL_CLASSES, [1] * len(CLOUD_SCL_CLASSES), 0).unmask(1).rename('cloud')
+        fraction = cloudy.reduceRegion(
+            reducer=ee.Reducer.mean(),
+            geometry=geometry,
+            **params
+        ).get('cloud')
+        return image.set({'ROI_CLOUD': ee.Number(fraction).multiply(100), 'SOURCE_ID': image.get('system:id')})
+    
+    return ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
+        .filterBounds(geometry) \
+        .filterDate(start_date, end_date) \
+        .sort('CLOUDY_PIXEL_PERCENTAGE') \
+        .limit(candidates or settings.GEE_SCORE_CANDIDATES) \
+        .map(score)
+
+def clearest_scenes(scored, max_cloud=None, k=None):
+    """The k scenes of a roi_cloud_scores collection with the least cloud over the ROI"""
+    if max_cloud is not None:
+        scored = scored.filter(ee.Filter.lt('ROI_CLOUD', max_cloud))
+    return scored.sort('ROI_CLOUD').limit(k or settings.GEE_COMPOSITE_TOP_K)
+
+def clear_composite(geometry, start_date, end_date, max_cloud=None, k=None):
+    """Median of the k Sentinel-2 scenes with the least cloud over the ROI"""
+    return clearest_scenes(roi_cloud_scores(geometry, start_date, end_date), max_cloud, k).median()
+
+def harmonized_collection(geometry, start_date, end_date, cloud_threshold=50):
+    """Best available surface reflectance collection with common band names
+    
+    The k clearest Sentinel-2 scenes under cloud_threshold % cloud over the ROI,
+    then the k clearest of any cloud cover, then Landsat 8/9; the fallback is
+    chosen server-side so no size() probe blocks the request. Branches the
+    local scene catalog knows to be empty are left out.
+    """
+    scored = roi_cloud_scores(geometry, start_date, end_date)
+    s2_all = clearest_scenes(scored).select(HARMONIZED_BANDS)
+    s2_clear = clearest_scenes(scored, cloud_threshold).select(HARMONIZED_BANDS)
+    landsat = ee.ImageCollection('LANDSAT/LC08/C02/T1_L2') \
+        .merge(ee.ImageCollection('LANDSAT/LC09/C02/T1_L2')) \
+        .filterBounds(geometry) \
+        .filterDate(start_date, end_date) \
+        .map(_harmonize_landsat)
+    
+    if has_imagery(geometry, start_date, end_date, 'S2') is False:
+        return landsat
+    return ee.ImageCollection(ee.Algorithms.If(
+        s2_clear.size().gt(0), s2_clear,
+        ee.Algorithms.If(s2_all.size().gt(0), s2_all, landsat)))
+
+def _empty_composite():
+    """Harmonized bands that are masked everywhere, the composite of a window without scenes"""
+    return ee.Image.constant([0] * len(HARMONIZED_BANDS)).rename(HARMONIZED_BANDS).updateMask(0)
+
+def harmonized_composite(geometry, start_date, end_date, cloud_threshold=50):
+    """Median of the harmonized collection; fully masked bands when no scene exists"""
+    empty = _empty_composite()
+    if has_any_imagery(geometry, start_date, end_date) is False:
+        return empty
+    
+    collection = harmonized_collection(geometry, start_date, end_date, cloud_threshold)
+    return ee.Image(ee.Algorithms.If(collection.size().gt(0), collection.median(), empty))
+
+_selection_lock = threading.Lock()
+_selection_locks = {}
+
+def selected_scene_ids(geometry, start_date, end_date, cloud_threshold=50):
+    """IDs of the scenes harmonized_collection picks for a ROI and window, resolved once
+    
+    The selection, cloud scoring included, is evaluated with one getInfo and
+    kept in the shared cache for GEE_SCENE_SELECTION_TTL seconds, so the
+    progressive passes and the final analysis of a ROI composite the same
+    scenes without scoring them again. Requests of one worker asking for the
+    same selection at once wait for the first instead of scoring in parallel.
+    """
+    if has_any_imagery(geometry, start_date, end_date) is False:
+        return []
+    payload = geometry.serialize() + json.dumps([start_date, end_date, cloud_threshold])
+    key = f'scene-selection:{hashlib.sha256(payload.encode("utf-8")).hexdigest()}'
+    
+    with _selection_lock:
+        lock = _selection_locks.setdefault(key, threading.Lock())
     try:
-        # Check if already initialized
-        try:
-            ee.Number(1).getInfo()
-            return True
-        except:
-            pass
-        
-        # Initialize with default credentials
-        ee.Initialize()
-        
-        # Test if initialization worked
-        ee.Number(1).getInfo()
-        print("GEE initialized successfully")
-        return True
-        
-    except Exception as e:
-        print(f"GEE initialization error: {e}")
-        print("Please run: earthengine authenticate")
-        return False
+        with lock:
+            ids = cache.get(key)
+            if ids is None:
+                collection = harmonized_collection(geometry, start_date, end_date, cloud_threshold)
+                ids = run_call(lambda: collection.aggregate_array('SOURCE_ID').getInfo())
+                cache.set(key, ids, settings.GEE_SCENE_SELECTION_TTL)
+    finally:
+        with _selection_lock:
+            _selection_locks.pop(key, None)
+    return ids
+
+def scene_composite(ids):
+    """Median of harmonized scenes given by asset ID; fully masked bands when there are none"""
+    if not ids:
+        return _empty_composite()
+    images = [
+        _harmonize_landsat(ee.Image(scene_id)) if scene_id.startswith('LANDSAT/') else ee.Image(scene_id).select(HARMONIZED_BANDS)
+        for scene_id in ids
+    ]
+    return ee.ImageCollection(images).median()
+
+def grouped_sums(class_image, geometry, values=None, params=None):
+    """Server-side sums of value bands (pixel area by default) per class value, in one pass"""
+    if values is None:
+        values = [ee.Image.pixelArea()]
+    
+    value_count = len(values)
+    return ee.Image.cat(values).addBands(class_image.int().rename('class')).reduceRegion(
+        reducer=ee.Reducer.sum().repeat(value_count).group(groupField=value_count, groupName='class'),
+        geometry=geometry,
+        **(params or reduction_params(geometry))
+    ).get('groups')
+
+def decode_grouped_sums(groups):
+    """Map each class value to its list of sums from a grouped_sums result"""
+    return {int(group['class']): group['sum'] for group in groups or []}
+
+def encode_masks(masks):
+    """Bit-encode (possibly overlapping) 0/1 masks into a single class band"""
+    code = ee.Image(0)
+    for i, mask in enumerate(masks):
+        code = code.add(mask.unmask(0).multiply(1 << i))
+    return code.rename('class')
 
-def generate_time_series(geometry, start_date, end_date, analysis_type='WATER'):
-    """Generate monthly time series data"""
+def mask_totals(sums, mask_count, index=0):
+    """Total of one summed value for every mask encoded with encode_masks"""
+    totals = [0.0] * mask_count
+    for code, values in sums.items():
+        for i in range(mask_count):
+            if code & (1 << i):
+                totals[i] += float(values[index] or 0)
+    return totals
+
+def get_class_areas(class_image, geometry, class_values, params=None):
+    """Area (m²) of each class value of a classification from one grouped reduction"""
+    sums = decode_grouped_sums(grouped_sums(class_image, geometry, params=params).getInfo())
+    return [float(sums.get(value, [0])[0] or 0) for value in class_values]
+
+def get_mask_areas(masks, geometry, params=None):
+    """Area (m²) of each mask, overlaps counted for every mask, from one grouped reduction"""
+    sums = decode_grouped_sums(grouped_sums(encode_masks(masks), geometry, params=params).getInfo())
+    return mask_totals(sums, len(masks))
+
+def statistics_values(means=None):
+    """Value bands of grouped_statistics: pixel area, then a mask-weighted sum and its weight per mean"""
+    values = [ee.Image.pixelArea()]
+    for image in means or []:
+        weight = image.mask().unmask(0)
+        values += [image.unmask(0).multiply(weight), weight]
+    return values
+
+def grouped_statistics(geometry, masks, means=None, params=None):
+    """Server-side mask areas and band means from one grouped reduction
+    
+    Each mean band is carried as a mask-weighted sum next to its weight, so a
+    single ee.Reducer.sum().group() pass over the bit-encoded masks returns both.
+    """
+    return grouped_sums(encode_masks(masks), geometry, statistics_values(means), params)
+
+def decode_grouped_statistics(groups, mask_count, mean_count):
+    """Split a grouped_statistics result into mask areas (m²) and band means"""
+    return split_statistics(decode_grouped_sums(groups), mask_count, mean_count)
+
+def split_statistics(sums, mask_count, mean_count):
+    """Mask areas (m²) and band means from decoded grouped_statistics sums"""
+    areas = mask_totals(sums, mask_count)
+    
+    means = []
+    for i in range(mean_count):
+        total = sum(float(values[1 + 2 * i] or 0) for values in sums.values())
+        weight = sum(float(values[2 + 2 * i] or 0) for values in sums.values())
+        means.append(total / weight if weight > 0 else None)
+    
+    return areas, means
+
+def generate_time_series(geometry, start_date, end_date, analysis_type='WATER', engine='server'):
+    """Generate monthly time series data
+    
+    The 'server' engine maps every month on Earth Engine and fetches the whole
+    series in one call; the 'client' engine issues one request per month.
+    """
     try:
         start = datetime.strptime(start_date, '%Y-%m-%d')
         end = datetime.strptime(end_date, '%Y-%m-%d')
         
-        months = []
-        areas = []
+        bounds = _month_bounds(start, end)
+        months = [month_start[:7] for month_start, _ in bounds]
         
-        current = start.replace(day=1)
-        while current <= end:
-            # Get last day of current month
-            last_day = calendar.monthrange(current.year, current.month)[1]
-            month_end = current.replace(day=last_day)
-            
-            # Don't go beyond end date
-            if month_end > end:
-                month_end = end
-            
+        # Months the scene catalog knows to be empty are skipped without a request
+        available = [has_imagery(geometry, month_start, month_end, 'S2') is not False
+                     for month_start, month_end in bounds]
+        
+        # District-scale ROIs are reduced as parallel full-resolution sub-tiles
+        from .sharding import shard_plan
+        plan = shard_plan(geometry, 'time_series') if engine == 'server' else None
+        
+        if engine == 'server':
             try:
-                # Use Sentinel-2 for water detection
-                collection = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
-                            .filterBounds(geometry)
-                            .filterDate(current.strftime('%Y-%m-%d'), month_end.strftime('%Y-%m-%d'))
-                            .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 50))
-                            .limit(5))  # Limit collection size
-                
-                if collection.size().getInfo() > 0:
-                    image = collection.median()
-                    
-                    if analysis_type == 'WATER':
-                        # MNDWI for Sentinel-2
-                        mndwi = image.normalizedDifference(['B3', 'B11'])
-                        water = mndwi.gt(0.1)
-                        area = water.multiply(ee.Image.pixelArea()).reduceRegion(
-                            reducer=ee.Reducer.sum(), geometry=geometry, scale=100, maxPixels=1e7
-                        ).getInfo()
-                        value = float(next((v for v in area.values() if v), 0) / 1e6)
-                    else:
-                        # NDVI for vegetation
-                        ndvi = image.normalizedDifference(['B8', 'B4'])
-                        mean_value = ndvi.reduceRegion(
-                            reducer=ee.Reducer.mean(), geometry=geometry, scale=100, maxPixels=1e7
-                        ).getInfo()
-                        value = float(next((v for v in mean_value.values() if v), 0))
-                else:
-                    value = 0
-                    
+                areas = _server_time_series(geometry, start, end, available, analysis_type, plan)
             except Exception as e:
-                print(f"Error processing month {current.strftime('%Y-%m')}: {e}")
-                value = 0.0
-            
-            months.append(current.strftime('%Y-%m'))
-            areas.append(value)
-            
-            # Move to next month
-            if current.month == 12:
-                current = current.replace(year=current.year + 1, month=1)
-            else:
-                current = current.replace(month=current.month + 1)
+                print(f"Server-side time series failed, using monthly requests: {e}")
+                areas = _client_time_series(geometry, start, end, available, analysis_type)
+        else:
+            areas = _client_time_series(geometry, start, end, available, analysis_type)
         
         # Apply interpolation to fill gaps
         interpolated_areas = interpolate_missing_values(areas)
@@ -92,9 +321,10 @@ def generate_time_series(geometry, start_date, end_date, analysis_type='WATER'):
         return {
             'months': months,
             'areas': interpolated_areas,
-            'index_type': analysis_type.upper() if analysis_type != 'WATER' else 'WATER'
+            'index_type': analysis_type.upper() if analysis_type != 'WATER' else 'WATER',
+            'scale': plan['scale'] if plan else reduction_params(geometry, 'time_series')['scale']
         }
-        
+    
     except Exception as e:
         print(f"Time series generation failed: {e}")
         return {
@@ -103,10 +333,148 @@ def generate_time_series(geometry, start_date, end_date, analysis_type='WATER'):
             'index_type': analysis_type.upper() if analysis_type != 'WATER' else 'WATER'
         }
 
+def _monthly_value(image, geometry, analysis_type, params=None):
+    """Server-side reduction of a monthly composite, keyed as 'value'
+    
+    Both kinds are plain sums, so reductions of sub-tiles add up exactly: the
+    water area, or the NDVI as a mask-weighted sum next to its 'weight'.
+    """
+    params = params or reduction_params(geometry, 'time_series')
+    if analysis_type == 'WATER':
+        # MNDWI water area for Sentinel-2 (m²)
+        water = image.normalizedDifference(['B3', 'B11']).gt(0.1)
+        return water.multiply(ee.Image.pixelArea()).rename('value').reduceRegion(
+            reducer=ee.Reducer.sum(), geometry=geometry, **params
+        )
+    
+    # NDVI for vegetation
+    ndvi = image.normalizedDifference(['B8', 'B4'])
+    weight = ndvi.mask().unmask(0)
+    return ee.Image.cat([ndvi.unmask(0).multiply(weight).rename('value'), weight.rename('weight')]).reduceRegion(
+        reducer=ee.Reducer.sum(), geometry=geometry, **params
+    )
+
+def _month_bounds(start, end):
+    """(month_start, month_end) date strings of every month of the series"""
+    bounds = []
+    current = start.replace(day=1)
+    while current <= end:
+        last_day = calendar.monthrange(current.year, current.month)[1]
+        month_end = min(current.replace(day=last_day), end)
+        bounds.append((current.strftime('%Y-%m-%d'), month_end.strftime('%Y-%m-%d')))
+        
+        if current.month == 12:
+            current = current.replace(year=current.year + 1, month=1)
+        else:
+            current = current.replace(month=current.month + 1)
+    return bounds
+
+def _monthly_collection(geometry, month_start, month_end):
+    """Sentinel-2 scenes used for a single month of the time series"""
+    # The 5 clearest scenes over the ROI keep each monthly composite small
+    return clearest_scenes(roi_cloud_scores(geometry, month_start, month_end), max_cloud=50, k=5)
+
+def _to_series_value(stats, analysis_type):
+    """Convert a reduced monthly dictionary to km² (water) or the index mean"""
+    value = stats.get('value') if stats else None
+    if value is None:
+        return None
+    if analysis_type == 'WATER':
+        return float(value / 1e6)
+    weight = stats.get('weight') or 0
+    return float(value / weight) if weight > 0 else None
+
+def _month_window(origin, last, offset):
+    """Server-side (start, end) dates of a month of the series, the end clamped to its last day"""
+    month_start = origin.advance(offset, 'month')
+    # Last day of the month, but don't go beyond end date
+    month_end = month_start.advance(1, 'month').advance(-1, 'day')
+    month_end = ee.Date(ee.Algorithms.If(month_end.millis().gt(last.millis()), last, month_end))
+    return month_start, month_end
+
+def _server_monthly_stats(geometry, start, end, offsets, analysis_type):
+    """ee.List of the reduced monthly dictionaries of the given month offsets"""
+    origin = ee.Date(start.replace(day=1).strftime('%Y-%m-%d'))
+    last = ee.Date(end.strftime('%Y-%m-%d'))
+    
+    def month_stats(offset):
+        collection = _monthly_collection(geometry, *_month_window(origin, last, offset))
+        stats = _monthly_value(collection.median(), geometry, analysis_type)
+        
+        # Empty months map to an empty dictionary and come back as None
+        return ee.Algorithms.If(collection.size().gt(0), stats, ee.Dictionary())
+    
+    return ee.List(offsets).map(month_stats)
+
+def _monthly_scene_ids(geometry, start, end, offsets):
+    """ee.List of the scene IDs composited for each given month, chosen over the whole ROI"""
+    origin = ee.Date(start.replace(day=1).strftime('%Y-%m-%d'))
+    last = ee.Date(end.strftime('%Y-%m-%d'))
+    return ee.List(offsets).map(
+        lambda offset: _monthly_collection(geometry, *_month_window(origin, last, offset)).aggregate_array('SOURCE_ID'))
+
+def _scene_monthly_stats(monthly_ids, region, analysis_type, params):
+    """ee.List of the reduced dictionaries of monthly composites given by scene IDs, over one region"""
+    return ee.List([
+        _monthly_value(ee.ImageCollection([ee.Image(scene_id) for scene_id in ids]).median(), region, analysis_type, params)
+        if ids else ee.Dictionary()
+        for ids in monthly_ids
+    ])
+
+def _server_time_series(geometry, start, end, available, analysis_type, plan=None):
+    """Map every available month over an ee.List and fetch the series with one getInfo
+    
+    With a shard plan the scenes of every month are scored and chosen once over
+    the whole ROI; the sub-tiles then only reduce composites of those scene IDs
+    in parallel, and the monthly sums are added up.
+    """
+    offsets = [offset for offset, has_scenes in enumerate(available) if has_scenes]
+    series = [None] * len(available)
+    if not offsets:
+        return series
+    
+    if plan is None:
+        monthly = _server_monthly_stats(geometry, start, end, offsets, analysis_type).getInfo()
+    else:
+        from .sharding import run_sharded, merge_sums
+        monthly_ids = _monthly_scene_ids(geometry, start, end, offsets).getInfo()
+        shards = run_sharded(
+            lambda region, params: _scene_monthly_stats(monthly_ids, region, analysis_type, params), plan)
+        monthly = [merge_sums(month) for month in zip(*shards)]
+    for offset, stats in zip(offsets, monthly):
+        series[offset] = _to_series_value(stats, analysis_type)
+    return series
+
+def _client_time_series(geometry, start, end, available, analysis_type):
+    """Fetch the series month by month, isolating failures to a single month"""
+    areas = []
+    
+    for (month_start, month_end), has_scenes in zip(_month_bounds(start, end), available):
+        if not has_scenes:
+            areas.append(0)
+            continue
+        
+        try:
+            collection = _monthly_collection(geometry, month_start, month_end)
+            
+            if collection.size().getInfo() > 0:
+                stats = _monthly_value(collection.median(), geometry, analysis_type).getInfo()
+                value = _to_series_value(stats, analysis_type) or 0
+            else:
+                value = 0
+        
+        except Exception as e:
+            print(f"Error processing month {month_start[:7]}: {e}")
+            value = 0.0
+        
+        areas.append(value)
+    
+    return areas
+
 def interpolate_missing_values(areas):
     """Interpolate missing (zero/None) values in time series data using linear interpolation"""
     if not areas or len(areas) <= 1:
-        return areas
+        return [val or 0 for val in areas] if areas else areas
     
     interpolated = areas.copy()
     
@@ -212,7 +580,7 @@ def get_weather_data(geometry, start_date, end_date):
             'temperature_status': 'Optimal' if 15 <= avg_temp <= 30 else 'Stressful',
             'rainfall_status': 'Adequate' if 100 <= total_rainfall <= 400 else 'Inadequate' if total_rainfall < 100 else 'Excessive'
         }
-        
+    
     except Exception as e:
         print(f"Weather data error: {e}")
         return {
@@ -223,75 +591,71 @@ def get_weather_data(geometry, start_date, end_date):
             'rainfall_status': 'Unknown'
         }
 
+def soil_moisture_masks(ndmi):
+    """Very moist, moist, moderate, dry and very dry NDMI masks"""
+    return [
+        ndmi.gt(0.3),
+        ndmi.gt(0.2).And(ndmi.lte(0.3)),
+        ndmi.gt(0.0).And(ndmi.lte(0.2)),
+        ndmi.gt(-0.2).And(ndmi.lte(0.0)),
+        ndmi.lte(-0.2)
+    ]
+
+def summarize_soil_moisture(ndmi_value, areas):
+    """Classify soil moisture from the mean NDMI and the soil_moisture_masks areas (m²)"""
+    # Classify moisture levels
+    if ndmi_value > 0.3:
+        moisture_level = 'Very Moist'
+        moisture_status = 'Excellent'
+        water_stress = 'None'
+    elif ndmi_value > 0.2:
+        moisture_level = 'Moist'
+        moisture_status = 'Good'
+        water_stress = 'Low'
+    elif ndmi_value > 0.0:
+        moisture_level = 'Moderate'
+        moisture_status = 'Fair'
+        water_stress = 'Moderate'
+    elif ndmi_value > -0.2:
+        moisture_level = 'Dry'
+        moisture_status = 'Poor'
+        water_stress = 'High'
+    else:
+        moisture_level = 'Very Dry'
+        moisture_status = 'Critical'
+        water_stress = 'Severe'
+    
+    # Convert to acres
+    very_moist, moist, moderate, dry, very_dry = [float(area / 4047) for area in areas]
+    
+    return {
+        'ndmi_value': round(ndmi_value, 3),
+        'moisture_level': moisture_level,
+        'moisture_status': moisture_status,
+        'water_stress': water_stress,
+        'areas': {
+            'very_moist': round(very_moist, 2),
+            'moist': round(moist, 2),
+            'moderate': round(moderate, 2),
+            'dry': round(dry, 2),
+            'very_dry': round(very_dry, 2)
+        },
+        'irrigation_needed': water_stress in ['High', 'Severe']
+    }
+
 def calculate_soil_moisture_index(image, geometry):
     """Calculate Soil Moisture Index using NDMI"""
     try:
         # NDMI (Normalized Difference Moisture Index)
         ndmi = image.normalizedDifference(['B8', 'B11']).rename('NDMI')
+        masks = soil_moisture_masks(ndmi)
         
-        # Calculate mean NDMI
-        ndmi_stats = ndmi.reduceRegion(
-            reducer=ee.Reducer.mean(),
-            geometry=geometry,
-            scale=30,
-            maxPixels=1e9
-        ).getInfo()
-        
-        ndmi_value = float(ndmi_stats.get('NDMI', 0) or 0)
-        
-        # Classify moisture levels
-        if ndmi_value > 0.3:
-            moisture_level = 'Very Moist'
-            moisture_status = 'Excellent'
-            water_stress = 'None'
-        elif ndmi_value > 0.2:
-            moisture_level = 'Moist'
-            moisture_status = 'Good'
-            water_stress = 'Low'
-        elif ndmi_value > 0.0:
-            moisture_level = 'Moderate'
-            moisture_status = 'Fair'
-            water_stress = 'Moderate'
-        elif ndmi_value > -0.2:
-            moisture_level = 'Dry'
-            moisture_status = 'Poor'
-            water_stress = 'High'
-        else:
-            moisture_level = 'Very Dry'
-            moisture_status = 'Critical'
-            water_stress = 'Severe'
-        
-        # Calculate moisture areas
-        very_moist = ndmi.gt(0.3)
-        moist = ndmi.gt(0.2).And(ndmi.lte(0.3))
-        moderate = ndmi.gt(0.0).And(ndmi.lte(0.2))
-        dry = ndmi.gt(-0.2).And(ndmi.lte(0.0))
-        very_dry = ndmi.lte(-0.2)
-        
-        def get_area(mask):
-            area = mask.multiply(ee.Image.pixelArea()).reduceRegion(
-                reducer=ee.Reducer.sum(),
-                geometry=geometry,
-                scale=30,
-                maxPixels=1e9
-            ).getInfo()
-            return float((area.get('NDMI', 0) or 0) / 4047)  # Convert to acres
-        
-        return {
-            'ndmi_value': round(ndmi_value, 3),
-            'moisture_level': moisture_level,
-            'moisture_status': moisture_status,
-            'water_stress': water_stress,
-            'areas': {
-                'very_moist': round(get_area(very_moist), 2),
-                'moist': round(get_area(moist), 2),
-                'moderate': round(get_area(moderate), 2),
-                'dry': round(get_area(dry), 2),
-                'very_dry': round(get_area(very_dry), 2)
-            },
-            'irrigation_needed': water_stress in ['High', 'Severe']
-        }
+        # Mean NDMI and moisture areas from one grouped reduction
+        groups = grouped_statistics(geometry, masks, [ndmi]).getInfo()
+        areas, means = decode_grouped_statistics(groups, len(masks), 1)
         
+        return summarize_soil_moisture(float(means[0] or 0), areas)
+    
     except Exception as e:
         print(f"Soil moisture calculation error: {e}")
         return {
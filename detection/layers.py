@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import threading
+import ee
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from .gee_executor import (expression_fingerprint, cached_tile_url, register_layer, public_tile_url,
+                           mint_tile_url, tile_url, run_call, PREVIEW)
+from .patch_store import patch_path, load_patch, save_patch
+
+_remint_lock = threading.Lock()
+# layer_id -> lock held while that layer's map ID is minted again
+_remint_locks = {}
+
+def layer_descriptor(image, vis_params=None):
+    """Register a layer for on-demand minting and return its lightweight descriptor
+    
+    No getMapId is made here: the expression is kept in the cache under its
+    fingerprint and /mint-layer/ mints the tile URL when the layer is enabled.
+    A URL already minted for the same expression is returned right away.
+    """
+    expression = image.serialize()
+    layer_id = expression_fingerprint(image, vis_params, expression)
+    register_layer(layer_id, expression, vis_params)
+    url = cached_tile_url(layer_id)
+    return {'id': layer_id, 'url': public_tile_url(layer_id, url) if url else None}
+
+def _registered_image(layer_id):
+    """Image and vis params of a registered layer, or None once the layer has expired"""
+    layer = cache.get(f'gee-layer:{layer_id}')
+    if layer is None or 'expression' not in layer:
+        return None
+    return ee.Image(ee.deserializer.fromCloudApiJSON(layer['expression'])), layer['vis_params']
+
+def mint_layer_url(layer_id):
+    """Deferred getMapId of a registered layer, or None once the layer has expired"""
+    layer = _registered_image(layer_id)
+    if layer is None:
+        return None
+    image, vis_params = layer
+    return tile_url(image, vis_params, key=layer_id)
+
+def upstream_tile_url(layer_id):
+    """Earth Engine tile URL of a registered layer, minting it again if the map ID expired"""
+    url = cached_tile_url(layer_id)
+    if url:
+        return url
+    
+    # Concurrent tile requests for an expired layer share a single getMapId; other
+    # layers mint without waiting for it
+    with _remint_lock:
+        lock = _remint_locks.setdefault(layer_id, threading.Lock())
+    try:
+        with lock:
+            url = cached_tile_url(layer_id)
+            if url:
+                return url
+            layer = _registered_image(layer_id)
+            if layer is None:
+                return None
+            image, vis_params = layer
+            return run_call(lambda: mint_tile_url(image, vis_params, layer_id), PREVIEW)
+    finally:
+        with _remint_lock:
+            _remint_locks.pop(layer_id, None)
+
+def local_layer_descriptor(values, grid, vis_params, image=None):
+    """Descriptor of a layer rendered locally from a pixel array on a download grid
+    
+    The array is kept in the patch store under the layer's fingerprint and the
+    tile proxy renders its tiles with numpy, so no map ID is minted while it is
+    stored. image is the same layer as an Earth Engine image; it is registered
+    alongside so the proxy mints it upstream once the array has been evicted.
+    """
+    values = np.ma.asarray(values)
+    digest = hashlib.sha256()
+    digest.update(np.ma.getdata(values).tobytes())
+    digest.update(np.ma.getmaskarray(values).tobytes())
+    digest.update(json.dumps([grid, vis_params, list(values.shape)], sort_keys=True).encode('utf-8'))
+    layer_id = digest.hexdigest()
+    
+    try:
+        # Registering the layer again marks its array as recently used
+        os.utime(patch_path(layer_id))
+    except OSError:
+        save_patch(layer_id, {'values': values}, {'grid': grid})
+    layer = {'local': True, 'vis_params': vis_params}
+    if image is not None:
+        layer['expression'] = image.serialize()
+    cache.set(f'gee-layer:{layer_id}', layer, settings.GEE_LAYER_TTL)
+    return {'id': layer_id, 'url': f'/tiles/{layer_id}/{{z}}/{{x}}/{{y}}.png'}
+
+def local_layer(layer_id):
+    """Pixel array, grid and vis params of a locally rendered layer, or None"""
+    layer = cache.get(f'gee-layer:{layer_id}')
+    if layer is None or not layer.get('local'):
+        return None
+    patch = load_patch(layer_id)
+    if patch is None:
+        return None
+    return patch['values'], patch['grid'], layer['vis_params']
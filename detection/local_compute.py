@@ -0,0 +1,126 @@
+import math
+import ee
+import numpy as np
+from django.conf import settings
+from .gee_executor import run_call
+from .patch_store import patch_key, load_patch, save_patch
+from .scene_catalog import geometry_bounds
+
+# Metres per degree of latitude, used to size the download grid
+METERS_PER_DEGREE = 111320.0
+
+def pixel_grid(bounds, scale=30):
+    """EPSG:4326 pixel grid of roughly scale metres covering lon/lat bounds"""
+    west, south, east, north = bounds
+    deg_lat = scale / METERS_PER_DEGREE
+    deg_lon = deg_lat / max(math.cos(math.radians((south + north) / 2)), 0.01)
+    return {
+        'dimensions': {
+            'width': max(1, math.ceil((east - west) / deg_lon)),
+            'height': max(1, math.ceil((north - south) / deg_lat))
+        },
+        'affineTransform': {
+            'scaleX': deg_lon, 'shearX': 0, 'translateX': west,
+            'shearY': 0, 'scaleY': -deg_lat, 'translateY': north
+        },
+        'crsCode': 'EPSG:4326'
+    }
+
+def use_local_engine(roi, scale=30):
+    """Whether a ROI is small enough to download its pixels and reduce them locally"""
+    if not settings.GEE_LOCAL_COMPUTE:
+        return False
+    bounds = geometry_bounds(roi)
+    if bounds is None:
+        return False
+    dimensions = pixel_grid(bounds, scale)['dimensions']
+    return dimensions['width'] * dimensions['height'] <= settings.GEE_LOCAL_MAX_PIXELS
+
+def fetch_pixels(images, geometry, scale=30, window_end=None):
+    """Download named single-band images over a ROI as masked numpy arrays in one call
+    
+    Every image is evaluated by a single computePixels request on a ~scale m
+    grid, so an analysis costs one download instead of a reduction per value.
+    The result maps each name to a masked array (masked outside the ROI and
+    wherever the image is masked) and 'area' to the pixel areas in m².
+    Downloads are kept in the patch store, so repeating an analysis over the
+    same ROI and window reads memory-mapped arrays instead of the network;
+    window_end, the last date the images cover, lets windows reaching the
+    present expire (see patch_key).
+    """
+    bounds = geometry_bounds(geometry)
+    if bounds is None:
+        raise ValueError('ROI bounds cannot be computed locally')
+    grid = pixel_grid(bounds, scale)
+    
+    # Masks travel as separate byte bands so masked pixels are never mistaken for zeros
+    bands = []
+    for name, image in images.items():
+        image = ee.Image(image)
+        bands.append(image.unmask(0).toFloat().rename(name))
+        bands.append(image.mask().gt(0).unmask(0).toByte().rename(f'{name}__valid'))
+    inside = ee.Image.constant(1).clip(geometry).unmask(0)
+    bands.append(ee.Image.pixelArea().multiply(inside).toFloat().rename('__area'))
+    
+    stack = ee.Image.cat(bands)
+    
+    # Patches already downloaded for this grid and expression are read back from disk
+    key = patch_key(grid, stack.serialize(), window_end)
+    result = load_patch(key)
+    if result is not None:
+        return result
+    
+    pixels = run_call(lambda: ee.data.computePixels({
+        'expression': stack,
+        'fileFormat': 'NUMPY_NDARRAY',
+        'grid': grid
+    }))
+    
+    area = pixels['__area'].astype(np.float64)
+    outside = area <= 0
+    result = {'area': np.where(outside, 0.0, area)}
+    for name in images:
+        valid = pixels[f'{name}__valid'] > 0
+        result[name] = np.ma.masked_array(pixels[name].astype(np.float64), mask=outside | ~valid)
+    
+    try:
+        save_patch(key, result, {'grid': grid})
+    except OSError as e:
+        print(f"Could not store pixel patch {key}: {e}")
+    result['grid'] = grid
+    return result
+
+def masked_area(pixels, name):
+    """Area (m²) where a 0/1 image is set"""
+    selected = np.ma.filled(pixels[name] > 0, False)
+    return float(pixels['area'][selected].sum())
+
+def class_areas(pixels, name, class_values):
+    """Area (m²) of each class value of a classification"""
+    values = np.ma.filled(pixels[name], np.nan)
+    return [float(pixels['area'][values == value].sum()) for value in class_values]
+
+def masked_mean(pixels, name):
+    """Mean of an image over its unmasked pixels in the ROI, or None when all are masked"""
+    values = pixels[name]
+    if values.count() == 0:
+        return None
+    return float(values.mean())
+
+def roi_area(pixels):
+    """Area (m²) of the ROI as covered by the download grid"""
+    return float(pixels['area'].sum())
+
+def normalized_difference(first, second):
+    """(first - second) / (first + second) of masked arrays, masked where the sum is zero"""
+    return (first - second) / (first + second)
+
+def vegetation_index(pixels, index_type):
+    """NDVI, EVI, NDMI or VCI of downloaded B2/B4/B8/B11 bands, defined as in the farm views"""
+    if index_type == 'ndvi':
+        return normalized_difference(pixels['B8'], pixels['B4'])
+    if index_type == 'evi':
+        return 2.5 * ((pixels['B8'] - pixels['B4']) / (pixels['B8'] + 6 * pixels['B4'] - 7.5 * pixels['B2'] + 1))
+    if index_type == 'ndmi':
+        return normalized_difference(pixels['B8'], pixels['B11'])
+    return normalized_difference(pixels['B8'], pixels['B4']) * 100
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import date, datetime
+import numpy as np
+from django.conf import settings
+
+# Rescan the store every this many writes so other workers' patches are accounted for
+RESCAN_EVERY = 50
+
+_lock = threading.Lock()
+_evict_lock = threading.Lock()
+_store = {'bytes': None, 'writes': 0}
+_stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evicted_patches': 0}
+
+def freshness_stamp(window_end):
+    """Expiry period of a patch whose date window ends within GEE_PATCH_FRESH_DAYS of today, else ''"""
+    try:
+        end = datetime.strptime(window_end[:10], '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return ''
+    if (date.today() - end).days > settings.GEE_PATCH_FRESH_DAYS:
+        return ''
+    return str(int(time.time() // settings.GEE_PATCH_FRESH_TTL))
+
+def patch_key(grid, expression, window_end=None):
+    """Key of a pixel patch: its download grid (ROI bounds and scale) and image expression
+    
+    The serialized expression already carries the date window and bands, so the
+    same analysis over the same ROI always maps to the same patch. Windows that
+    end near the present (window_end, 'YYYY-MM-DD') also carry the current
+    expiry period, so scenes ingested after the download are picked up within
+    GEE_PATCH_FRESH_TTL; stale periods age out of the store by LRU.
+    """
+    payload = json.dumps(grid, sort_keys=True) + expression + freshness_stamp(window_end)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def patch_path(key):
+    """Sharded on-disk directory of a patch"""
+    return os.path.join(settings.GEE_PATCH_STORE_DIR, key[:2], key)
+
+def _scan():
+    """Every stored patch as (last use, size, path)"""
+    patches = []
+    root = settings.GEE_PATCH_STORE_DIR
+    if not os.path.isdir(root):
+        return patches
+    for shard in os.listdir(root):
+        shard_path = os.path.join(root, shard)
+        if not os.path.isdir(shard_path):
+            continue
+        for key in os.listdir(shard_path):
+            # Patches still being written are not evictable entries
+            if key.endswith('.tmp'):
+                continue
+            path = os.path.join(shard_path, key)
+            try:
+                size = sum(entry.stat().st_size for entry in os.scandir(path))
+                patches.append((os.stat(path).st_mtime, size, path))
+            except OSError:
+                continue
+    return patches
+
+def _evict():
+    """Delete least recently used patches until the store is back under 90% of its budget"""
+    if not _evict_lock.acquire(blocking=False):
+        return
+    try:
+        patches = sorted(_scan())
+        total = sum(size for _, size, _ in patches)
+        target = settings.GEE_PATCH_STORE_MAX_BYTES * 0.9
+        evicted = 0
+        for _, size, path in patches:
+            if total <= target:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            evicted += 1
+        with _lock:
+            _store['bytes'] = total
+            _stats['evicted_patches'] += evicted
+    finally:
+        _evict_lock.release()
+
+def load_patch(key):
+    """Arrays of a stored patch as read-only memory-mapped views, or None
+    
+    Masked arrays are rebuilt over the mapped data and mask files without
+    copying, so repeat analyses read straight from the page cache.
+    """
+    path = patch_path(key)
+    try:
+        with open(os.path.join(path, 'index.json')) as f:
+            index = json.load(f)
+        arrays = {}
+        for name, masked in index['arrays'].items():
+            data = np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+            if masked:
+                mask = np.load(os.path.join(path, f'{name}.mask.npy'), mmap_mode='r')
+                data = np.ma.masked_array(data, mask=mask, copy=False)
+            arrays[name] = data
+        os.utime(path)
+    except (OSError, ValueError, KeyError):
+        with _lock:
+            _stats['misses'] += 1
+        return None
+    
+    with _lock:
+        _stats['hits'] += 1
+    return dict(arrays, **index['extra'])
+
+def save_patch(key, arrays, extra=None):
+    """Store a patch of numpy (optionally masked) arrays and keep the store within budget
+    
+    extra holds small JSON-serializable values returned alongside the arrays.
+    The patch is written to a temporary directory and renamed into place, so
+    readers never see a partial patch.
+    """
+    path = patch_path(key)
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    os.makedirs(temp_path, exist_ok=True)
+    
+    index = {'arrays': {}, 'extra': extra or {}}
+    for name, array in arrays.items():
+        masked = isinstance(array, np.ma.MaskedArray)
+        if masked:
+            np.save(os.path.join(temp_path, f'{name}.npy'), np.ma.getdata(array))
+            np.save(os.path.join(temp_path, f'{name}.mask.npy'), np.ma.getmaskarray(array))
+        else:
+            np.save(os.path.join(temp_path, f'{name}.npy'), array)
+        index['arrays'][name] = masked
+    with open(os.path.join(temp_path, 'index.json'), 'w') as f:
+        json.dump(index, f)
+    
+    try:
+        os.rename(temp_path, path)
+    except OSError:
+        # Another worker stored the same patch first
+        shutil.rmtree(temp_path, ignore_errors=True)
+        return
+    size = sum(entry.stat().st_size for entry in os.scandir(path))
+    
+    with _lock:
+        _stats['writes'] += 1
+        _store['writes'] += 1
+        rescan = _store['bytes'] is None or _store['writes'] % RESCAN_EVERY == 0
+        if _store['bytes'] is not None:
+            _store['bytes'] += size
+    if rescan:
+        total = sum(size for _, size, _ in _scan())
+        with _lock:
+            _store['bytes'] = total
+    if _store['bytes'] > settings.GEE_PATCH_STORE_MAX_BYTES:
+        _evict()
+
+def patch_store_stats():
+    """Hit/miss counters and size of the on-disk patch store"""
+    with _lock:
+        stats = dict(_stats, store_bytes=_store['bytes'])
+    lookups = stats['hits'] + stats['misses']
+    return dict(
+        stats,
+        max_bytes=settings.GEE_PATCH_STORE_MAX_BYTES,
+        hit_rate=round(stats['hits'] / lookups, 3) if lookups else None
+    )
@@ -0,0 +1,138 @@
+import math
+import ee
+from .local_compute import METERS_PER_DEGREE
+
+# Decimal places kept in ROI coordinates (1e-6° is about 0.1 m)
+COORDINATE_DIGITS = 6
+
+# Rings with more vertices than this are simplified with a tolerance of this fraction
+# of the analysis scale. Simplifying moves the boundary by at most that distance, which
+# can still move pixel centres in or out of the ROI, so ROI areas change by at most
+# about the perimeter times the tolerance; smaller rings are kept exactly as drawn
+SIMPLIFY_MIN_VERTICES = 500
+SIMPLIFY_FRACTION = 0.5
+
+def _polygons(roi):
+    """Polygon coordinate lists of a Feature, FeatureCollection or (Multi)Polygon geometry"""
+    if not isinstance(roi, dict):
+        raise ValueError('ROI is missing or not GeoJSON')
+    kind = roi.get('type')
+    if kind == 'Feature':
+        return _polygons(roi.get('geometry'))
+    if kind == 'FeatureCollection':
+        return [polygon for feature in roi.get('features', []) for polygon in _polygons(feature)]
+    if kind == 'Polygon':
+        return [roi.get('coordinates') or []]
+    if kind == 'MultiPolygon':
+        return roi.get('coordinates') or []
+    raise ValueError(f'ROI must be a Polygon or MultiPolygon, not {kind}')
+
+def _clean_ring(ring):
+    """Rounded, validated ring without repeated or closing vertices"""
+    points = []
+    for position in ring:
+        try:
+            lon, lat = float(position[0]), float(position[1])
+        except (TypeError, ValueError, IndexError):
+            raise ValueError('ROI coordinates must be [lon, lat] numbers')
+        if not (math.isfinite(lon) and math.isfinite(lat)) or abs(lon) > 180 or abs(lat) > 90:
+            raise ValueError(f'ROI coordinate out of range: [{lon}, {lat}]')
+        point = (round(lon, COORDINATE_DIGITS), round(lat, COORDINATE_DIGITS))
+        if not points or point != points[-1]:
+            points.append(point)
+    if len(points) > 1 and points[0] == points[-1]:
+        points.pop()
+    return points
+
+def _signed_area(points):
+    """Shoelace area of an open ring in degrees², positive when counter-clockwise"""
+    return sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(points, points[1:] + points[:1])) / 2
+
+def _simplify(points, tolerance, cos_lat):
+    """Douglas-Peucker simplification of an open ring, tolerance in degrees of latitude
+    
+    Rings of at most SIMPLIFY_MIN_VERTICES vertices are returned unchanged.
+    """
+    if len(points) <= SIMPLIFY_MIN_VERTICES or tolerance <= 0:
+        return points
+    
+    def distance(point, start, end):
+        # Distances on a local equirectangular plane, so the tolerance is isotropic
+        px, py = point[0] * cos_lat, point[1]
+        ax, ay = start[0] * cos_lat, start[1]
+        bx, by = end[0] * cos_lat, end[1]
+        dx, dy = bx - ax, by - ay
+        if dx == 0 and dy == 0:
+            return math.hypot(px - ax, py - ay)
+        t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / (dx * dx + dy * dy)))
+        return math.hypot(px - ax - t * dx, py - ay - t * dy)
+    
+    # The ring is closed on its first vertex, which always stays
+    closed = points + points[:1]
+    keep = [False] * len(closed)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(closed) - 1)]
+    while stack:
+        first, last = stack.pop()
+        farthest, max_distance = None, tolerance
+        for i in range(first + 1, last):
+            d = distance(closed[i], closed[first], closed[last])
+            if d > max_distance:
+                farthest, max_distance = i, d
+        if farthest is not None:
+            keep[farthest] = True
+            stack += [(first, farthest), (farthest, last)]
+    
+    simplified = [point for point, kept in zip(closed[:-1], keep[:-1]) if kept]
+    return simplified if len(simplified) >= 3 else points
+
+def _oriented_ring(points, counter_clockwise):
+    """Open ring wound as requested and starting at its smallest vertex"""
+    if (_signed_area(points) > 0) != counter_clockwise:
+        points = points[::-1]
+    start = points.index(min(points))
+    return points[start:] + points[:start]
+
+def canonical_roi(roi, scale=30):
+    """Validated canonical GeoJSON geometry of a ROI posted by the browser
+    
+    Accepts a Feature, FeatureCollection or (Multi)Polygon. Coordinates are
+    rounded to COORDINATE_DIGITS and repeated vertices dropped. Rings with
+    more than SIMPLIFY_MIN_VERTICES vertices, typically imported outlines,
+    are simplified with a tolerance of half an analysis pixel (scale in
+    metres), which bounds how far the boundary moves. Rings follow RFC 7946 winding (exteriors
+    counter-clockwise, holes clockwise) and start at their smallest vertex,
+    so the same outline always yields the same geometry.
+    """
+    polygons = []
+    for polygon in _polygons(roi):
+        rings = []
+        for i, ring in enumerate(polygon or []):
+            points = _clean_ring(ring)
+            if len(points) < 3:
+                if i == 0:
+                    break
+                continue
+            # Oriented and rotated first, so simplification sees the same ring every time
+            points = _oriented_ring(points, counter_clockwise=(i == 0))
+            cos_lat = max(math.cos(math.radians(sum(lat for _, lat in points) / len(points))), 0.01)
+            points = _simplify(points, scale * SIMPLIFY_FRACTION / METERS_PER_DEGREE, cos_lat)
+            if _signed_area(points) == 0:
+                if i == 0:
+                    break
+                continue
+            rings.append([list(point) for point in points + points[:1]])
+        if rings:
+            polygons.append(rings)
+    
+    if not polygons:
+        raise ValueError('ROI has no polygon with a non-zero area')
+    polygons.sort()
+    if len(polygons) == 1:
+        return {'type': 'Polygon', 'coordinates': polygons[0]}
+    return {'type': 'MultiPolygon', 'coordinates': polygons}
+
+def prepare_roi(roi, scale=30):
+    """Canonical GeoJSON and ee.Geometry of a ROI, the preprocessing every view shares"""
+    geojson = canonical_roi(roi, scale)
+    return {'geojson': geojson, 'geometry': ee.Geometry(geojson)}
@@ -0,0 +1,139 @@
+import math
+import ee
+import numpy as np
+from django.conf import settings
+from .gee_utils import evaluate_batch, roi_area_estimate, reduction_params, SCALE_POLICIES
+from .scene_catalog import geometry_bounds
+
+# Two-sided 95% normal quantile
+Z_95 = 1.96
+
+def _strata_image(bounds, strata):
+    """Stratum id of every pixel on a strata x strata grid over the ROI bounding box"""
+    west, south, east, north = bounds
+    lon_lat = ee.Image.pixelLonLat()
+    col = lon_lat.select('longitude').subtract(west).divide(max(east - west, 1e-9) / strata).floor().clamp(0, strata - 1)
+    row = lon_lat.select('latitude').subtract(south).divide(max(north - south, 1e-9) / strata).floor().clamp(0, strata - 1)
+    return row.multiply(strata).add(col).int().rename('stratum')
+
+def _ratio_estimate(strata, weights, numerators, denominators):
+    """Stratified ratio estimate of sum(y) / sum(d) and its 95% half-width
+    
+    With every d = 1 this is the plain stratified mean; a 0/1 d restricts the
+    estimate to a domain (e.g. water pixels) of unknown size.
+    """
+    total_y = total_d = 0.0
+    per_stratum = []
+    for stratum, weight in weights.items():
+        selected = strata == stratum
+        if not selected.any() or weight <= 0:
+            continue
+        y = numerators[selected]
+        d = denominators[selected]
+        total_y += weight * y.mean()
+        total_d += weight * d.mean()
+        per_stratum.append((weight, y, d))
+    
+    if total_d <= 0:
+        return None, None
+    ratio = total_y / total_d
+    
+    # Linearized variance of the ratio estimator
+    variance = 0.0
+    for weight, y, d in per_stratum:
+        if len(y) > 1:
+            z = (y - ratio * d) / total_d
+            variance += weight ** 2 * z.var(ddof=1) / len(y)
+    return float(ratio), float(Z_95 * math.sqrt(variance))
+
+def approximate_statistics(geometry, means=None, masks=None, sample_size=None, seed=42):
+    """Means and mask areas estimated from a stratified random pixel sample, with 95% intervals
+    
+    The ROI is split into a grid of spatial strata weighted by their area in
+    the ROI, and a fixed number of native-resolution pixels is sampled from
+    each, so latency is bounded by the sample size instead of the ROI size.
+    Means are over each image's unmasked pixels; mask areas are in m².
+    Everything is fetched with a single round trip.
+    """
+    means = means or []
+    masks = masks or []
+    sample_size = sample_size or settings.GEE_SAMPLE_SIZE
+    strata_count = settings.GEE_SAMPLE_STRATA
+    
+    bounds = geometry_bounds(geometry)
+    if bounds is None:
+        raise ValueError('ROI bounds cannot be computed locally')
+    strata = _strata_image(bounds, strata_count)
+    
+    bands = [image.rename(f'mean_{i}') for i, image in enumerate(means)]
+    bands += [mask.unmask(0).gt(0).rename(f'mask_{i}') for i, mask in enumerate(masks)]
+    stack = ee.Image.cat(bands + [strata])
+    
+    # Stratum weights only need a coarse area reduction (~10k pixels)
+    coarse_scale = max(SCALE_POLICIES['analysis'][0], math.sqrt((roi_area_estimate(geometry) or 0) / 1e4))
+    stratum_areas = ee.Image.pixelArea().addBands(strata).reduceRegion(
+        reducer=ee.Reducer.sum().group(groupField=1, groupName='stratum'),
+        geometry=geometry,
+        scale=coarse_scale,
+        maxPixels=1e13
+    ).get('groups')
+    
+    points_per_stratum = max(2, math.ceil(sample_size / strata_count ** 2))
+    sample = stack.stratifiedSample(
+        numPoints=points_per_stratum,
+        classBand='stratum',
+        region=geometry,
+        scale=SCALE_POLICIES['analysis'][0],
+        seed=seed,
+        dropNulls=False,
+        tileScale=reduction_params(geometry)['tileScale'],
+        geometries=False
+    )
+    
+    results = evaluate_batch({
+        'strata': stratum_areas,
+        'sample': sample,
+        'area': geometry.area(maxError=1)
+    })
+    
+    areas = {int(group['stratum']): float(group['sum'] or 0) for group in results['strata'] or []}
+    total = sum(areas.values())
+    weights = {stratum: area / total for stratum, area in areas.items()} if total > 0 else {}
+    
+    rows = [feature['properties'] for feature in results['sample']['features']]
+    sample_strata = np.array([row.get('stratum', -1) for row in rows])
+    
+    def column(name):
+        return np.array([row.get(name) if row.get(name) is not None else np.nan for row in rows], dtype=np.float64)
+    
+    mean_estimates = []
+    for i in range(len(means)):
+        values = column(f'mean_{i}')
+        present = ~np.isnan(values)
+        mean_estimates.append(_ratio_estimate(sample_strata, weights, np.where(present, values, 0.0), present.astype(np.float64)))
+    
+    roi_area = float(results['area'])
+    area_estimates = []
+    ones = np.ones(len(rows))
+    for i in range(len(masks)):
+        fraction, half_width = _ratio_estimate(sample_strata, weights, np.nan_to_num(column(f'mask_{i}')), ones)
+        if fraction is None:
+            area_estimates.append((None, None))
+        else:
+            area_estimates.append((fraction * roi_area, half_width * roi_area))
+    
+    return {
+        'means': mean_estimates,
+        'areas': area_estimates,
+        'total_area': roi_area,
+        'sample_size': len(rows)
+    }
+
+def sampling_summary(stats):
+    """Response block describing how approximate statistics were computed"""
+    return {
+        'method': 'stratified_random_sample',
+        'sample_size': stats['sample_size'],
+        'strata': settings.GEE_SAMPLE_STRATA ** 2,
+        'confidence': 0.95
+    }
@@ -0,0 +1,235 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone
+import ee
+from django.conf import settings
+from .gee_executor import run_call, BATCH
+
+# Scene metadata fetched per sensor: collections and the tile / cloud properties
+SENSORS = {
+    'S2': {
+        'collections': ['COPERNICUS/S2_SR_HARMONIZED'],
+        'cloud': 'CLOUDY_PIXEL_PERCENTAGE'
+    },
+    'LANDSAT': {
+        'collections': ['LANDSAT/LC08/C02/T1_L2', 'LANDSAT/LC09/C02/T1_L2'],
+        'cloud': 'CLOUD_COVER'
+    }
+}
+
+# Re-fetch this far behind the last sync so late-ingested scenes are picked up
+SYNC_OVERLAP_MS = 30 * 24 * 3600 * 1000
+
+_lock = threading.Lock()
+_wake = threading.Event()
+_refresher = None
+_refresher_pid = None
+
+# (lon, lat) 1° cell -> {'tiles': {(sensor, tile)}, 'synced_until': ms or None, 'stale': bool}
+_cells = {}
+# (sensor, tile) -> 'YYYY-MM' -> {scene_id: (time_ms, cloud)}
+_scenes = {}
+_stats = {'hits': 0, 'unknown': 0, 'syncs': 0, 'sync_errors': 0}
+
+def _to_ms(date_str):
+    return int(datetime.strptime(date_str, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+def _month_key(time_ms):
+    return datetime.fromtimestamp(time_ms / 1000, tz=timezone.utc).strftime('%Y-%m')
+
+def _flatten_coordinates(coordinates):
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        yield coordinates
+        return
+    for part in coordinates:
+        yield from _flatten_coordinates(part)
+
+def geometry_bounds(geometry):
+    """Client-side lon/lat bounds of a GeoJSON dict or a non-computed ee.Geometry"""
+    if isinstance(geometry, ee.Geometry):
+        try:
+            geometry = geometry.toGeoJSON()
+        except Exception:
+            return None
+    if not isinstance(geometry, dict):
+        return None
+    if 'geometry' in geometry:
+        geometry = geometry['geometry']
+    
+    if geometry.get('type') == 'GeometryCollection':
+        points = [point for part in geometry.get('geometries', []) for point in _flatten_coordinates(part.get('coordinates', []))]
+    else:
+        points = list(_flatten_coordinates(geometry.get('coordinates', [])))
+    if not points:
+        return None
+    lons = [point[0] for point in points]
+    lats = [point[1] for point in points]
+    return min(lons), min(lats), max(lons), max(lats)
+
+def _cells_for(geometry):
+    """1° grid cells covering a geometry, or None when it cannot be indexed locally"""
+    bounds = geometry_bounds(geometry)
+    if bounds is None:
+        return None
+    west, south, east, north = bounds
+    cells = [(lon, lat)
+             for lon in range(int(west // 1), int(east // 1) + 1)
+             for lat in range(int(south // 1), int(north // 1) + 1)]
+    if len(cells) > settings.GEE_CATALOG_MAX_QUERY_CELLS:
+        return None
+    return cells
+
+def has_imagery(geometry, start_date, end_date, sensor='S2', cloud_threshold=None):
+    """Whether any scene of a sensor intersects the geometry in [start_date, end_date)
+    
+    Answers from the local catalog: True/False when every covering cell has been
+    synced past the window, None when unknown (the cells are queued for sync).
+    A False answer is exact; True may include scenes that only touch the cell.
+    """
+    if not settings.GEE_CATALOG_ENABLED:
+        return None
+    cells = _cells_for(geometry)
+    if cells is None:
+        return None
+    
+    try:
+        start_ms = _to_ms(start_date)
+        end_ms = _to_ms(end_date)
+    except (TypeError, ValueError):
+        return None
+    
+    with _lock:
+        missing = [cell for cell in cells
+                   if cell not in _cells or (_cells[cell]['synced_until'] or 0) < end_ms]
+        if missing:
+            # Windows that have already ended can be answered after the next sync
+            ended = end_ms <= time.time() * 1000
+            for cell in missing:
+                entry = _cells.setdefault(cell, {'tiles': set(), 'synced_until': None, 'stale': False})
+                entry['stale'] = entry['stale'] or ended
+            _stats['unknown'] += 1
+        else:
+            _stats['hits'] += 1
+            tiles = {tile for cell in cells for tile in _cells[cell]['tiles'] if tile[0] == sensor}
+            months = sorted({_month_key(start_ms), _month_key(max(start_ms, end_ms - 1))})
+            return any(
+                start_ms <= time_ms < end_ms and (cloud_threshold is None or (cloud is not None and cloud < cloud_threshold))
+                for tile in tiles
+                for month, scenes in _scenes.get(tile, {}).items()
+                if months[0] <= month <= months[-1]
+                for time_ms, cloud in scenes.values()
+            )
+    
+    _ensure_refresher()
+    _wake.set()
+    return None
+
+def has_any_imagery(geometry, start_date, end_date, sensors=('S2', 'LANDSAT')):
+    """has_imagery across several sensors: True if any has scenes, False if none, else None"""
+    answers = [has_imagery(geometry, start_date, end_date, sensor) for sensor in sensors]
+    if True in answers:
+        return True
+    if all(answer is False for answer in answers):
+        return False
+    return None
+
+def _scene_rows(sensor, region, start_ms, end_ms):
+    """Server-side [id, time, tile, cloud] rows of a sensor's scenes over a region"""
+    config = SENSORS[sensor]
+    collection = ee.ImageCollection(config['collections'][0])
+    for name in config['collections'][1:]:
+        collection = collection.merge(ee.ImageCollection(name))
+    collection = collection.filterBounds(region).filterDate(ee.Date(start_ms), ee.Date(end_ms))
+    
+    def row(image):
+        if sensor == 'S2':
+            tile = image.get('MGRS_TILE')
+        else:
+            tile = ee.Number(image.get('WRS_PATH')).format('p%03d') \
+                .cat(ee.Number(image.get('WRS_ROW')).format('r%03d'))
+        return ee.Feature(None, {'row': ee.List([
+            image.get('system:index'), image.get('system:time_start'), tile, image.get(config['cloud'])
+        ])})
+    
+    return ee.FeatureCollection(collection.map(row)).aggregate_array('row')
+
+def sync_cell(cell):
+    """Incrementally fetch scene metadata of every sensor over one grid cell"""
+    lon, lat = cell
+    region = ee.Geometry.Rectangle([lon, lat, lon + 1, lat + 1])
+    with _lock:
+        synced_until = _cells[cell]['synced_until'] if cell in _cells else None
+    start_ms = synced_until - SYNC_OVERLAP_MS if synced_until else _to_ms(settings.GEE_CATALOG_START)
+    now_ms = int(time.time() * 1000)
+    
+    # Fetch in yearly chunks so the first sync of a cell stays a modest response
+    chunk_ms = 365 * 24 * 3600 * 1000
+    for chunk_start in range(start_ms, now_ms, chunk_ms):
+        chunk_end = min(chunk_start + chunk_ms, now_ms)
+        rows = run_call(
+            lambda: ee.Dictionary({sensor: _scene_rows(sensor, region, chunk_start, chunk_end) for sensor in SENSORS}).getInfo(),
+            BATCH
+        )
+        with _lock:
+            entry = _cells.setdefault(cell, {'tiles': set(), 'synced_until': None, 'stale': False})
+            for sensor, sensor_rows in rows.items():
+                for scene_id, time_ms, tile, cloud in sensor_rows:
+                    if time_ms is None or tile is None:
+                        continue
+                    key = (sensor, tile)
+                    entry['tiles'].add(key)
+                    _scenes.setdefault(key, {}).setdefault(_month_key(time_ms), {})[f'{sensor}/{scene_id}'] = (time_ms, cloud)
+    
+    with _lock:
+        entry = _cells.setdefault(cell, {'tiles': set(), 'synced_until': None, 'stale': False})
+        entry['synced_until'] = now_ms
+        entry['stale'] = False
+        _stats['syncs'] += 1
+
+def _refresh_loop():
+    """Sync new cells as soon as they are queried and refresh every cell periodically"""
+    from .gee_session import ensure_session
+    
+    last_full_refresh = time.time()
+    while True:
+        _wake.wait(timeout=60)
+        _wake.clear()
+        
+        full_refresh = time.time() - last_full_refresh >= settings.GEE_CATALOG_REFRESH
+        with _lock:
+            cells = [cell for cell, entry in _cells.items()
+                     if full_refresh or entry['synced_until'] is None or entry['stale']]
+        if not cells or not ensure_session():
+            continue
+        
+        for cell in cells:
+            try:
+                sync_cell(cell)
+            except Exception as e:
+                with _lock:
+                    _stats['sync_errors'] += 1
+                print(f"Scene catalog sync failed for cell {cell}: {e}")
+        if full_refresh:
+            last_full_refresh = time.time()
+
+def _ensure_refresher():
+    """Start the background refresher once per process (again after a fork)"""
+    global _refresher, _refresher_pid
+    with _lock:
+        if _refresher is not None and _refresher_pid == os.getpid():
+            return
+        _refresher = threading.Thread(target=_refresh_loop, name='scene-catalog', daemon=True)
+        _refresher_pid = os.getpid()
+        _refresher.start()
+
+def catalog_stats():
+    """Size, sync progress and lookup counters of the scene catalog"""
+    with _lock:
+        return dict(
+            _stats,
+            cells=len(_cells),
+            synced_cells=sum(1 for entry in _cells.values() if entry['synced_until']),
+            tiles=len(_scenes),
+            scenes=sum(len(scenes) for months in _scenes.values() for scenes in months.values())
+        )
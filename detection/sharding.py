@@ -0,0 +1,125 @@
+import math
+import ee
+from django.conf import settings
+from .gee_executor import run_parallel, run_call, SHARD
+from .gee_utils import SCALE_POLICIES, SCALE_STEPS, reduction_params, grouped_sums, decode_grouped_sums
+from .local_compute import METERS_PER_DEGREE
+from .scene_catalog import geometry_bounds
+
+def shard_plan(geometry, kind='analysis'):
+    """Scale, reduction parameters and sub-tile regions of a sharded reduction, or None
+    
+    A ROI is sharded when its bounding box at the native scale of this kind of
+    reduction exceeds the pixel budget one request gets. The box is cut into a
+    lon/lat grid whose cells each fit the budget, so every sub-tile is reduced
+    at full resolution; the scale is only coarsened when more than
+    GEE_SHARD_MAX_SHARDS cells would be needed. None means one request suffices.
+    """
+    if not settings.GEE_SHARDING:
+        return None
+    bounds = geometry_bounds(geometry)
+    if bounds is None:
+        return None
+    
+    west, south, east, north = bounds
+    height = (north - south) * METERS_PER_DEGREE
+    width = (east - west) * METERS_PER_DEGREE * math.cos(math.radians((south + north) / 2))
+    min_scale, budget_setting = SCALE_POLICIES[kind]
+    budget = getattr(settings, budget_setting)
+    if width * height / min_scale ** 2 <= budget:
+        return None
+    
+    # Pixels along the edge of a square sub-tile that fits the budget
+    edge = math.sqrt(budget)
+    for scale in (step for step in SCALE_STEPS if step >= min_scale):
+        cols = math.ceil(width / scale / edge)
+        rows = math.ceil(height / scale / edge)
+        if cols * rows <= settings.GEE_SHARD_MAX_SHARDS:
+            break
+    if cols * rows == 1:
+        return None
+    
+    roi = ee.Geometry(geometry)
+    lon_step = (east - west) / cols
+    lat_step = (north - south) / rows
+    regions = [
+        ee.Geometry.Rectangle([west + col * lon_step, south + row * lat_step,
+                               west + (col + 1) * lon_step, south + (row + 1) * lat_step]).intersection(roi, 1)
+        for row in range(rows) for col in range(cols)
+    ]
+    pixels = width * height / scale ** 2 / len(regions)
+    return {
+        'scale': scale,
+        'params': {'scale': scale, 'tileScale': 1 if pixels <= 1e6 else 2 if pixels <= 4e6 else 4, 'maxPixels': 1e13},
+        'regions': regions
+    }
+
+def reduction_scale(geometry, kind='analysis'):
+    """Scale (m) a ROI is reduced at: its shard scale, or the single-request reduction scale"""
+    plan = shard_plan(geometry, kind)
+    return plan['scale'] if plan else reduction_params(geometry, kind)['scale']
+
+def run_sharded(reduce, plan):
+    """Evaluate reduce(region, params) on every sub-tile of a plan concurrently, in grid order"""
+    calls = {
+        i: (lambda region=region: reduce(region, plan['params']).getInfo())
+        for i, region in enumerate(plan['regions'])
+    }
+    results = run_parallel(calls, SHARD)
+    return [results[i] for i in range(len(calls))]
+
+def merge_sums(results):
+    """Add up per-shard reduceRegion sum dictionaries band by band (missing values count as 0)"""
+    totals = {}
+    for result in results:
+        for name, value in (result or {}).items():
+            totals[name] = totals.get(name, 0.0) + float(value or 0)
+    return totals
+
+def sharded_statistics(geometry, sums=None, means=None, kind='analysis', params=None):
+    """Sums and means of named single-band images over a ROI, at full resolution for any ROI size
+    
+    Means travel as mask-weighted value sums next to their weights, so the
+    per-shard sums merge into exactly the pixel-weighted mean of the whole ROI.
+    Large ROIs are reduced as parallel sub-tiles (see shard_plan); others, and
+    any call with explicit params, with one sum reduction. Returns (sums, means)
+    dicts; a mean is None when the image has no unmasked pixel in the ROI.
+    """
+    sums = sums or {}
+    means = means or {}
+    
+    bands = [ee.Image(image).rename(name) for name, image in sums.items()]
+    for name, image in means.items():
+        image = ee.Image(image)
+        weight = image.mask().unmask(0)
+        bands += [image.unmask(0).multiply(weight).rename(f'{name}__sum'), weight.rename(f'{name}__weight')]
+    stack = ee.Image.cat(bands)
+    
+    def reduce(region, params):
+        return stack.reduceRegion(reducer=ee.Reducer.sum(), geometry=region, **params)
+    
+    plan = shard_plan(geometry, kind) if params is None else None
+    if plan is None:
+        params = params or reduction_params(geometry, kind)
+        totals = merge_sums([run_call(lambda: reduce(geometry, params).getInfo())])
+    else:
+        totals = merge_sums(run_sharded(reduce, plan))
+    
+    mean_values = {}
+    for name in means:
+        weight = totals.get(f'{name}__weight', 0.0)
+        mean_values[name] = totals.get(f'{name}__sum', 0.0) / weight if weight > 0 else None
+    return {name: totals.get(name, 0.0) for name in sums}, mean_values
+
+def sharded_grouped_sums(class_image, geometry, values=None, kind='analysis'):
+    """grouped_sums of a ROI decoded per class value, merged exactly across sub-tiles for large ROIs"""
+    plan = shard_plan(geometry, kind)
+    if plan is None:
+        return decode_grouped_sums(run_call(lambda: grouped_sums(class_image, geometry, values).getInfo()))
+    
+    merged = {}
+    for groups in run_sharded(lambda region, params: grouped_sums(class_image, region, values, params), plan):
+        for code, sums in decode_grouped_sums(groups).items():
+            previous = merged.get(code, [0.0] * len(sums))
+            merged[code] = [total + float(value or 0) for total, value in zip(previous, sums)]
+    return merged
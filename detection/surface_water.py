@@ -0,0 +1,48 @@
+from datetime import datetime, timezone
+import ee
+from django.conf import settings
+from django.core.cache import cache
+from .gee_executor import run_call
+
+# JRC Global Surface Water monthly water history: band 'water' is 0 (no observation),
+# 1 (not water) or 2 (water), classified from the full Landsat archive
+JRC_MONTHLY_HISTORY = 'JRC/GSW1_4/MonthlyHistory'
+
+# The dataset is extended about once a year, so its coverage is looked up at most daily
+COVERAGE_TTL = 24 * 3600
+
+def jrc_coverage_end():
+    """First day ('YYYY-MM-DD') after the last month in the JRC monthly history, or None if unknown"""
+    end = cache.get('jrc-monthly-coverage-end')
+    if end is not None:
+        return end
+    try:
+        last = run_call(lambda: ee.ImageCollection(JRC_MONTHLY_HISTORY).aggregate_max('system:time_start').getInfo())
+    except Exception as e:
+        print(f"Could not look up JRC surface water coverage: {e}")
+        return None
+    
+    month = datetime.fromtimestamp(last / 1000, tz=timezone.utc)
+    end = f'{month.year + month.month // 12}-{month.month % 12 + 1:02d}-01'
+    cache.set('jrc-monthly-coverage-end', end, COVERAGE_TTL)
+    return end
+
+def jrc_covers(start_date, end_date):
+    """Whether every month of a date window is in the JRC monthly history"""
+    if not settings.GEE_JRC_SURFACE_WATER:
+        return False
+    end = jrc_coverage_end()
+    return end is not None and start_date >= '1984-03-01' and end_date < end
+
+def jrc_water_mask(roi, start_date, end_date):
+    """Water (1) / non-water (0) mask of a window from the JRC monthly history, 0 where never observed
+    
+    A pixel is water when it was water in at least half of the months it was
+    observed, the monthly counterpart of the median composite the optical
+    pipeline classifies.
+    """
+    months = ee.ImageCollection(JRC_MONTHLY_HISTORY).filterDate(start_date, ee.Date(end_date).advance(1, 'day'))
+    water_months = months.map(lambda image: image.select('water').eq(2)).sum()
+    observed_months = months.map(lambda image: image.select('water').gt(0)).sum()
+    water = water_months.multiply(2).gte(observed_months).And(observed_months.gt(0))
+    return water.unmask(0).rename('water').clip(roi)
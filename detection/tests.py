@@ -0,0 +1,393 @@
+import math
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from datetime import date, datetime, timedelta, timezone
+from unittest import mock
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from . import patch_store, scene_catalog
+from .layers import local_layer, local_layer_descriptor
+from .gee_utils import mask_totals, split_statistics
+from .local_compute import METERS_PER_DEGREE
+from .roi import canonical_roi, _signed_area, SIMPLIFY_MIN_VERTICES
+from .sampling import _ratio_estimate, Z_95
+from .sharding import merge_sums
+from .tile_render import encode_png, render_tile, TILE_SIZE
+
+def square(west=77.0, south=28.0, size=0.01):
+    """Counter-clockwise open ring of a square"""
+    return [[west, south], [west + size, south], [west + size, south + size], [west, south + size]]
+
+def circle(vertices, lon=77.0, lat=28.0, radius=0.05):
+    """Counter-clockwise open ring of a circle, radius in degrees of latitude"""
+    cos_lat = math.cos(math.radians(lat))
+    return [
+        [lon + radius * math.cos(2 * math.pi * i / vertices) / cos_lat, lat + radius * math.sin(2 * math.pi * i / vertices)]
+        for i in range(vertices)
+    ]
+
+def polygon(*rings):
+    """GeoJSON Polygon with every ring closed"""
+    return {'type': 'Polygon', 'coordinates': [ring + ring[:1] for ring in rings]}
+
+
+class CanonicalRoiTests(SimpleTestCase):
+    def test_reversed_and_rotated_rings_give_the_same_geometry(self):
+        ring = square()
+        expected = canonical_roi(polygon(ring))
+        self.assertEqual(canonical_roi(polygon(ring[::-1])), expected)
+        self.assertEqual(canonical_roi(polygon(ring[2:] + ring[:2])), expected)
+        self.assertEqual(canonical_roi(polygon((ring[1:] + ring[:1])[::-1])), expected)
+    
+    def test_closing_vertex_is_optional_and_always_emitted(self):
+        ring = square()
+        open_ring = canonical_roi({'type': 'Polygon', 'coordinates': [ring]})
+        closed_ring = canonical_roi(polygon(ring))
+        self.assertEqual(open_ring, closed_ring)
+        coordinates = closed_ring['coordinates'][0]
+        self.assertEqual(coordinates[0], coordinates[-1])
+        self.assertEqual(len(coordinates), 5)
+    
+    def test_repeated_vertices_are_dropped(self):
+        ring = square()
+        doubled = [ring[0], ring[0], ring[1], ring[2], ring[2], ring[3]]
+        self.assertEqual(canonical_roi(polygon(doubled)), canonical_roi(polygon(ring)))
+    
+    def test_exteriors_are_counter_clockwise_and_holes_clockwise(self):
+        exterior = square(size=0.1)
+        hole = square(west=77.02, south=28.02, size=0.02)
+        rings = canonical_roi(polygon(exterior[::-1], hole))['coordinates']
+        self.assertEqual(len(rings), 2)
+        self.assertGreater(_signed_area([tuple(p) for p in rings[0][:-1]]), 0)
+        self.assertLess(_signed_area([tuple(p) for p in rings[1][:-1]]), 0)
+    
+    def test_features_and_collections_are_unwrapped(self):
+        geometry = polygon(square())
+        expected = canonical_roi(geometry)
+        feature = {'type': 'Feature', 'properties': {}, 'geometry': geometry}
+        self.assertEqual(canonical_roi(feature), expected)
+        self.assertEqual(canonical_roi({'type': 'FeatureCollection', 'features': [feature]}), expected)
+    
+    def test_several_polygons_give_a_sorted_multipolygon(self):
+        first = polygon(square(west=78.0))
+        second = polygon(square(west=77.0))
+        collection = {'type': 'FeatureCollection', 'features': [
+            {'type': 'Feature', 'geometry': first}, {'type': 'Feature', 'geometry': second}
+        ]}
+        geometry = canonical_roi(collection)
+        self.assertEqual(geometry['type'], 'MultiPolygon')
+        self.assertEqual(geometry['coordinates'][0][0][0], [77.0, 28.0])
+    
+    def test_degenerate_rings(self):
+        collinear = [[77.0, 28.0], [77.01, 28.0], [77.02, 28.0]]
+        with self.assertRaises(ValueError):
+            canonical_roi(polygon(collinear))
+        with self.assertRaises(ValueError):
+            canonical_roi({'type': 'Polygon', 'coordinates': [[[77.0, 28.0], [77.01, 28.0]]]})
+        # A degenerate hole is dropped, the exterior kept
+        rings = canonical_roi(polygon(square(size=0.1), [[77.02, 28.02], [77.03, 28.02], [77.04, 28.02]]))['coordinates']
+        self.assertEqual(len(rings), 1)
+    
+    def test_invalid_input_is_rejected(self):
+        for roi in (None, 'polygon', {'type': 'Point', 'coordinates': [77.0, 28.0]}):
+            with self.assertRaises(ValueError):
+                canonical_roi(roi)
+        for position in ([181.0, 28.0], [77.0, -91.0], [float('nan'), 28.0], ['east', 28.0], [77.0]):
+            ring = square()
+            ring[1] = position
+            with self.assertRaises(ValueError):
+                canonical_roi(polygon(ring))
+    
+    def test_coordinates_are_rounded(self):
+        ring = [[x + 1e-9, y - 1e-9] for x, y in square()]
+        self.assertEqual(canonical_roi(polygon(ring)), canonical_roi(polygon(square())))
+    
+    def test_small_rings_are_kept_exactly(self):
+        ring = circle(SIMPLIFY_MIN_VERTICES)
+        coordinates = canonical_roi(polygon(ring), scale=1000)['coordinates'][0]
+        self.assertEqual(len(coordinates), SIMPLIFY_MIN_VERTICES + 1)
+    
+    def test_large_rings_are_simplified_within_half_a_pixel(self):
+        ring = circle(5000)
+        coordinates = canonical_roi(polygon(ring), scale=30)['coordinates'][0]
+        self.assertLess(len(coordinates), 500)
+        self.assertGreaterEqual(len(coordinates), 4)
+        # Vertices stay on the circle; chords between them sag by at most half a pixel
+        cos_lat = math.cos(math.radians(28.0))
+        for (x1, y1), (x2, y2) in zip(coordinates, coordinates[1:]):
+            chord = math.hypot((x2 - x1) * cos_lat, y2 - y1)
+            sagitta = 0.05 - math.sqrt(0.05 ** 2 - (chord / 2) ** 2)
+            self.assertLessEqual(sagitta * METERS_PER_DEGREE, 15.0 + 0.5)
+        # The same outline simplifies the same way from any starting vertex
+        rotated = canonical_roi(polygon(ring[1234:] + ring[:1234]), scale=30)['coordinates'][0]
+        self.assertEqual(rotated, coordinates)
+
+
+class RatioEstimateTests(SimpleTestCase):
+    def test_unit_denominators_give_the_stratified_mean(self):
+        strata = np.array([0, 0, 1, 1])
+        y = np.array([1.0, 3.0, 5.0, 7.0])
+        ratio, half_width = _ratio_estimate(strata, {0: 0.5, 1: 0.5}, y, np.ones(4))
+        self.assertAlmostEqual(ratio, 4.0)
+        # Each stratum: z = y - 4 has sample variance 2, weighted 0.5² / 2 samples
+        self.assertAlmostEqual(half_width, Z_95 * math.sqrt(0.25 + 0.25))
+    
+    def test_domain_ratio(self):
+        strata = np.array([0, 0, 1, 1])
+        y = np.array([2.0, 0.0, 4.0, 6.0])
+        d = np.array([1.0, 0.0, 1.0, 1.0])
+        ratio, half_width = _ratio_estimate(strata, {0: 0.5, 1: 0.5}, y, d)
+        # (0.5 * 1 + 0.5 * 5) / (0.5 * 0.5 + 0.5 * 1)
+        self.assertAlmostEqual(ratio, 4.0)
+        z = [np.array([-2.0, 0.0]) / 0.75, np.array([0.0, 2.0]) / 0.75]
+        variance = sum(0.25 * values.var(ddof=1) / 2 for values in z)
+        self.assertAlmostEqual(half_width, Z_95 * math.sqrt(variance))
+    
+    def test_empty_and_single_sample_strata(self):
+        strata = np.array([0, 0, 1])
+        y = np.array([1.0, 1.0, 9.0])
+        # Stratum 2 has no samples and stratum 1 a single one without variance
+        ratio, half_width = _ratio_estimate(strata, {0: 0.5, 1: 0.5, 2: 0.3}, y, np.ones(3))
+        self.assertAlmostEqual(ratio, 5.0)
+        self.assertEqual(half_width, 0.0)
+        # A stratum without weight is ignored
+        ratio, _ = _ratio_estimate(strata, {0: 1.0, 1: 0.0}, y, np.ones(3))
+        self.assertAlmostEqual(ratio, 1.0)
+    
+    def test_empty_domain(self):
+        strata = np.array([0, 1])
+        self.assertEqual(_ratio_estimate(strata, {0: 0.5, 1: 0.5}, np.ones(2), np.zeros(2)), (None, None))
+
+
+class GroupedSumTests(SimpleTestCase):
+    def test_mask_totals_count_overlaps_for_every_mask(self):
+        # Class codes bit-encode masks 0 and 1; code 3 is inside both
+        sums = {0: [10.0], 1: [2.0], 2: [3.0], 3: [4.0]}
+        self.assertEqual(mask_totals(sums, 2), [6.0, 7.0])
+        self.assertEqual(mask_totals({1: [None]}, 2), [0.0, 0.0])
+        self.assertEqual(mask_totals({}, 3), [0.0, 0.0, 0.0])
+    
+    def test_split_statistics(self):
+        # Values per class: area, then a weighted sum and its weight per mean
+        sums = {
+            0: [100.0, 2.0, 4.0, 0.0, 0.0],
+            1: [50.0, 6.0, 4.0, 3.0, 1.0]
+        }
+        areas, means = split_statistics(sums, 1, 2)
+        self.assertEqual(areas, [50.0])
+        self.assertEqual(means, [1.0, 3.0])
+        areas, means = split_statistics({0: [10.0, 0.0, 0.0]}, 1, 1)
+        self.assertEqual(areas, [0.0])
+        self.assertEqual(means, [None])
+    
+    def test_merge_sums(self):
+        merged = merge_sums([{'area': 1.5, 'water': 2}, None, {'area': 2.5, 'water': None, 'veg': 4}, {}])
+        self.assertEqual(merged, {'area': 4.0, 'water': 2.0, 'veg': 4.0})
+        self.assertEqual(merge_sums([]), {})
+
+
+def decode_png(png):
+    """(width, height, rgba) of a PNG written by encode_png, checking every chunk CRC"""
+    assert png[:8] == b'\x89PNG\r\n\x1a\n'
+    chunks = {}
+    offset = 8
+    while offset < len(png):
+        length, = struct.unpack('>I', png[offset:offset + 4])
+        kind = png[offset + 4:offset + 8]
+        payload = png[offset + 8:offset + 8 + length]
+        crc, = struct.unpack('>I', png[offset + 8 + length:offset + 12 + length])
+        assert crc == zlib.crc32(kind + payload) & 0xffffffff
+        chunks[kind] = payload
+        offset += 12 + length
+    width, height, depth, color_type = struct.unpack('>IIBB', chunks[b'IHDR'][:10])
+    assert (depth, color_type) == (8, 6)
+    rows = np.frombuffer(zlib.decompress(chunks[b'IDAT']), dtype=np.uint8).reshape(height, 1 + width * 4)
+    assert not rows[:, 0].any()
+    return width, height, rows[:, 1:].reshape(height, width, 4)
+
+
+class TileRenderTests(SimpleTestCase):
+    # One-degree grid of the whole world, north-up
+    GRID = {'affineTransform': {'translateX': -180.0, 'scaleX': 1.0, 'translateY': 90.0, 'scaleY': -1.0}}
+    VIS = {'min': 0, 'max': 1, 'palette': ['000000', 'FF0000']}
+    
+    def test_encode_png_round_trip(self):
+        rgba = np.arange(3 * 5 * 4, dtype=np.uint8).reshape(3, 5, 4)
+        width, height, decoded = decode_png(encode_png(rgba))
+        self.assertEqual((width, height), (5, 3))
+        np.testing.assert_array_equal(decoded, rgba)
+    
+    def test_values_are_stretched_over_the_palette(self):
+        values = np.ma.masked_array(np.zeros((180, 360)))
+        values[:, 180:] = 1.0
+        values[:90, :] = 0.5
+        _, _, rgba = decode_png(render_tile(values, self.GRID, self.VIS, 0, 0, 0))
+        half = TILE_SIZE // 2
+        np.testing.assert_array_equal(rgba[half + 10, 10], [0, 0, 0, 255])
+        np.testing.assert_array_equal(rgba[half + 10, half + 10], [255, 0, 0, 255])
+        np.testing.assert_array_equal(rgba[10, 10], [128, 0, 0, 255])
+    
+    def test_masked_and_uncovered_pixels_are_transparent(self):
+        values = np.ma.masked_array(np.ones((180, 360)), mask=np.zeros((180, 360), dtype=bool))
+        values[:, :180] = np.ma.masked
+        _, _, rgba = decode_png(render_tile(values, self.GRID, self.VIS, 0, 0, 0))
+        self.assertFalse(rgba[:, :TILE_SIZE // 2, 3].any())
+        self.assertTrue((rgba[:, TILE_SIZE // 2:, 3] == 255).all())
+        
+        # A grid over 0-10°E, 0-10°N covers only a corner of the world tile
+        grid = {'affineTransform': {'translateX': 0.0, 'scaleX': 0.1, 'translateY': 10.0, 'scaleY': -0.1}}
+        _, _, rgba = decode_png(render_tile(np.ma.masked_array(np.ones((100, 100))), grid, self.VIS, 0, 0, 0))
+        opaque_rows, opaque_cols = np.nonzero(rgba[..., 3])
+        self.assertTrue(len(opaque_rows))
+        self.assertTrue((opaque_cols >= TILE_SIZE // 2).all())
+        self.assertTrue((opaque_cols < TILE_SIZE // 2 + TILE_SIZE * 10 // 360 + 1).all())
+        self.assertTrue((opaque_rows < TILE_SIZE // 2).all())
+
+
+def to_ms(day):
+    return int(datetime.strptime(day, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+@override_settings(GEE_CATALOG_ENABLED=True, GEE_CATALOG_MAX_QUERY_CELLS=16)
+class SceneCatalogTests(SimpleTestCase):
+    ROI = polygon(square(west=77.2, south=28.2, size=0.1))
+    
+    def setUp(self):
+        cells = dict(scene_catalog._cells)
+        scenes = dict(scene_catalog._scenes)
+        scene_catalog._cells.clear()
+        scene_catalog._scenes.clear()
+        self.addCleanup(scene_catalog._scenes.update, scenes)
+        self.addCleanup(scene_catalog._cells.update, cells)
+        self.addCleanup(scene_catalog._scenes.clear)
+        self.addCleanup(scene_catalog._cells.clear)
+        
+        scene_catalog._cells[(77, 28)] = {'tiles': {('S2', '43RGM')}, 'synced_until': to_ms('2025-01-01'), 'stale': False}
+        scene_catalog._scenes[('S2', '43RGM')] = {'2024-03': {'S2/a': (to_ms('2024-03-10'), 20.0)}}
+    
+    def test_synced_cells_are_answered_locally(self):
+        has_imagery = scene_catalog.has_imagery
+        self.assertIs(has_imagery(self.ROI, '2024-03-01', '2024-04-01'), True)
+        self.assertIs(has_imagery(self.ROI, '2024-02-01', '2024-03-15'), True)
+        self.assertIs(has_imagery(self.ROI, '2024-04-01', '2024-05-01'), False)
+        # The window end is exclusive
+        self.assertIs(has_imagery(self.ROI, '2024-03-01', '2024-03-10'), False)
+        self.assertIs(has_imagery(self.ROI, '2024-03-01', '2024-04-01', sensor='LANDSAT'), False)
+        self.assertIs(has_imagery(self.ROI, '2024-03-01', '2024-04-01', cloud_threshold=30), True)
+        self.assertIs(has_imagery(self.ROI, '2024-03-01', '2024-04-01', cloud_threshold=20), False)
+    
+    def test_unsynced_windows_are_unknown_and_queued(self):
+        with mock.patch.object(scene_catalog, '_ensure_refresher') as refresher:
+            # Past the synced range of the cell
+            self.assertIsNone(scene_catalog.has_imagery(self.ROI, '2024-12-01', '2025-02-01'))
+            self.assertTrue(scene_catalog._cells[(77, 28)]['stale'])
+            # A cell never synced
+            roi = polygon(square(west=78.2, south=28.2, size=0.1))
+            self.assertIsNone(scene_catalog.has_imagery(roi, '2024-03-01', '2024-04-01'))
+            self.assertIn((78, 28), scene_catalog._cells)
+        self.assertEqual(refresher.call_count, 2)
+    
+    def test_unindexable_queries(self):
+        self.assertIsNone(scene_catalog.has_imagery(self.ROI, 'March', '2024-04-01'))
+        with override_settings(GEE_CATALOG_MAX_QUERY_CELLS=1):
+            self.assertIsNone(scene_catalog.has_imagery(polygon(square(size=1.5)), '2024-03-01', '2024-04-01'))
+        with override_settings(GEE_CATALOG_ENABLED=False):
+            self.assertIsNone(scene_catalog.has_imagery(self.ROI, '2024-03-01', '2024-04-01'))
+
+
+class PatchStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        settings_override = override_settings(GEE_PATCH_STORE_DIR=self.root, GEE_PATCH_STORE_MAX_BYTES=10 ** 9)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        store = dict(patch_store._store)
+        patch_store._store.update(bytes=None, writes=0)
+        self.addCleanup(patch_store._store.update, store)
+    
+    def save(self, name, age):
+        """Store a patch named name last used age seconds ago; returns its key"""
+        key = patch_store.patch_key({'name': name}, 'expression')
+        patch_store.save_patch(key, {'values': np.zeros(1000)})
+        used = datetime.now().timestamp() - age
+        os.utime(patch_store.patch_path(key), (used, used))
+        return key
+    
+    def test_patches_round_trip(self):
+        key = patch_store.patch_key({'bounds': [0, 0, 1, 1]}, 'expression')
+        values = np.ma.masked_array(np.arange(6.0).reshape(2, 3), mask=[[0, 1, 0], [0, 0, 1]])
+        patch_store.save_patch(key, {'values': values, 'area': np.ones(3)}, extra={'grid': 'g'})
+        loaded = patch_store.load_patch(key)
+        np.testing.assert_array_equal(loaded['values'].mask, values.mask)
+        np.testing.assert_array_equal(loaded['values'].data, values.data)
+        np.testing.assert_array_equal(loaded['area'], np.ones(3))
+        self.assertEqual(loaded['grid'], 'g')
+        self.assertIsNone(patch_store.load_patch(patch_store.patch_key({'bounds': [0, 0, 2, 2]}, 'expression')))
+    
+    def test_least_recently_used_patches_are_evicted(self):
+        keys = [self.save(name, age) for name, age in (('old', 300), ('middle', 200), ('new', 100))]
+        size = patch_store._scan()[0][1]
+        # A write in progress is neither counted nor evicted
+        in_progress = patch_store.patch_path(keys[0]) + '.1.2.tmp'
+        os.makedirs(in_progress)
+        with open(os.path.join(in_progress, 'values.npy'), 'wb') as f:
+            f.write(b'0' * 10 * size)
+        self.assertEqual(len(patch_store._scan()), 3)
+        
+        with override_settings(GEE_PATCH_STORE_MAX_BYTES=int(2.5 * size)):
+            patch_store._evict()
+        self.assertIsNone(patch_store.load_patch(keys[0]))
+        self.assertIsNotNone(patch_store.load_patch(keys[1]))
+        self.assertIsNotNone(patch_store.load_patch(keys[2]))
+        self.assertTrue(os.path.isdir(in_progress))
+        self.assertEqual(patch_store._store['bytes'], 2 * size)
+    
+    def test_recent_windows_expire(self):
+        self.assertEqual(patch_store.freshness_stamp('2020-01-31'), '')
+        self.assertEqual(patch_store.freshness_stamp(None), '')
+        self.assertNotEqual(patch_store.freshness_stamp(date.today().isoformat()), '')
+        recent = (date.today() - timedelta(days=5)).isoformat()
+        grid = {'bounds': [0, 0, 1, 1]}
+        self.assertEqual(patch_store.patch_key(grid, 'e', '2020-01-31'), patch_store.patch_key(grid, 'e'))
+        self.assertNotEqual(patch_store.patch_key(grid, 'e', recent), patch_store.patch_key(grid, 'e'))
+        with mock.patch.object(patch_store.time, 'time', return_value=10 ** 9 + 7 * 3600):
+            later = patch_store.patch_key(grid, 'e', recent)
+        with mock.patch.object(patch_store.time, 'time', return_value=10 ** 9):
+            self.assertNotEqual(patch_store.patch_key(grid, 'e', recent), later)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class LocalLayerTests(SimpleTestCase):
+    GRID = {'affineTransform': {'translateX': 0.0, 'scaleX': 0.1, 'translateY': 10.0, 'scaleY': -0.1}}
+    VIS = {'min': 0, 'max': 1}
+    
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        settings_override = override_settings(GEE_PATCH_STORE_DIR=self.root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+    
+    def test_registering_again_marks_the_array_used(self):
+        values = np.ma.masked_array(np.eye(4))
+        layer_id = local_layer_descriptor(values, self.GRID, self.VIS)['id']
+        path = patch_store.patch_path(layer_id)
+        os.utime(path, (0, 0))
+        self.assertEqual(local_layer_descriptor(values, self.GRID, self.VIS)['id'], layer_id)
+        self.assertGreater(os.stat(path).st_mtime, 0)
+        
+        stored, grid, vis_params = local_layer(layer_id)
+        np.testing.assert_array_equal(stored, values)
+        self.assertEqual((grid, vis_params), (self.GRID, self.VIS))
+    
+    def test_evicted_arrays_are_stored_again(self):
+        values = np.ma.masked_array(np.eye(4))
+        layer_id = local_layer_descriptor(values, self.GRID, self.VIS)['id']
+        shutil.rmtree(patch_store.patch_path(layer_id))
+        self.assertIsNone(local_layer(layer_id))
+        local_layer_descriptor(values, self.GRID, self.VIS)
+        self.assertIsNotNone(local_layer(layer_id))
@@ -0,0 +1,155 @@
+import os
+import re
+import threading
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.http import require_http_methods
+from .gee_transport import get_transport
+from .gee_utils import initialize_gee
+from .layers import upstream_tile_url, local_layer
+from .tile_render import render_tile
+
+LAYER_ID = re.compile(r'[0-9a-f]{64}')
+
+# Rescan the store every this many writes so other workers' tiles are accounted for
+RESCAN_EVERY = 500
+
+_lock = threading.Lock()
+_evict_lock = threading.Lock()
+_store = {'bytes': None, 'writes': 0}
+_stats = {'hits': 0, 'misses': 0, 'local_renders': 0, 'upstream_errors': 0, 'evicted_tiles': 0}
+
+def tile_path(layer_id, z, x, y):
+    """Sharded on-disk location of a rendered tile"""
+    return os.path.join(settings.GEE_TILE_STORE_DIR, layer_id[:2], layer_id[2:4], layer_id, str(z), str(x), f'{y}.png')
+
+def _scan():
+    """Every stored tile as (last use, size, path)"""
+    tiles = []
+    for root, _, files in os.walk(settings.GEE_TILE_STORE_DIR):
+        for name in files:
+            # Tiles still being written are not evictable entries
+            if name.endswith('.tmp'):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            tiles.append((stat.st_mtime, stat.st_size, path))
+    return tiles
+
+def _evict():
+    """Delete least recently used tiles until the store is back under 90% of its budget"""
+    if not _evict_lock.acquire(blocking=False):
+        return
+    try:
+        tiles = sorted(_scan())
+        total = sum(size for _, size, _ in tiles)
+        target = settings.GEE_TILE_STORE_MAX_BYTES * 0.9
+        evicted = 0
+        for _, size, path in tiles:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        with _lock:
+            _store['bytes'] = total
+            _stats['evicted_tiles'] += evicted
+    finally:
+        _evict_lock.release()
+
+def read_tile(layer_id, z, x, y):
+    """Stored tile bytes, marking the tile as recently used, or None"""
+    path = tile_path(layer_id, z, x, y)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        os.utime(path)
+    except OSError:
+        return None
+    return data
+
+def write_tile(layer_id, z, x, y, data):
+    """Store a rendered tile atomically and keep the store within its size budget"""
+    path = tile_path(layer_id, z, x, y)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+    
+    with _lock:
+        _store['writes'] += 1
+        rescan = _store['bytes'] is None or _store['writes'] % RESCAN_EVERY == 0
+        if _store['bytes'] is not None:
+            _store['bytes'] += len(data)
+    if rescan:
+        total = sum(size for _, size, _ in _scan())
+        with _lock:
+            _store['bytes'] = total
+    if _store['bytes'] > settings.GEE_TILE_STORE_MAX_BYTES:
+        _evict()
+
+@require_http_methods(["GET"])
+def serve_tile(request, layer_id, z, x, y):
+    """XYZ tile of a fingerprinted layer, served from the disk store or fetched from Earth Engine once
+    
+    Layers backed by a local pixel array are rendered with numpy on every
+    request instead; that takes milliseconds and needs no Earth Engine call.
+    """
+    if not LAYER_ID.fullmatch(layer_id):
+        return HttpResponse(status=404)
+    
+    local = local_layer(layer_id)
+    if local is not None:
+        values, grid, vis_params = local
+        with _lock:
+            _stats['local_renders'] += 1
+        return _tile_response(render_tile(values, grid, vis_params, z, x, y))
+    
+    data = read_tile(layer_id, z, x, y)
+    with _lock:
+        _stats['hits' if data is not None else 'misses'] += 1
+    
+    if data is None:
+        try:
+            url = upstream_tile_url(layer_id) if initialize_gee() else None
+            if url is None:
+                return HttpResponse(status=404)
+            response = get_transport().session.get(url.format(z=z, x=x, y=y), timeout=30)
+        except Exception as e:
+            print(f"Tile proxy error for {layer_id}/{z}/{x}/{y}: {e}")
+            with _lock:
+                _stats['upstream_errors'] += 1
+            return HttpResponse(status=502)
+        
+        if response.status_code != 200:
+            with _lock:
+                _stats['upstream_errors'] += 1
+            return HttpResponse(status=response.status_code)
+        data = response.content
+        write_tile(layer_id, z, x, y, data)
+    
+    return _tile_response(data)
+
+def _tile_response(data):
+    """PNG response; a fingerprint always renders the same tiles, so browsers may keep them"""
+    tile = HttpResponse(data, content_type='image/png')
+    tile['Cache-Control'] = 'public, max-age=86400'
+    return tile
+
+def tile_store_stats():
+    """Hit/miss counters and size of the on-disk tile store"""
+    with _lock:
+        stats = dict(_stats, store_bytes=_store['bytes'])
+    lookups = stats['hits'] + stats['misses']
+    return dict(
+        stats,
+        max_bytes=settings.GEE_TILE_STORE_MAX_BYTES,
+        hit_rate=round(stats['hits'] / lookups, 3) if lookups else None
+    )
@@ -0,0 +1,68 @@
+import math
+import struct
+import zlib
+import numpy as np
+
+TILE_SIZE = 256
+
+def palette_colors(palette):
+    """RGB rows of an Earth Engine style hex palette"""
+    return np.array([[int(color.lstrip('#')[i:i + 2], 16) for i in (0, 2, 4)] for color in palette], dtype=np.float64)
+
+def colorize(values, vis_params):
+    """RGBA pixels of a masked array stretched over min/max and a palette, as visualize() does"""
+    palette = palette_colors(vis_params.get('palette') or ['000000', 'FFFFFF'])
+    low = float(vis_params.get('min', 0))
+    high = float(vis_params.get('max', 1))
+    
+    data = np.ma.filled(values.astype(np.float64), low)
+    span = high - low if high != low else 1.0
+    position = np.clip((data - low) / span, 0, 1) * (len(palette) - 1)
+    lower = np.floor(position).astype(int)
+    upper = np.minimum(lower + 1, len(palette) - 1)
+    fraction = (position - lower)[..., None]
+    rgb = palette[lower] * (1 - fraction) + palette[upper] * fraction
+    
+    rgba = np.zeros(data.shape + (4,), dtype=np.uint8)
+    rgba[..., :3] = np.round(rgb).astype(np.uint8)
+    rgba[..., 3] = np.where(np.ma.getmaskarray(values), 0, 255)
+    return rgba
+
+def encode_png(rgba):
+    """Encode an (height, width, 4) uint8 array as an RGBA PNG"""
+    height, width = rgba.shape[:2]
+    
+    def chunk(kind, payload):
+        return struct.pack('>I', len(payload)) + kind + payload + struct.pack('>I', zlib.crc32(kind + payload) & 0xffffffff)
+    
+    # Every scanline starts with filter type 0 (none)
+    raw = np.concatenate([np.zeros((height, 1), dtype=np.uint8), rgba.reshape(height, width * 4)], axis=1)
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)),
+        chunk(b'IDAT', zlib.compress(raw.tobytes(), 6)),
+        chunk(b'IEND', b'')
+    ])
+
+def tile_lon_lat(z, x, y):
+    """Lon/lat of the pixel centres of a Web Mercator XYZ tile"""
+    n = 2 ** z
+    offsets = (np.arange(TILE_SIZE) + 0.5) / TILE_SIZE
+    lon = (x + offsets) / n * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(math.pi * (1 - 2 * (y + offsets) / n))))
+    return lon, lat
+
+def render_tile(values, grid, vis_params, z, x, y):
+    """PNG of one XYZ tile sampled (nearest neighbour) from an array on an EPSG:4326 grid"""
+    transform = grid['affineTransform']
+    height, width = values.shape
+    lon, lat = tile_lon_lat(z, x, y)
+    cols = np.floor((lon - transform['translateX']) / transform['scaleX']).astype(int)
+    rows = np.floor((lat - transform['translateY']) / transform['scaleY']).astype(int)
+    
+    col_inside = (cols >= 0) & (cols < width)
+    row_inside = (rows >= 0) & (rows < height)
+    sampled = values[np.clip(rows, 0, height - 1)[:, None], np.clip(cols, 0, width - 1)[None, :]]
+    outside = ~(row_inside[:, None] & col_inside[None, :])
+    sampled = np.ma.masked_array(np.ma.getdata(sampled), mask=np.ma.getmaskarray(sampled) | outside)
+    return encode_png(colorize(sampled, vis_params))
@@ -0,0 +1,75 @@
+import ee
+from datetime import datetime
+from dateutil.relativedelta import relativedelta
+from .gee_utils import interpolate_missing_values, roi_cloud_scores, clearest_scenes, reduction_params
+from .scene_catalog import has_imagery
+
+def month_windows(start_date, end_date):
+    """Monthly (label, start, end) windows stepping one month from start_date"""
+    start = datetime.strptime(start_date, '%Y-%m-%d')
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+    
+    windows = []
+    current = start
+    while current <= end:
+        month_end = current + relativedelta(months=1) - relativedelta(days=1)
+        if month_end > end:
+            month_end = end
+        windows.append((current.strftime('%Y-%m'), current.strftime('%Y-%m-%d'), month_end.strftime('%Y-%m-%d')))
+        current = current + relativedelta(months=1)
+    
+    return windows
+
+def build_monthly_stack(roi, windows, index_fn, band_names, cloud_threshold=50):
+    """Stack every month's index bands as '<band>_<month>' bands of one image
+    
+    index_fn receives the median of the month's clearest Sentinel-2 scenes
+    (cloud_threshold is the % cloud over the ROI) and returns an image with
+    band_names. Months without imagery contribute fully masked bands; months
+    the scene catalog knows to be empty skip the composite altogether.
+    """
+    empty = ee.Image.constant([0] * len(band_names)).rename(band_names).updateMask(0)
+    
+    monthly_images = []
+    for i, (_, month_start, month_end) in enumerate(windows):
+        if has_imagery(roi, month_start, month_end, 'S2') is False:
+            monthly_images.append(empty.select(band_names, [f'{band}_{i}' for band in band_names]))
+            continue
+        
+        collection = clearest_scenes(roi_cloud_scores(roi, month_start, month_end), cloud_threshold)
+        
+        image = ee.Image(ee.Algorithms.If(collection.size().gt(0), index_fn(collection.median()), empty))
+        monthly_images.append(image.select(band_names, [f'{band}_{i}' for band in band_names]))
+    
+    return ee.Image.cat(monthly_images)
+
+def monthly_stack_stats(roi, windows, index_fn, band_names, cloud_threshold=50):
+    """Server-side mean of every stacked month from a single reduceRegion"""
+    if not windows:
+        return ee.Dictionary()
+    
+    stack = build_monthly_stack(roi, windows, index_fn, band_names, cloud_threshold)
+    return stack.reduceRegion(
+        reducer=ee.Reducer.mean(),
+        geometry=roi,
+        **reduction_params(roi, 'time_series')
+    )
+
+def unpack_monthly_stats(stats, windows, band_names, roi):
+    """Split reduced stack values into one interpolated series per band"""
+    series = {'months': [label for label, _, _ in windows], 'scale': reduction_params(roi, 'time_series')['scale']}
+    
+    for band in band_names:
+        values = []
+        for i in range(len(windows)):
+            value = stats.get(f'{band}_{i}')
+            values.append(round(float(value), 3) if value is not None else None)
+        series[band] = interpolate_missing_values(values)
+    
+    return series
+
+def monthly_index_series(roi, start_date, end_date, index_fn, band_names, cloud_threshold=50):
+    """Fetch a monthly index time series in one round trip"""
+    windows = month_windows(start_date, end_date)
+    stats = monthly_stack_stats(roi, windows, index_fn, band_names, cloud_threshold).getInfo()
+    return unpack_monthly_stats(stats, windows, band_names, roi)
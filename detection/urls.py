@@ -6,6 +6,7 @@ from . import crop_analysis
 from . import water_views
 from . import weather_views
 from . import csv_export
+from . import tile_proxy
 
 urlpatterns = [
     path('', views.home, name='home'),
@@ -22,4 +23,7 @@ urlpatterns = [
     path('analyze-advanced-water/', water_views.analyze_advanced_water, name='analyze_advanced_water'),
     path('get-rainfall-forecast/', weather_views.get_rainfall_forecast, name='get_rainfall_forecast'),
     path('download-timeseries-csv/', csv_export.download_timeseries_csv, name='download_timeseries_csv'),
+    path('gee-status/', views.gee_status, name='gee_status'),
+    path('mint-layer/', views.mint_layer, name='mint_layer'),
+    path('tiles/<str:layer_id>/<int:z>/<int:x>/<int:y>.png', tile_proxy.serve_tile, name='serve_tile'),
 ]
\ No newline at end of file
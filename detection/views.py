@@ -1,4 +1,16 @@
+import json
+from django.http import JsonResponse
 from django.shortcuts import render
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from .gee_executor import run_call, scheduler_stats, tile_cache_stats, gee_priority, PREVIEW
+from .gee_utils import initialize_gee
+from .layers import mint_layer_url
+from .gee_session import session_health
+from .gee_transport import transport_stats
+from .scene_catalog import catalog_stats
+from .tile_proxy import tile_store_stats
+from .patch_store import patch_store_stats
 
 def home(request):
     return render(request, 'home.html')
@@ -11,3 +23,42 @@ def water_analysis(request):
 
 def weather_analysis(request):
     return render(request, 'weather_analysis.html')
+
+def gee_status(request):
+    """Earth Engine session, transport, scheduler and cache metrics for this worker process"""
+    return JsonResponse({
+        'success': True,
+        'data': {
+            'session': session_health(),
+            'transport': transport_stats(),
+            'scheduler': scheduler_stats(),
+            'tile_urls': tile_cache_stats(),
+            'tile_store': tile_store_stats(),
+            'patch_store': patch_store_stats(),
+            'catalog': catalog_stats()
+        }
+    })
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@gee_priority(PREVIEW)
+def mint_layer(request):
+    """Mint the tile URL of a layer descriptor when the user enables the layer"""
+    try:
+        if not initialize_gee():
+            return JsonResponse({'success': False, 'error': 'GEE initialization failed'})
+        
+        data = json.loads(request.body)
+        mint = mint_layer_url(data.get('id'))
+        if mint is None:
+            return JsonResponse({'success': False, 'error': 'Layer has expired, please run the analysis again'})
+        
+        return JsonResponse({
+            'success': True,
+            'data': {
+                'url': run_call(mint)
+            }
+        })
+    
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)})
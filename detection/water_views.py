@@ -1,70 +1,219 @@
 import ee
 import json
+import numpy as np
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-from .gee_utils import initialize_gee
-from datetime import datetime
-from dateutil.relativedelta import relativedelta
+from .gee_utils import (initialize_gee, harmonized_collection, harmonized_composite, reduction_params, progressive_scales,
+                        selected_scene_ids, scene_composite, CLOUD_SCL_CLASSES)
+from .scene_catalog import has_any_imagery
+from .gee_executor import run_parallel, run_call, get_info, gee_priority, INTERACTIVE
+from .layers import layer_descriptor, local_layer_descriptor
+from .local_compute import use_local_engine, fetch_pixels, masked_area, masked_mean
+from .sampling import approximate_statistics, sampling_summary
+from .sharding import sharded_statistics, reduction_scale
+from .roi import prepare_roi
+from .surface_water import jrc_covers, jrc_water_mask
+from .time_series import month_windows, monthly_stack_stats, unpack_monthly_stats, monthly_index_series
+
+def water_index_bands(image):
+    """NDWI/MNDWI of a composite, masked to water pixels (NDWI > 0.3 OR MNDWI > 0.3)"""
+    ndwi = image.normalizedDifference(['B3', 'B8']).rename('ndwi')
+    mndwi = image.normalizedDifference(['B3', 'B11']).rename('mndwi')
+    water_mask = ndwi.gt(0.3).Or(mndwi.gt(0.3))
+    return ndwi.addBands(mndwi).updateMask(water_mask)
+
+def quality_index_bands(image):
+    """Turbidity (B4/B3) and chlorophyll (B8/B4) ratios over water pixels"""
+    ndwi = image.normalizedDifference(['B3', 'B8'])
+    mndwi = image.normalizedDifference(['B3', 'B11'])
+    water_mask = ndwi.gt(0.3).Or(mndwi.gt(0.3))
+    turbidity = image.select('B4').divide(image.select('B3')).rename('turbidity')
+    chlorophyll = image.select('B8').divide(image.select('B4')).rename('chlorophyll')
+    return turbidity.addBands(chlorophyll).updateMask(water_mask)
+
+def local_mask_layer(pixels, mask, vis_params, image):
+    """Locally rendered layer showing the set pixels of a boolean mask on a download grid
+    
+    image is the same mask on Earth Engine, minted instead once the array is evicted.
+    """
+    return local_layer_descriptor(np.ma.masked_array(np.ones(mask.shape), mask=~mask), pixels['grid'], vis_params,
+                                  image.selfMask())
+
+def rounded_interval(half_width, digits=3):
+    """Rounded 95% half-width of an approximate estimate, or None when it could not be estimated"""
+    return round(half_width, digits) if half_width is not None else None
+
+def composite_water_mask(roi, start_date, end_date, cloud_threshold=50):
+    """Water (1) / non-water (0) mask of the best available composite, 0 where there is no imagery"""
+    if has_any_imagery(roi, start_date, end_date) is False:
+        return ee.Image.constant(0).rename('water').clip(roi)
+    
+    collection = harmonized_collection(roi, start_date, end_date, cloud_threshold)
+    composite = collection.median()
+    
+    # Combine indices for robust water detection
+    ndwi = composite.normalizedDifference(['B3', 'B8'])
+    mndwi = composite.normalizedDifference(['B3', 'B11'])
+    water = ndwi.gt(0.3).Or(mndwi.gt(0.3)).rename('water')
+    
+    return ee.Image(ee.Algorithms.If(
+        collection.size().gt(0), water,
+        ee.Image.constant(0).rename('water').clip(roi)))
+
+def season_water_mask(roi, start_date, end_date):
+    """Water mask of a season and its source: the JRC monthly history where it covers the season, else a composite"""
+    if jrc_covers(start_date, end_date):
+        return jrc_water_mask(roi, start_date, end_date), 'jrc_monthly_history'
+    return composite_water_mask(roi, start_date, end_date), 'optical_composite'
+
+# Occurrence classes: (name, lowest fraction of clear observations that were water)
+OCCURRENCE_CLASSES = [('permanent', 0.75), ('seasonal', 0.25), ('ephemeral', 0.0)]
+
+# SCL classes that are not a clear observation: no data, saturated/defective and cloudy
+UNOBSERVED_SCL_CLASSES = [0, 1] + CLOUD_SCL_CLASSES
+
+def scene_water(image):
+    """Water test (NDWI > 0.3 OR MNDWI > 0.3) of one Sentinel-2 scene, masked where SCL is not a clear observation"""
+    clear = image.select('SCL').remap(UNOBSERVED_SCL_CLASSES, [0] * len(UNOBSERVED_SCL_CLASSES), 1)
+    ndwi = image.normalizedDifference(['B3', 'B8'])
+    mndwi = image.normalizedDifference(['B3', 'B11'])
+    return ndwi.gt(0.3).Or(mndwi.gt(0.3)).rename('water').updateMask(clear)
+
+def water_occurrence(roi, start_date, end_date):
+    """Per-pixel fraction of clear daily observations classified as water, masked where never observed
+    
+    Scenes of overlapping MGRS tiles acquired on the same day are mosaicked
+    first, so each pixel is counted once per overpass.
+    """
+    scenes = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
+        .filterBounds(roi) \
+        .filterDate(start_date, end_date)
+    days = scenes.aggregate_array('system:time_start') \
+        .map(lambda time: ee.Date(time).format('YYYY-MM-dd')) \
+        .distinct()
+    
+    def daily_water(day):
+        start = ee.Date.parse('YYYY-MM-dd', day)
+        return scenes.filterDate(start, start.advance(1, 'day')).map(scene_water).mosaic() \
+            .set('system:time_start', start.millis())
+    
+    observations = ee.ImageCollection.fromImages(days.map(daily_water))
+    water = observations.sum()
+    observed = observations.count()
+    return water.divide(observed.selfMask()).rename('occurrence').clip(roi)
+
+def occurrence_masks(occurrence):
+    """0/1 image of each occurrence class, from the highest class down"""
+    masks = {}
+    upper = None
+    for name, lowest in OCCURRENCE_CLASSES:
+        mask = occurrence.gt(lowest) if lowest == 0 else occurrence.gte(lowest)
+        masks[name] = mask if upper is None else mask.And(occurrence.lt(upper))
+        upper = lowest
+    return masks
+
+def areas_total(areas):
+    """Area (m²) of every occurrence class together: the area that was ever water"""
+    return sum(areas[name] for name, _ in OCCURRENCE_CLASSES)
+
+def seasonal_occurrence(roi, roi_geojson, start_date, end_date):
+    """Response data of the water occurrence mode of the seasonal view
+    
+    Every Sentinel-2 scene in the date range is tested for water on its own
+    and the per-pixel share of clear observations that were water is reduced
+    in a single pass, instead of classifying three season composites.
+    """
+    occurrence = water_occurrence(roi, start_date, end_date)
+    occurrence_vis = {'min': 0, 'max': 1, 'palette': ['FFFFFF', '00FFFF', '0000FF', '000080']}
+    class_vis = {
+        'permanent': {'min': 0, 'max': 1, 'palette': ['000080']},
+        'seasonal': {'min': 0, 'max': 1, 'palette': ['00FFFF']},
+        'ephemeral': {'min': 0, 'max': 1, 'palette': ['ADD8E6']}
+    }
+    
+    if use_local_engine(roi_geojson):
+        outputs = run_parallel({
+            'pixels': lambda: fetch_pixels({'occurrence': occurrence}, roi, window_end=end_date),
+            'time_series': lambda: monthly_index_series(roi, start_date, end_date, water_index_bands, ['ndwi', 'mndwi'])
+        })
+        pixels = outputs['pixels']
+        values = np.ma.filled(pixels['occurrence'], -1.0)
+        upper = None
+        areas = {}
+        masks = occurrence_masks(occurrence)
+        layers = {'occurrence': local_layer_descriptor(pixels['occurrence'], pixels['grid'], occurrence_vis,
+                                                       occurrence.updateMask(occurrence.gt(0)))}
+        for name, lowest in OCCURRENCE_CLASSES:
+            selected = (values > lowest) if lowest == 0 else (values >= lowest)
+            if upper is not None:
+                selected &= values < upper
+            upper = lowest
+            areas[name] = float(pixels['area'][selected].sum())
+            layers[name] = local_mask_layer(pixels, selected, class_vis[name], masks[name])
+        areas['observed'] = float(pixels['area'][values >= 0].sum())
+        ever_water = values > 0
+        mean_occurrence = float(np.average(values[ever_water], weights=pixels['area'][ever_water])) if areas_total(areas) > 0 else None
+    else:
+        masks = occurrence_masks(occurrence)
+        layers = {'occurrence': layer_descriptor(occurrence.updateMask(occurrence.gt(0)), occurrence_vis)}
+        layers.update({name: layer_descriptor(mask.selfMask(), class_vis[name]) for name, mask in masks.items()})
+        
+        sums = {name: mask.multiply(ee.Image.pixelArea()) for name, mask in masks.items()}
+        sums['observed'] = occurrence.mask().gt(0).multiply(ee.Image.pixelArea())
+        sums['occurrence'] = occurrence.updateMask(occurrence.gt(0)).unmask(0).multiply(ee.Image.pixelArea())
+        outputs = run_parallel({
+            'statistics': lambda: sharded_statistics(roi, sums=sums)[0],
+            'time_series': lambda: monthly_index_series(roi, start_date, end_date, water_index_bands, ['ndwi', 'mndwi'])
+        })
+        areas = outputs['statistics']
+        water_area = areas_total(areas)
+        mean_occurrence = areas['occurrence'] / water_area if water_area > 0 else None
+    
+    water_area = areas_total(areas)
+    permanent_ratio = (areas['permanent'] / water_area * 100) if water_area > 0 else 0
+    if permanent_ratio > 70:
+        water_stress = 'Low Stress'
+    elif permanent_ratio > 50:
+        water_stress = 'Moderate Stress'
+    elif permanent_ratio > 30:
+        water_stress = 'High Stress'
+    else:
+        water_stress = 'Critical Stress'
+    
+    result = {
+        'mode': 'occurrence',
+        'water_area': round(water_area / 1e6, 3),
+        'observed_area': round(areas['observed'] / 1e6, 3),
+        # Area-weighted mean share of observations that were water, over pixels that were ever water
+        'mean_occurrence': round(mean_occurrence * 100, 1) if mean_occurrence is not None else None,
+        'water_stress': water_stress,
+        'occurrence_classes': {name: lowest for name, lowest in OCCURRENCE_CLASSES},
+        'layers': layers,
+        'reduction_scale': reduction_scale(roi),
+        'time_series': outputs['time_series']
+    }
+    result.update({f'{name}_area': round(areas[name] / 1e6, 3) for name, _ in OCCURRENCE_CLASSES})
+    return result
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@gee_priority(INTERACTIVE)
 def analyze_water_change(request):
     try:
         initialize_gee()
         data = json.loads(request.body)
-        roi_geojson = data.get('roi')
         period1_start = data.get('period1Start')
         period1_end = data.get('period1End')
         period2_start = data.get('period2Start')
         period2_end = data.get('period2End')
         
-        roi = ee.Geometry(roi_geojson['geometry'])
+        prepared = prepare_roi(data.get('roi'))
+        roi_geojson = prepared['geojson']
+        roi = prepared['geometry']
         
-        # Get Sentinel-2 imagery for both periods
-        def get_water_mask(start_date, end_date):
-            # Try with lower cloud threshold if needed
-            collection = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
-                .filterBounds(roi) \
-                .filterDate(start_date, end_date) \
-                .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 50))
-            
-            # Check if collection has images
-            count = collection.size().getInfo()
-            if count == 0:
-                # Try without cloud filter
-                collection = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
-                    .filterBounds(roi) \
-                    .filterDate(start_date, end_date)
-                count = collection.size().getInfo()
-                if count == 0:
-                    # Try Landsat 8/9 as fallback
-                    collection = ee.ImageCollection('LANDSAT/LC08/C02/T1_L2') \
-                        .filterBounds(roi) \
-                        .filterDate(start_date, end_date)
-                    count = collection.size().getInfo()
-                    if count == 0:
-                        return ee.Image.constant(0).rename('water').clip(roi)
-                    # Landsat bands: SR_B3 (Green), SR_B5 (NIR), SR_B6 (SWIR1)
-                    s2 = collection.select(['SR_B3', 'SR_B5', 'SR_B6']).median()
-                    ndwi = s2.normalizedDifference(['SR_B3', 'SR_B5'])
-                    mndwi = s2.normalizedDifference(['SR_B3', 'SR_B6'])
-                    water = ndwi.gt(0.3).Or(mndwi.gt(0.3)).rename('water')
-                    return water
-            
-            s2 = collection.select(['B3', 'B8', 'B11']).median()
-            
-            # Calculate water indices
-            ndwi = s2.normalizedDifference(['B3', 'B8'])
-            mndwi = s2.normalizedDifference(['B3', 'B11'])
-            
-            # Combine indices for robust water detection (return 1 for water, 0 for non-water)
-            water = ndwi.gt(0.3).Or(mndwi.gt(0.3)).rename('water')
-            
-            return water
-        
-        water_period1 = get_water_mask(period1_start, period1_end).clip(roi)
-        water_period2 = get_water_mask(period2_start, period2_end).clip(roi)
+        water_period1 = composite_water_mask(roi, period1_start, period1_end).clip(roi)
+        water_period2 = composite_water_mask(roi, period2_start, period2_end).clip(roi)
         
         # Calculate water gain and loss
         # Gain: water in period2 (1) AND no water in period1 (0) = 1 - 0 = 1
@@ -78,114 +227,64 @@ def analyze_water_change(request):
         water_gain_masked = water_gain.updateMask(water_gain).clip(roi)
         water_loss_masked = water_loss.updateMask(water_loss).clip(roi)
         
-        # Calculate areas with bestEffort for large regions
-        area1 = water_period1.multiply(ee.Image.pixelArea()).reduceRegion(
-            reducer=ee.Reducer.sum(),
-            geometry=roi,
-            scale=30,
-            maxPixels=1e13,
-            bestEffort=True
-        ).get('water')
-        
-        area2 = water_period2.multiply(ee.Image.pixelArea()).reduceRegion(
-            reducer=ee.Reducer.sum(),
-            geometry=roi,
-            scale=30,
-            maxPixels=1e13,
-            bestEffort=True
-        ).get('water')
-        
-        area1_km2 = ee.Number(area1).divide(1e6).getInfo() if area1 else 0
-        area2_km2 = ee.Number(area2).divide(1e6).getInfo() if area2 else 0
-        change = area2_km2 - area1_km2
-        percentage = (change / area1_km2 * 100) if area1_km2 > 0 else 0
-        
-        # Generate time series data
-        from datetime import datetime
-        from dateutil.relativedelta import relativedelta
+        # Monthly NDWI/MNDWI means, stacked as bands and fetched with the areas below
+        windows = month_windows(period1_start, period2_end)
+        monthly_stats = monthly_stack_stats(roi, windows, water_index_bands, ['ndwi', 'mndwi'])
         
-        start = datetime.strptime(period1_start, '%Y-%m-%d')
-        end = datetime.strptime(period2_end, '%Y-%m-%d')
-        
-        months = []
-        ndwi_values = []
-        mndwi_values = []
-        
-        current = start
-        while current <= end:
-            month_str = current.strftime('%Y-%m')
-            month_end = current + relativedelta(months=1) - relativedelta(days=1)
-            if month_end > end:
-                month_end = end
-            
-            try:
-                monthly_img = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
-                    .filterBounds(roi) \
-                    .filterDate(current.strftime('%Y-%m-%d'), month_end.strftime('%Y-%m-%d')) \
-                    .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 50)) \
-                    .select(['B3', 'B8', 'B11']) \
-                    .median()
-                
-                ndwi = monthly_img.normalizedDifference(['B3', 'B8']).rename('ndwi')
-                mndwi = monthly_img.normalizedDifference(['B3', 'B11']).rename('mndwi')
-                
-                # Calculate mean only for water pixels (NDWI > 0.3 OR MNDWI > 0.3)
-                water_mask = ndwi.gt(0.3).Or(mndwi.gt(0.3))
-                
-                ndwi_water = ndwi.updateMask(water_mask)
-                mndwi_water = mndwi.updateMask(water_mask)
-                
-                ndwi_mean = ndwi_water.reduceRegion(reducer=ee.Reducer.mean(), geometry=roi, scale=100, maxPixels=1e13, bestEffort=True).getInfo()
-                mndwi_mean = mndwi_water.reduceRegion(reducer=ee.Reducer.mean(), geometry=roi, scale=100, maxPixels=1e13, bestEffort=True).getInfo()
-                
-                months.append(month_str)
-                ndwi_values.append(round(float(ndwi_mean.get('ndwi', 0) or 0), 3))
-                mndwi_values.append(round(float(mndwi_mean.get('mndwi', 0) or 0), 3))
-            except:
-                months.append(month_str)
-                ndwi_values.append(None)
-                mndwi_values.append(None)
-            
-            current = current + relativedelta(months=1)
-        
-        # Interpolate missing values
-        def interpolate_values(values):
-            result = values[:]
-            for i in range(len(result)):
-                if result[i] is None or result[i] == 0:
-                    prev_idx = next_idx = None
-                    for j in range(i-1, -1, -1):
-                        if result[j] is not None and result[j] != 0:
-                            prev_idx = j
-                            break
-                    for j in range(i+1, len(result)):
-                        if result[j] is not None and result[j] != 0:
-                            next_idx = j
-                            break
-                    if prev_idx is not None and next_idx is not None:
-                        result[i] = round(result[prev_idx] + (result[next_idx] - result[prev_idx]) * (i - prev_idx) / (next_idx - prev_idx), 3)
-                    elif prev_idx is not None:
-                        result[i] = result[prev_idx]
-                    elif next_idx is not None:
-                        result[i] = result[next_idx]
-                    else:
-                        result[i] = 0
-            return result
-        
-        ndwi_values = interpolate_values(ndwi_values)
-        mndwi_values = interpolate_values(mndwi_values)
-        
-        # Generate map tiles
         water_vis = {'min': 0, 'max': 1, 'palette': ['0000FF']}
         gain_vis = {'min': 0, 'max': 1, 'palette': ['00FF00']}
         loss_vis = {'min': 0, 'max': 1, 'palette': ['FF0000']}
         
-        layers = {
-            'period1_water': water_period1_masked.getMapId(water_vis)['tile_fetcher'].url_format,
-            'period2_water': water_period2_masked.getMapId(water_vis)['tile_fetcher'].url_format,
-            'water_gain': water_gain_masked.getMapId(gain_vis)['tile_fetcher'].url_format,
-            'water_loss': water_loss_masked.getMapId(loss_vis)['tile_fetcher'].url_format
-        }
+        # Small ROIs reduce the two water masks locally from one pixel download and
+        # render their layers from it; otherwise both areas come from one sum reduction
+        # (parallel full-resolution sub-tiles for large ROIs) fetched alongside the series
+        if use_local_engine(roi_geojson):
+            outputs = run_parallel({
+                'pixels': lambda: fetch_pixels({'water1': water_period1, 'water2': water_period2}, roi, window_end=period2_end),
+                'monthly': get_info(monthly_stats)
+            })
+            pixels = outputs['pixels']
+            results = {
+                'area1': masked_area(pixels, 'water1') / 1e6,
+                'area2': masked_area(pixels, 'water2') / 1e6,
+                'monthly': outputs['monthly']
+            }
+            
+            water1 = np.ma.filled(pixels['water1'] > 0, False)
+            water2 = np.ma.filled(pixels['water2'] > 0, False)
+            layers = {
+                'period1_water': local_mask_layer(pixels, water1, water_vis, water_period1),
+                'period2_water': local_mask_layer(pixels, water2, water_vis, water_period2),
+                'water_gain': local_mask_layer(pixels, water2 & ~water1, gain_vis, water_gain.clip(roi)),
+                'water_loss': local_mask_layer(pixels, water1 & ~water2, loss_vis, water_loss.clip(roi))
+            }
+        else:
+            # Layer descriptors; tiles are minted when the user enables a layer
+            layers = {
+                'period1_water': layer_descriptor(water_period1_masked, water_vis),
+                'period2_water': layer_descriptor(water_period2_masked, water_vis),
+                'water_gain': layer_descriptor(water_gain_masked, gain_vis),
+                'water_loss': layer_descriptor(water_loss_masked, loss_vis)
+            }
+            outputs = run_parallel({
+                'areas': lambda: sharded_statistics(roi, sums={
+                    'area1': water_period1.multiply(ee.Image.pixelArea()),
+                    'area2': water_period2.multiply(ee.Image.pixelArea())
+                })[0],
+                'monthly': get_info(monthly_stats)
+            })
+            results = {
+                'area1': outputs['areas']['area1'] / 1e6,
+                'area2': outputs['areas']['area2'] / 1e6,
+                'monthly': outputs['monthly']
+            }
+        
+        area1_km2 = results['area1']
+        area2_km2 = results['area2']
+        change = area2_km2 - area1_km2
+        percentage = (change / area1_km2 * 100) if area1_km2 > 0 else 0
+        
+        time_series = unpack_monthly_stats(results['monthly'], windows, ['ndwi', 'mndwi'], roi)
         
         legend = {
             'Period 1 Water': '#0000FF',
@@ -202,29 +301,35 @@ def analyze_water_change(request):
                 'change': round(change, 3),
                 'percentage': round(percentage, 1),
                 'layers': layers,
+                'reduction_scale': reduction_scale(roi),
                 'legend': legend,
-                'time_series': {
-                    'months': months,
-                    'ndwi': ndwi_values,
-                    'mndwi': mndwi_values
-                }
+                'time_series': time_series
             }
         })
-        
+    
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@gee_priority(INTERACTIVE)
 def analyze_seasonal_water(request):
     try:
         initialize_gee()
         data = json.loads(request.body)
-        roi_geojson = data.get('roi')
         start_date = data.get('startDate')
         end_date = data.get('endDate')
         
-        roi = ee.Geometry(roi_geojson['geometry'])
+        prepared = prepare_roi(data.get('roi'))
+        roi_geojson = prepared['geojson']
+        roi = prepared['geometry']
+        
+        # Water occurrence mode: per-scene water frequency over the whole date range
+        if data.get('mode') == 'occurrence':
+            return JsonResponse({
+                'success': True,
+                'data': seasonal_occurrence(roi, roi_geojson, start_date, end_date)
+            })
         
         # Define seasonal periods (India monsoon pattern)
         year = start_date.split('-')[0]
@@ -232,58 +337,74 @@ def analyze_seasonal_water(request):
         monsoon = (f'{year}-06-01', f'{year}-09-30')      # June-September
         post_monsoon = (f'{year}-10-01', f'{year}-12-31') # October-December
         
-        def get_water_mask(start, end):
-            collection = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
-                .filterBounds(roi) \
-                .filterDate(start, end) \
-                .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 50))
-            
-            if collection.size().getInfo() == 0:
-                collection = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
-                    .filterBounds(roi) \
-                    .filterDate(start, end)
-                if collection.size().getInfo() == 0:
-                    collection = ee.ImageCollection('LANDSAT/LC08/C02/T1_L2') \
-                        .filterBounds(roi) \
-                        .filterDate(start, end)
-                    if collection.size().getInfo() == 0:
-                        return ee.Image.constant(0).rename('water').clip(roi)
-                    s2 = collection.select(['SR_B3', 'SR_B5', 'SR_B6']).median()
-                    ndwi = s2.normalizedDifference(['SR_B3', 'SR_B5'])
-                    mndwi = s2.normalizedDifference(['SR_B3', 'SR_B6'])
-                    return ndwi.gt(0.3).Or(mndwi.gt(0.3)).rename('water')
-            
-            s2 = collection.select(['B3', 'B8', 'B11']).median()
-            ndwi = s2.normalizedDifference(['B3', 'B8'])
-            mndwi = s2.normalizedDifference(['B3', 'B11'])
-            return ndwi.gt(0.3).Or(mndwi.gt(0.3)).rename('water')
-        
-        # Get water masks for each season
-        pre_water = get_water_mask(*pre_monsoon).clip(roi)
-        monsoon_water = get_water_mask(*monsoon).clip(roi)
-        post_water = get_water_mask(*post_monsoon).clip(roi)
+        # Get water masks for each season; past seasons come from the JRC history
+        (pre_water, pre_source), (monsoon_water, monsoon_source), (post_water, post_source) = [
+            season_water_mask(roi, *season) for season in (pre_monsoon, monsoon, post_monsoon)
+        ]
+        pre_water = pre_water.clip(roi)
+        monsoon_water = monsoon_water.clip(roi)
+        post_water = post_water.clip(roi)
         
         # Classify water types
         permanent = pre_water.And(monsoon_water).And(post_water).rename('permanent')
         seasonal = monsoon_water.And(pre_water.Not().Or(post_water.Not())).rename('seasonal')
         temporary = monsoon_water.And(post_water.Not()).rename('temporary')
         
-        # Calculate areas
-        def calc_area(image, band):
-            area = image.multiply(ee.Image.pixelArea()).reduceRegion(
-                reducer=ee.Reducer.sum(),
-                geometry=roi,
-                scale=30,
-                maxPixels=1e13,
-                bestEffort=True
-            ).get(band)
-            return ee.Number(area).divide(1e6).getInfo() if area else 0
-        
-        pre_area = calc_area(pre_water, 'water')
-        monsoon_area = calc_area(monsoon_water, 'water')
-        post_area = calc_area(post_water, 'water')
-        permanent_area = calc_area(permanent, 'permanent')
-        seasonal_area = calc_area(seasonal, 'seasonal')
+        water_vis = {'min': 0, 'max': 1, 'palette': ['0000FF']}
+        permanent_vis = {'min': 0, 'max': 1, 'palette': ['000080']}
+        seasonal_vis = {'min': 0, 'max': 1, 'palette': ['00FFFF']}
+        
+        # Areas and time series are independent, so fetch them concurrently; small ROIs
+        # get every area and layer from a single pixel download, large ones reduce all
+        # five areas together over parallel full-resolution sub-tiles
+        season_masks = {
+            'pre_area': pre_water,
+            'monsoon_area': monsoon_water,
+            'post_area': post_water,
+            'permanent_area': permanent,
+            'seasonal_area': seasonal
+        }
+        if use_local_engine(roi_geojson):
+            outputs = run_parallel({
+                'pixels': lambda: fetch_pixels(season_masks, roi, window_end=post_monsoon[1]),
+                'time_series': lambda: monthly_index_series(roi, start_date, end_date, water_index_bands, ['ndwi', 'mndwi'])
+            })
+            pixels = outputs['pixels']
+            outputs.update({key: masked_area(pixels, key) / 1e6 for key in season_masks})
+            
+            def season_layer(key, vis_params):
+                return local_mask_layer(pixels, np.ma.filled(pixels[key] > 0, False), vis_params, season_masks[key])
+            
+            layers = {
+                'pre_monsoon': season_layer('pre_area', water_vis),
+                'monsoon': season_layer('monsoon_area', water_vis),
+                'post_monsoon': season_layer('post_area', water_vis),
+                'permanent': season_layer('permanent_area', permanent_vis),
+                'seasonal': season_layer('seasonal_area', seasonal_vis)
+            }
+        else:
+            # Layer descriptors; tiles are minted when the user enables a layer
+            layers = {
+                'pre_monsoon': layer_descriptor(pre_water.updateMask(pre_water), water_vis),
+                'monsoon': layer_descriptor(monsoon_water.updateMask(monsoon_water), water_vis),
+                'post_monsoon': layer_descriptor(post_water.updateMask(post_water), water_vis),
+                'permanent': layer_descriptor(permanent.updateMask(permanent), permanent_vis),
+                'seasonal': layer_descriptor(seasonal.updateMask(seasonal), seasonal_vis)
+            }
+            outputs = run_parallel({
+                'areas': lambda: sharded_statistics(roi, sums={
+                    key: mask.multiply(ee.Image.pixelArea()) for key, mask in season_masks.items()
+                })[0],
+                'time_series': lambda: monthly_index_series(roi, start_date, end_date, water_index_bands, ['ndwi', 'mndwi'])
+            })
+            outputs.update({key: area / 1e6 for key, area in outputs['areas'].items()})
+        
+        pre_area = outputs['pre_area']
+        monsoon_area = outputs['monsoon_area']
+        post_area = outputs['post_area']
+        permanent_area = outputs['permanent_area']
+        seasonal_area = outputs['seasonal_area']
+        time_series = outputs['time_series']
         
         # Drought severity analysis
         water_deficit = ((monsoon_area - post_area) / monsoon_area * 100) if monsoon_area > 0 else 0
@@ -309,87 +430,6 @@ def analyze_seasonal_water(request):
         else:
             water_stress = 'Critical Stress'
         
-        # Generate layers
-        water_vis = {'min': 0, 'max': 1, 'palette': ['0000FF']}
-        permanent_vis = {'min': 0, 'max': 1, 'palette': ['000080']}
-        seasonal_vis = {'min': 0, 'max': 1, 'palette': ['00FFFF']}
-        
-        layers = {
-            'pre_monsoon': pre_water.updateMask(pre_water).getMapId(water_vis)['tile_fetcher'].url_format,
-            'monsoon': monsoon_water.updateMask(monsoon_water).getMapId(water_vis)['tile_fetcher'].url_format,
-            'post_monsoon': post_water.updateMask(post_water).getMapId(water_vis)['tile_fetcher'].url_format,
-            'permanent': permanent.updateMask(permanent).getMapId(permanent_vis)['tile_fetcher'].url_format,
-            'seasonal': seasonal.updateMask(seasonal).getMapId(seasonal_vis)['tile_fetcher'].url_format
-        }
-        
-        # Time series
-        from datetime import datetime
-        from dateutil.relativedelta import relativedelta
-        
-        start = datetime.strptime(start_date, '%Y-%m-%d')
-        end = datetime.strptime(end_date, '%Y-%m-%d')
-        months, ndwi_values, mndwi_values = [], [], []
-        
-        current = start
-        while current <= end:
-            month_str = current.strftime('%Y-%m')
-            month_end = current + relativedelta(months=1) - relativedelta(days=1)
-            if month_end > end:
-                month_end = end
-            
-            try:
-                monthly_img = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
-                    .filterBounds(roi) \
-                    .filterDate(current.strftime('%Y-%m-%d'), month_end.strftime('%Y-%m-%d')) \
-                    .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 50)) \
-                    .select(['B3', 'B8', 'B11']).median()
-                
-                ndwi = monthly_img.normalizedDifference(['B3', 'B8'])
-                mndwi = monthly_img.normalizedDifference(['B3', 'B11'])
-                water_mask = ndwi.gt(0.3).Or(mndwi.gt(0.3))
-                
-                ndwi_mean = ndwi.updateMask(water_mask).reduceRegion(
-                    reducer=ee.Reducer.mean(), geometry=roi, scale=100, maxPixels=1e13, bestEffort=True).getInfo()
-                mndwi_mean = mndwi.updateMask(water_mask).reduceRegion(
-                    reducer=ee.Reducer.mean(), geometry=roi, scale=100, maxPixels=1e13, bestEffort=True).getInfo()
-                
-                months.append(month_str)
-                ndwi_values.append(round(float(ndwi_mean.get('nd', 0) or 0), 3))
-                mndwi_values.append(round(float(mndwi_mean.get('nd', 0) or 0), 3))
-            except:
-                months.append(month_str)
-                ndwi_values.append(None)
-                mndwi_values.append(None)
-            
-            current = current + relativedelta(months=1)
-        
-        # Interpolate missing values
-        def interpolate_values(values):
-            result = values[:]
-            for i in range(len(result)):
-                if result[i] is None or result[i] == 0:
-                    prev_idx = next_idx = None
-                    for j in range(i-1, -1, -1):
-                        if result[j] is not None and result[j] != 0:
-                            prev_idx = j
-                            break
-                    for j in range(i+1, len(result)):
-                        if result[j] is not None and result[j] != 0:
-                            next_idx = j
-                            break
-                    if prev_idx is not None and next_idx is not None:
-                        result[i] = round(result[prev_idx] + (result[next_idx] - result[prev_idx]) * (i - prev_idx) / (next_idx - prev_idx), 3)
-                    elif prev_idx is not None:
-                        result[i] = result[prev_idx]
-                    elif next_idx is not None:
-                        result[i] = result[next_idx]
-                    else:
-                        result[i] = 0
-            return result
-        
-        ndwi_values = interpolate_values(ndwi_values)
-        mndwi_values = interpolate_values(mndwi_values)
-        
         return JsonResponse({
             'success': True,
             'data': {
@@ -401,38 +441,46 @@ def analyze_seasonal_water(request):
                 'drought_severity': drought_severity,
                 'water_stress': water_stress,
                 'layers': layers,
-                'time_series': {
-                    'months': months,
-                    'ndwi': ndwi_values,
-                    'mndwi': mndwi_values
-                }
+                'reduction_scale': reduction_scale(roi),
+                'sources': {
+                    'pre_monsoon': pre_source,
+                    'monsoon': monsoon_source,
+                    'post_monsoon': post_source
+                },
+                'time_series': time_series
             }
         })
-        
+    
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@gee_priority(INTERACTIVE)
 def analyze_water_quality(request):
     try:
         initialize_gee()
         data = json.loads(request.body)
-        roi_geojson = data.get('roi')
         start_date = data.get('startDate')
         end_date = data.get('endDate')
         
-        roi = ee.Geometry(roi_geojson['geometry'])
+        approximate = bool(data.get('approximate', False))
+        sample_size = int(data.get('sampleSize') or 0) or None
         
-        collection = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED').filterBounds(roi).filterDate(start_date, end_date).filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 30))
+        prepared = prepare_roi(data.get('roi'))
+        roi_geojson = prepared['geojson']
+        roi = prepared['geometry']
         
-        if collection.size().getInfo() == 0:
-            collection = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED').filterBounds(roi).filterDate(start_date, end_date)
-            if collection.size().getInfo() == 0:
-                return JsonResponse({'success': False, 'error': 'No imagery available'})
+        if has_any_imagery(roi_geojson, start_date, end_date) is False:
+            return JsonResponse({'success': False, 'error': 'No imagery available'})
         
-        s2 = collection.median().clip(roi)
+        # Imagery fallback is resolved server-side; the scene count is checked before any
+        # reduction, since the catalog cannot rule out ROIs it has not synced yet
+        collection = harmonized_collection(roi, start_date, end_date, cloud_threshold=30)
+        if run_call(get_info(collection.size())) == 0:
+            return JsonResponse({'success': False, 'error': 'No imagery available'})
+        s2 = harmonized_composite(roi, start_date, end_date, cloud_threshold=30).clip(roi)
         
         # Create water mask using NDWI and MNDWI
         ndwi = s2.normalizedDifference(['B3', 'B8'])
@@ -463,16 +511,58 @@ def analyze_water_quality(request):
         # CDOM (Colored Dissolved Organic Matter) - Pollution indicator
         cdom = s2.select('B2').divide(s2.select('B3')).updateMask(water_mask).rename('cdom')
         
-        def get_mean(image, band):
-            mean = image.select(band).reduceRegion(reducer=ee.Reducer.mean(), geometry=roi, scale=30, maxPixels=1e13, bestEffort=True).get(band)
-            return float(ee.Number(mean).getInfo() if mean else 0)
+        layers = {
+            'turbidity': layer_descriptor(turbidity.visualize(min=0.8, max=2.0, palette=['0000FF', '00FFFF', 'FFFF00', 'FF0000'])),
+            'chlorophyll': layer_descriptor(chlorophyll.visualize(min=0, max=5, palette=['0000FF', '00FF00', 'FFFF00', 'FF0000'])),
+            'suspended_matter': layer_descriptor(suspended_matter.visualize(min=0, max=0.1, palette=['0000FF', 'FFFFFF', '8B4513'])),
+            'quality_index': layer_descriptor(quality_index.visualize(min=0, max=2, palette=['FF0000', 'FFFF00', '00FF00', '0000FF']))
+        }
         
-        turbidity_mean = get_mean(turbidity, 'turbidity')
-        chlorophyll_mean = get_mean(chlorophyll, 'chlorophyll')
-        quality_mean = get_mean(quality_index, 'quality')
-        wri_mean = get_mean(wri, 'wri')
-        ndti_mean = get_mean(ndti, 'ndti')
-        cdom_mean = get_mean(cdom, 'cdom')
+        # Means and time series are independent, so fetch them concurrently; small ROIs
+        # get every mean from a single pixel download, approximate requests estimate
+        # them from a stratified pixel sample, and the rest reduce all six together
+        # (over parallel full-resolution sub-tiles for large ROIs)
+        quality_bands = {
+            'turbidity_mean': turbidity,
+            'chlorophyll_mean': chlorophyll,
+            'quality_mean': quality_index,
+            'wri_mean': wri,
+            'ndti_mean': ndti,
+            'cdom_mean': cdom
+        }
+        intervals = None
+        if approximate:
+            outputs = run_parallel({
+                'sample': lambda: approximate_statistics(roi, list(quality_bands.values()), sample_size=sample_size),
+                'quality_series': lambda: monthly_index_series(roi, start_date, end_date, quality_index_bands, ['turbidity', 'chlorophyll'])
+            })
+            estimates = dict(zip(quality_bands, outputs['sample']['means']))
+            outputs.update({key: float(mean or 0) for key, (mean, _) in estimates.items()})
+            intervals = {key: interval for key, (_, interval) in estimates.items()}
+        elif use_local_engine(roi_geojson):
+            def local_means():
+                pixels = fetch_pixels(quality_bands, roi, window_end=end_date)
+                return {key: float(masked_mean(pixels, key) or 0) for key in quality_bands}
+            
+            outputs = run_parallel({
+                'means': local_means,
+                'quality_series': lambda: monthly_index_series(roi, start_date, end_date, quality_index_bands, ['turbidity', 'chlorophyll'])
+            })
+            outputs.update(outputs['means'])
+        else:
+            outputs = run_parallel({
+                'means': lambda: sharded_statistics(roi, means=quality_bands)[1],
+                'quality_series': lambda: monthly_index_series(roi, start_date, end_date, quality_index_bands, ['turbidity', 'chlorophyll'])
+            })
+            outputs.update({key: float(mean or 0) for key, mean in outputs['means'].items()})
+        
+        turbidity_mean = outputs['turbidity_mean']
+        chlorophyll_mean = outputs['chlorophyll_mean']
+        quality_mean = outputs['quality_mean']
+        wri_mean = outputs['wri_mean']
+        ndti_mean = outputs['ndti_mean']
+        cdom_mean = outputs['cdom_mean']
+        quality_series = outputs['quality_series']
         
         # Enhanced quality assessment using all indices
         if ndti_mean < 0.1 and cdom_mean < 1.0 and wri_mean < 1.2:
@@ -489,16 +579,6 @@ def analyze_water_quality(request):
         pollution_risk = 'High Risk' if cdom_mean > 1.5 else 'Moderate Risk' if cdom_mean > 1.2 else 'Low Risk'
         sediment_level = 'High Sediment' if wri_mean > 1.8 else 'Moderate Sediment' if wri_mean > 1.5 else 'Low Sediment'
         
-        layers = {
-            'turbidity': turbidity.visualize(min=0.8, max=2.0, palette=['0000FF', '00FFFF', 'FFFF00', 'FF0000']).getMapId()['tile_fetcher'].url_format,
-            'chlorophyll': chlorophyll.visualize(min=0, max=5, palette=['0000FF', '00FF00', 'FFFF00', 'FF0000']).getMapId()['tile_fetcher'].url_format,
-            'suspended_matter': suspended_matter.visualize(min=0, max=0.1, palette=['0000FF', 'FFFFFF', '8B4513']).getMapId()['tile_fetcher'].url_format,
-            'quality_index': quality_index.visualize(min=0, max=2, palette=['FF0000', 'FFFF00', '00FF00', '0000FF']).getMapId()['tile_fetcher'].url_format,
-            'wri_turbid': wri.visualize(min=0.8, max=2.5, palette=['0000FF', '00FFFF', 'FFFF00', 'FF0000']).getMapId()['tile_fetcher'].url_format,
-            'ndti_turbidity': ndti.visualize(min=-0.2, max=0.4, palette=['0000FF', '00FFFF', 'FFFF00', 'FF0000']).getMapId()['tile_fetcher'].url_format,
-            'cdom_pollution': cdom.visualize(min=0.5, max=2.0, palette=['0000FF', '00FF00', 'FFFF00', 'FF0000']).getMapId()['tile_fetcher'].url_format
-        }
-        
         # Enhanced legend with all quality indices
         legend = {
             'Turbidity (Old)': {
@@ -533,80 +613,36 @@ def analyze_water_quality(request):
             }
         }
         
-        start = datetime.strptime(start_date, '%Y-%m-%d')
-        end_dt = datetime.strptime(end_date, '%Y-%m-%d')
-        months, turbidity_values, chlorophyll_values = [], [], []
+        result = {
+            'quality_status': quality_status,
+            'turbidity_level': turbidity_level,
+            'chlorophyll_level': chlorophyll_level,
+            'pollution_risk': pollution_risk,
+            'sediment_level': sediment_level,
+            'wri_value': round(wri_mean, 3),
+            'ndti_value': round(ndti_mean, 3),
+            'cdom_value': round(cdom_mean, 3),
+            'layers': layers,
+            'reduction_scale': reduction_scale(roi),
+            'legend': legend,
+            'time_series': {'months': quality_series['months'], 'ndwi': quality_series['turbidity'], 'mndwi': quality_series['chlorophyll']}
+        }
         
-        current = start
-        while current <= end_dt:
-            month_str = current.strftime('%Y-%m')
-            month_end = current + relativedelta(months=1) - relativedelta(days=1)
-            if month_end > end_dt:
-                month_end = end_dt
-            
-            try:
-                monthly_img = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED').filterBounds(roi).filterDate(current.strftime('%Y-%m-%d'), month_end.strftime('%Y-%m-%d')).filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 50)).median()
-                
-                # Apply water mask to monthly data
-                ndwi_m = monthly_img.normalizedDifference(['B3', 'B8'])
-                mndwi_m = monthly_img.normalizedDifference(['B3', 'B11'])
-                water_mask_m = ndwi_m.gt(0.3).Or(mndwi_m.gt(0.3))
-                
-                turb = monthly_img.select('B4').divide(monthly_img.select('B3')).updateMask(water_mask_m)
-                chl = monthly_img.select('B8').divide(monthly_img.select('B4')).updateMask(water_mask_m)
-                turb_mean = turb.reduceRegion(reducer=ee.Reducer.mean(), geometry=roi, scale=100, maxPixels=1e13, bestEffort=True).getInfo()
-                chl_mean = chl.reduceRegion(reducer=ee.Reducer.mean(), geometry=roi, scale=100, maxPixels=1e13, bestEffort=True).getInfo()
-                months.append(month_str)
-                turbidity_values.append(round(float(list(turb_mean.values())[0] if turb_mean.values() else 0), 3))
-                chlorophyll_values.append(round(float(list(chl_mean.values())[0] if chl_mean.values() else 0), 3))
-            except:
-                months.append(month_str)
-                turbidity_values.append(None)
-                chlorophyll_values.append(None)
-            current = current + relativedelta(months=1)
-        
-        # Interpolate missing values
-        def interpolate_values(values):
-            result = values[:]
-            for i in range(len(result)):
-                if result[i] is None or result[i] == 0:
-                    prev_idx = next_idx = None
-                    for j in range(i-1, -1, -1):
-                        if result[j] is not None and result[j] != 0:
-                            prev_idx = j
-                            break
-                    for j in range(i+1, len(result)):
-                        if result[j] is not None and result[j] != 0:
-                            next_idx = j
-                            break
-                    if prev_idx is not None and next_idx is not None:
-                        result[i] = round(result[prev_idx] + (result[next_idx] - result[prev_idx]) * (i - prev_idx) / (next_idx - prev_idx), 3)
-                    elif prev_idx is not None:
-                        result[i] = result[prev_idx]
-                    elif next_idx is not None:
-                        result[i] = result[next_idx]
-                    else:
-                        result[i] = 0
-            return result
-        
-        turbidity_values = interpolate_values(turbidity_values)
-        chlorophyll_values = interpolate_values(chlorophyll_values)
+        # Approximate results carry a 95% interval (± half-width) next to each estimate
+        if intervals is not None:
+            result['confidence_intervals'] = {
+                'wri_value': rounded_interval(intervals['wri_mean']),
+                'ndti_value': rounded_interval(intervals['ndti_mean']),
+                'cdom_value': rounded_interval(intervals['cdom_mean']),
+                'turbidity': rounded_interval(intervals['turbidity_mean']),
+                'chlorophyll': rounded_interval(intervals['chlorophyll_mean']),
+                'quality_index': rounded_interval(intervals['quality_mean'])
+            }
+            result['sampling'] = sampling_summary(outputs['sample'])
         
         return JsonResponse({
             'success': True,
-            'data': {
-                'quality_status': quality_status,
-                'turbidity_level': turbidity_level,
-                'chlorophyll_level': chlorophyll_level,
-                'pollution_risk': pollution_risk,
-                'sediment_level': sediment_level,
-                'wri_value': round(wri_mean, 3),
-                'ndti_value': round(ndti_mean, 3),
-                'cdom_value': round(cdom_mean, 3),
-                'layers': layers,
-                'legend': legend,
-                'time_series': {'months': months, 'ndwi': turbidity_values, 'mndwi': chlorophyll_values}
-            }
+            'data': result
         })
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
@@ -614,29 +650,37 @@ def analyze_water_quality(request):
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@gee_priority(INTERACTIVE)
 def analyze_advanced_water(request):
     """Advanced water analysis with AWEI, NDTI, WRI, CDOM, Dynamic World AI, and ML models"""
     try:
         initialize_gee()
         data = json.loads(request.body)
-        roi_geojson = data.get('roi')
         start_date = data.get('startDate')
         end_date = data.get('endDate')
         
-        roi = ee.Geometry(roi_geojson['geometry'])
-        
-        # Get Sentinel-2 imagery
-        collection = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
-            .filterBounds(roi) \
-            .filterDate(start_date, end_date) \
-            .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 50))
-        
-        if collection.size().getInfo() == 0:
-            collection = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
-                .filterBounds(roi) \
-                .filterDate(start_date, end_date)
-        
-        s2 = collection.median().clip(roi)
+        approximate = bool(data.get('approximate', False))
+        sample_size = int(data.get('sampleSize') or 0) or None
+        coarse_pass = data.get('progressivePass')
+        
+        prepared = prepare_roi(data.get('roi'))
+        roi_geojson = prepared['geojson']
+        roi = prepared['geometry']
+        
+        # A progressive analysis asks for quick coarse passes (0 = coarsest) before the
+        # final one; passes this ROI does not need are answered as skipped
+        coarse_scale = None
+        if coarse_pass is not None:
+            coarse_pass = int(coarse_pass)
+            coarse_scales = progressive_scales(roi)
+            if coarse_pass >= len(coarse_scales):
+                return JsonResponse({'success': True, 'data': {'progressive': {'pass': coarse_pass, 'final': False, 'skipped': True}}})
+            coarse_scale = coarse_scales[coarse_pass]
+        params = reduction_params(roi, scale=coarse_scale)
+        
+        # Best available imagery; the scene selection is resolved once and shared by the
+        # coarse passes and the final analysis, so no pass scores the scenes again
+        s2 = scene_composite(selected_scene_ids(roi, start_date, end_date)).clip(roi)
         
         # Calculate water detection indices only
         ndwi = s2.normalizedDifference(['B3', 'B8']).rename('ndwi')
@@ -674,42 +718,86 @@ def analyze_advanced_water(request):
         water_ensemble = water_ndwi.add(water_mndwi).add(water_awei).add(water_ai_mask)
         water_ml = water_ensemble.gte(3).rename('water_ml')  # At least 3 out of 4 agree
         
-        # Calculate areas
-        def calc_area(image, band):
-            area = image.multiply(ee.Image.pixelArea()).reduceRegion(
-                reducer=ee.Reducer.sum(),
-                geometry=roi,
-                scale=30,
-                maxPixels=1e13,
-                bestEffort=True
-            ).get(band)
-            return ee.Number(area).divide(1e6).getInfo() if area else 0
-        
-        def calc_mean(image, band):
-            mean = image.select(band).reduceRegion(
-                reducer=ee.Reducer.mean(),
-                geometry=roi,
-                scale=30,
-                maxPixels=1e13,
-                bestEffort=True
-            ).get(band)
-            return float(ee.Number(mean).getInfo() if mean else 0)
-        
-        water_area_ml = calc_area(water_ml, 'water_ml')
-        water_area_ai = calc_area(water_ai_mask, 'water_ai')
-        
-        ndwi_mean = calc_mean(ndwi, 'ndwi')
-        mndwi_mean = calc_mean(mndwi, 'mndwi')
-        awei_mean = calc_mean(awei, 'awei')
-        
-        # ML confidence score
-        ml_confidence = float((water_ensemble.reduceRegion(
-            reducer=ee.Reducer.mean(),
-            geometry=roi,
-            scale=100,
-            maxPixels=1e13,
-            bestEffort=True
-        ).getInfo().get('water_ml', 0) or 0) * 25)  # Convert to percentage (4 methods)
+        # Visualization layers - ML detection only, minted when enabled
+        layers = {
+            'ml_water': layer_descriptor(water_ml.updateMask(water_ml), {'min': 0, 'max': 1, 'palette': ['0000FF']}),
+            'ai_water': layer_descriptor(water_ai_mask.updateMask(water_ai_mask), {'min': 0, 'max': 1, 'palette': ['00FFFF']}),
+            'ndwi_water': layer_descriptor(water_ndwi.updateMask(water_ndwi), {'min': 0, 'max': 1, 'palette': ['00FF00']}),
+            'mndwi_water': layer_descriptor(water_mndwi.updateMask(water_mndwi), {'min': 0, 'max': 1, 'palette': ['FFFF00']}),
+            'awei_water': layer_descriptor(water_awei.updateMask(water_awei), {'min': 0, 'max': 1, 'palette': ['FF00FF']})
+        }
+        
+        # Small ROIs reduce every area and mean locally from a single pixel download, and
+        # approximate requests estimate them from a stratified pixel sample; otherwise they
+        # all come from one sum reduction, split into parallel full-resolution sub-tiles
+        # for large ROIs. Coarse passes reduce at their own scale, on the analysis pool like the final one
+        intervals = None
+        if coarse_scale is None and approximate:
+            stats = run_parallel({
+                'stats': lambda: approximate_statistics(roi, [ndwi, mndwi, awei, water_ensemble], [water_ml, water_ai_mask], sample_size)
+            })['stats']
+            (ndwi_est, ndwi_ci), (mndwi_est, mndwi_ci), (awei_est, awei_ci), (ensemble_est, ensemble_ci) = stats['means']
+            (ml_area, ml_area_ci), (ai_area, ai_area_ci) = stats['areas']
+            outputs = {
+                'water_area_ml': (ml_area or 0) / 1e6,
+                'water_area_ai': (ai_area or 0) / 1e6,
+                'ndwi_mean': float(ndwi_est or 0),
+                'mndwi_mean': float(mndwi_est or 0),
+                'awei_mean': float(awei_est or 0),
+                'ml_confidence': float(ensemble_est or 0) * 25
+            }
+            intervals = {
+                'water_area_ml': rounded_interval(ml_area_ci and ml_area_ci / 1e6),
+                'water_area_ai': rounded_interval(ai_area_ci and ai_area_ci / 1e6),
+                'ml_confidence': rounded_interval(ensemble_ci and ensemble_ci * 25, 1),
+                'ndwi': rounded_interval(ndwi_ci),
+                'mndwi': rounded_interval(mndwi_ci),
+                'awei': rounded_interval(awei_ci)
+            }
+        elif coarse_scale is None and use_local_engine(roi_geojson):
+            pixels = fetch_pixels({
+                'water_ml': water_ml,
+                'water_ai': water_ai_mask,
+                'ndwi': ndwi,
+                'mndwi': mndwi,
+                'awei': awei,
+                'ensemble': water_ensemble
+            }, roi, window_end=end_date)
+            outputs = {
+                'water_area_ml': masked_area(pixels, 'water_ml') / 1e6,
+                'water_area_ai': masked_area(pixels, 'water_ai') / 1e6,
+                'ndwi_mean': float(masked_mean(pixels, 'ndwi') or 0),
+                'mndwi_mean': float(masked_mean(pixels, 'mndwi') or 0),
+                'awei_mean': float(masked_mean(pixels, 'awei') or 0),
+                'ml_confidence': float(masked_mean(pixels, 'ensemble') or 0) * 25
+            }
+        else:
+            areas, means = run_parallel({
+                'stats': lambda: sharded_statistics(
+                    roi,
+                    sums={
+                        'water_ml': water_ml.multiply(ee.Image.pixelArea()),
+                        'water_ai': water_ai_mask.multiply(ee.Image.pixelArea())
+                    },
+                    means={'ndwi': ndwi, 'mndwi': mndwi, 'awei': awei, 'ensemble': water_ensemble},
+                    params=params if coarse_scale is not None else None
+                )
+            })['stats']
+            outputs = {
+                'water_area_ml': areas['water_ml'] / 1e6,
+                'water_area_ai': areas['water_ai'] / 1e6,
+                'ndwi_mean': float(means['ndwi'] or 0),
+                'mndwi_mean': float(means['mndwi'] or 0),
+                'awei_mean': float(means['awei'] or 0),
+                'ml_confidence': float(means['ensemble'] or 0) * 25  # Convert to percentage (4 methods)
+            }
+        
+        water_area_ml = outputs['water_area_ml']
+        water_area_ai = outputs['water_area_ai']
+        ndwi_mean = outputs['ndwi_mean']
+        mndwi_mean = outputs['mndwi_mean']
+        awei_mean = outputs['awei_mean']
+        ml_confidence = outputs['ml_confidence']
         
         # Water classification based on ML detection
         if mndwi_mean > 0.5 and ndwi_mean > 0.5:
@@ -721,15 +809,6 @@ def analyze_advanced_water(request):
         else:
             water_type = 'Temporary Water/Wet Soil'
         
-        # Visualization layers - ML detection only
-        layers = {
-            'ml_water': water_ml.updateMask(water_ml).getMapId({'min': 0, 'max': 1, 'palette': ['0000FF']})['tile_fetcher'].url_format,
-            'ai_water': water_ai_mask.updateMask(water_ai_mask).getMapId({'min': 0, 'max': 1, 'palette': ['00FFFF']})['tile_fetcher'].url_format,
-            'ndwi_water': water_ndwi.updateMask(water_ndwi).getMapId({'min': 0, 'max': 1, 'palette': ['00FF00']})['tile_fetcher'].url_format,
-            'mndwi_water': water_mndwi.updateMask(water_mndwi).getMapId({'min': 0, 'max': 1, 'palette': ['FFFF00']})['tile_fetcher'].url_format,
-            'awei_water': water_awei.updateMask(water_awei).getMapId({'min': 0, 'max': 1, 'palette': ['FF00FF']})['tile_fetcher'].url_format
-        }
-        
         # Gradient Boosting prediction
         historical_trend = (water_area_ml - water_area_ai) / water_area_ai * 100 if water_area_ai > 0 else 0
         
@@ -748,27 +827,37 @@ def analyze_advanced_water(request):
         
         drought_risk = 'High Risk' if water_area_ml < 0.5 and trend_status == 'Decreasing' else 'Moderate Risk' if water_area_ml < 1.0 or trend_status == 'Decreasing' else 'Low Risk'
         
+        scale = params['scale'] if coarse_scale is not None else reduction_scale(roi)
+        result = {
+            'water_area_ml': round(water_area_ml, 3),
+            'water_area_ai': round(water_area_ai, 3),
+            'ml_confidence': round(ml_confidence, 1),
+            'water_type': water_type,
+            'indices': {
+                'ndwi': round(ndwi_mean, 3),
+                'mndwi': round(mndwi_mean, 3),
+                'awei': round(awei_mean, 3)
+            },
+            'predictions': {
+                '1_month': round(prediction_1month, 3),
+                '3_month': round(prediction_3month, 3),
+                'trend': trend_status,
+                'drought_risk': drought_risk
+            },
+            'layers': layers,
+            'reduction_scale': scale,
+            'progressive': {'pass': coarse_pass, 'scale': scale, 'final': coarse_scale is None}
+        }
+        
+        # Sampled estimates come with their 95% half-widths
+        if intervals is not None:
+            result['confidence_intervals'] = intervals
+            result['sampling'] = sampling_summary(stats)
+        
         return JsonResponse({
             'success': True,
-            'data': {
-                'water_area_ml': round(water_area_ml, 3),
-                'water_area_ai': round(water_area_ai, 3),
-                'ml_confidence': round(ml_confidence, 1),
-                'water_type': water_type,
-                'indices': {
-                    'ndwi': round(ndwi_mean, 3),
-                    'mndwi': round(mndwi_mean, 3),
-                    'awei': round(awei_mean, 3)
-                },
-                'predictions': {
-                    '1_month': round(prediction_1month, 3),
-                    '3_month': round(prediction_3month, 3),
-                    'trend': trend_status,
-                    'drought_risk': drought_risk
-                },
-                'layers': layers
-            }
+            'data': result
         })
-        
+    
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
@@ -5,6 +5,7 @@ from datetime import datetime, timedelta
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import numpy as np
+from .roi import canonical_roi
 
 # Get API key from environment variable or use placeholder
 OPENWEATHER_API_KEY = os.environ.get('OPENWEATHER_API_KEY', 'YOUR_OPENWEATHER_API_KEY_HERE')
@@ -16,13 +17,12 @@ def get_rainfall_forecast(request):
         data = json.loads(request.body)
         roi = data.get('roi')
         
-        # Get center coordinates from ROI
-        if roi['geometry']['type'] == 'Polygon':
-            coords = roi['geometry']['coordinates'][0]
-        elif roi['geometry']['type'] == 'MultiPolygon':
-            coords = roi['geometry']['coordinates'][0][0]
+        # Get center coordinates from the outer ring of the (first) canonical ROI polygon
+        geometry = canonical_roi(roi)
+        if geometry['type'] == 'Polygon':
+            coords = geometry['coordinates'][0]
         else:
-            coords = roi['geometry']['coordinates'][0]
+            coords = geometry['coordinates'][0][0]
         
         # Calculate center point
         lats = [c[1] for c in coords]
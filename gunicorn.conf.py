@@ -0,0 +1,7 @@
+import os
+
+def post_fork(server, worker):
+    """Give every worker its own Earth Engine session right after it forks"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'water_detection.settings')
+    from detection.gee_session import initialize_session
+    initialize_session(force=True)
@@ -0,0 +1,70 @@
+// Map layer and progressive analysis helpers shared by the farm and water analysis pages
+
+function lazyTileLayer(layer, options) {
+    // Layers arrive as a tile URL or as a descriptor whose tiles are minted on first enable
+    if (typeof layer === 'string') {
+        return L.tileLayer(layer, options);
+    }
+    
+    const tileLayer = L.tileLayer(layer.url || '', options);
+    let minting = false;
+    tileLayer.on('add', async function() {
+        if (tileLayer._url || minting) {
+            return;
+        }
+        minting = true;
+        try {
+            const response = await fetch('/mint-layer/', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({id: layer.id})
+            });
+            const data = await response.json();
+            if (data.success) {
+                tileLayer.setUrl(data.data.url);
+            } else {
+                alert('Error: ' + data.error);
+            }
+        } catch (error) {
+            alert('Error: ' + error.message);
+        } finally {
+            minting = false;
+        }
+    });
+    return tileLayer;
+}
+
+async function progressiveAnalysis(endpoint, payload, headers, onCoarse) {
+    // The coarse passes (coarsest first) are sent one after another alongside the final
+    // request and each result is handed to onCoarse; once the final response is in, the
+    // pass still in flight is aborted and no further pass is sent
+    const controller = new AbortController();
+    
+    const post = (body, signal) => fetch(endpoint, {
+        method: 'POST',
+        headers: Object.assign({'Content-Type': 'application/json'}, headers),
+        body: JSON.stringify(body),
+        signal: signal
+    });
+    
+    (async () => {
+        for (const pass of [0, 1]) {
+            try {
+                const response = await post(Object.assign({}, payload, {progressivePass: pass}), controller.signal);
+                const data = await response.json();
+                // A skipped pass means the ROI needs no finer coarse pass either
+                if (controller.signal.aborted || !data.success || data.data.progressive.skipped) return;
+                onCoarse(data.data);
+            } catch (error) {
+                if (!controller.signal.aborted) console.warn('Coarse pass failed:', error);
+                return;
+            }
+        }
+    })();
+    
+    try {
+        return await post(payload);
+    } finally {
+        controller.abort();
+    }
+}
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -72,3 +73,99 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Google Earth Engine
+GEE_MAX_CONCURRENCY = int(os.environ.get('GEE_MAX_CONCURRENCY', 8))
+
+# Share of GEE_MAX_CONCURRENCY reserved for each priority class, so map previews
+# are not queued behind long analyses or exports. Shard reductions of large ROIs run
+# on their own pool on behalf of requests that wait for them
+GEE_PRIORITY_SHARES = {
+    'preview': 0.25,
+    'interactive': 0.5,
+    'batch': 0.25,
+    'shard': 0.5,
+}
+
+# Seconds a successful GEE call vouches for the session before it is reported unverified
+GEE_SESSION_TTL = int(os.environ.get('GEE_SESSION_TTL', 900))
+
+# Pooled keep-alive HTTP transport used by the earthengine-api client; the pool
+# holds a connection for every scheduler thread plus the request threads
+GEE_HTTP_POOL_SIZE = int(os.environ.get('GEE_HTTP_POOL_SIZE', round(GEE_MAX_CONCURRENCY * sum(GEE_PRIORITY_SHARES.values())) + 4))
+GEE_HTTP_RETRIES = int(os.environ.get('GEE_HTTP_RETRIES', 3))
+GEE_HTTP_BACKOFF = float(os.environ.get('GEE_HTTP_BACKOFF', 0.5))
+GEE_HTTP_TIMEOUT = float(os.environ.get('GEE_HTTP_TIMEOUT', 300))
+
+# Local scene-availability catalog answering "any imagery?" without a GEE round trip
+GEE_CATALOG_ENABLED = os.environ.get('GEE_CATALOG_ENABLED', 'True') == 'True'
+GEE_CATALOG_START = os.environ.get('GEE_CATALOG_START', '2017-01-01')
+GEE_CATALOG_REFRESH = int(os.environ.get('GEE_CATALOG_REFRESH', 6 * 3600))
+GEE_CATALOG_MAX_QUERY_CELLS = int(os.environ.get('GEE_CATALOG_MAX_QUERY_CELLS', 16))
+
+# Composites use the k scenes with the least cloud over the ROI
+GEE_COMPOSITE_TOP_K = int(os.environ.get('GEE_COMPOSITE_TOP_K', 8))
+
+# Only this many scenes of a window, those with the least tile-wide cloud in their
+# metadata, are scored for cloud over the ROI before the k clearest are picked
+GEE_SCORE_CANDIDATES = int(os.environ.get('GEE_SCORE_CANDIDATES', 24))
+
+# Scene selections resolved for a ROI and window are reused this long (s) by the
+# progressive passes and repeat analyses of that ROI
+GEE_SCENE_SELECTION_TTL = int(os.environ.get('GEE_SCENE_SELECTION_TTL', 3600))
+
+# Minted tile URLs are reused for this long; kept well inside the map ID lifetime
+GEE_TILE_URL_TTL = int(os.environ.get('GEE_TILE_URL_TTL', 3600))
+
+# Layer descriptors returned by analyses stay mintable for this long
+GEE_LAYER_TTL = int(os.environ.get('GEE_LAYER_TTL', 6 * 3600))
+
+# Map tiles are served through a local proxy backed by an on-disk PNG store (LRU by size)
+GEE_TILE_PROXY = os.environ.get('GEE_TILE_PROXY', 'True') == 'True'
+GEE_TILE_STORE_DIR = os.environ.get('GEE_TILE_STORE_DIR', os.path.join(tempfile.gettempdir(), 'aquawatch-tiles'))
+GEE_TILE_STORE_MAX_BYTES = int(os.environ.get('GEE_TILE_STORE_MAX_BYTES', 1024 ** 3))
+
+# Reductions pick the finest scale keeping the ROI bounding box within these pixel
+# budgets (analyses from 30 m, time series from 100 m)
+GEE_ANALYSIS_PIXEL_BUDGET = int(os.environ.get('GEE_ANALYSIS_PIXEL_BUDGET', 4000000))
+GEE_SERIES_PIXEL_BUDGET = int(os.environ.get('GEE_SERIES_PIXEL_BUDGET', 250000))
+
+# Analyses over small ROIs download their pixels once and reduce them locally with numpy;
+# the limit is the ROI bounding box in 30 m pixels (65536 px is about 59 km²)
+GEE_LOCAL_COMPUTE = os.environ.get('GEE_LOCAL_COMPUTE', 'True') == 'True'
+GEE_LOCAL_MAX_PIXELS = int(os.environ.get('GEE_LOCAL_MAX_PIXELS', 65536))
+
+# Downloaded pixel patches are kept as memory-mapped .npy files (LRU by size)
+GEE_PATCH_STORE_DIR = os.environ.get('GEE_PATCH_STORE_DIR', os.path.join(tempfile.gettempdir(), 'aquawatch-patches'))
+GEE_PATCH_STORE_MAX_BYTES = int(os.environ.get('GEE_PATCH_STORE_MAX_BYTES', 2 * 1024 ** 3))
+
+# Patches of date windows ending within GEE_PATCH_FRESH_DAYS of today can still gain
+# newly ingested scenes, so they are only reused for GEE_PATCH_FRESH_TTL seconds
+GEE_PATCH_FRESH_DAYS = int(os.environ.get('GEE_PATCH_FRESH_DAYS', 30))
+GEE_PATCH_FRESH_TTL = int(os.environ.get('GEE_PATCH_FRESH_TTL', 6 * 3600))
+
+# ROIs whose native-resolution reduction exceeds the pixel budget are split into a grid of
+# sub-tiles, each within the budget, reduced in parallel and merged exactly; the scale is
+# only coarsened when more than GEE_SHARD_MAX_SHARDS sub-tiles would be needed
+GEE_SHARDING = os.environ.get('GEE_SHARDING', 'True') == 'True'
+GEE_SHARD_MAX_SHARDS = int(os.environ.get('GEE_SHARD_MAX_SHARDS', 16))
+
+# Analyses requested with approximate=true estimate their numbers from a stratified random
+# sample of this many pixels over a grid of GEE_SAMPLE_STRATA x GEE_SAMPLE_STRATA strata
+GEE_SAMPLE_SIZE = int(os.environ.get('GEE_SAMPLE_SIZE', 2000))
+GEE_SAMPLE_STRATA = int(os.environ.get('GEE_SAMPLE_STRATA', 4))
+
+# Seasonal water analyses read past seasons from the precomputed JRC Global Surface Water
+# monthly history and only build optical composites for seasons it does not cover yet
+GEE_JRC_SURFACE_WATER = os.environ.get('GEE_JRC_SURFACE_WATER', 'True') == 'True'
+
+# File-based so every worker process sees minted tile URLs and layer descriptors
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('GEE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'aquawatch-cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        }
+    }
+}